@@ -1,18 +1,66 @@
 import streamlit as st
-import tensorflow as tf
-import cv2
 import numpy as np
 from PIL import Image
 import sqlite3
 from passlib.hash import pbkdf2_sha256
 import datetime
 import os
-from database import init_db
+import time
+from contextlib import contextmanager
+from database import DB_PATH, ConnectionPool, PredictionWriter, init_db, insert_prediction, run_after_commit
+from inference import BackgroundLoader, MicroBatcher
+from backends import load_backend, model_files
+from inference_client import InferenceClient, InferenceUnavailable
+from prediction_cache import input_key, open_prediction_cache
+from near_duplicates import DuplicateIndex, dhash
+from uploads import save_upload
+from history import history_page
+from class_names import CLASS_NAMES
+import config
+import metrics
 
-# Initialize database
+# Create or upgrade the schema; runs once per process, not on every rerun
 init_db()
-conn = sqlite3.connect('plant_disease.db')
-c = conn.cursor()
+
+# One pool per process; every session thread gets its own connection from it
+@st.cache_resource
+def load_db_pool():
+    return ConnectionPool(DB_PATH)
+
+db = load_db_pool()
+
+@st.cache_resource
+def load_prediction_writer():
+    if not config.WRITE_BEHIND:
+        return None
+    return PredictionWriter(db, max_rows=config.WRITE_BEHIND_MAX_ROWS,
+                            max_wait_ms=config.WRITE_BEHIND_MAX_WAIT_MS,
+                            max_queue=config.WRITE_BEHIND_MAX_QUEUE)
+
+def save_prediction(user_id, file_path, disease, confidence, phash):
+    """Stores a prediction, through the write-behind queue when it is enabled"""
+    on_insert = None
+    if duplicate_index:
+        def on_insert(conn, prediction_id):
+            return duplicate_index.add(conn, user_id, phash, prediction_id, disease, confidence)
+    writer = load_prediction_writer()
+    if writer:
+        writer.add(user_id, file_path, disease, confidence, on_insert)
+        return
+    with db.transaction() as conn:
+        prediction_id = insert_prediction(conn, user_id, file_path, disease, confidence)
+        after_commit = on_insert(conn, prediction_id) if on_insert else None
+    run_after_commit([after_commit])
+
+@contextmanager
+def pending_predictions(user_id):
+    """The user's predictions still in the write-behind queue, newest first"""
+    writer = load_prediction_writer()
+    if not writer:
+        yield []
+        return
+    with writer.visible(user_id) as rows:
+        yield rows
 
 # Custom CSS styling
 st.markdown("""
@@ -61,57 +109,68 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Load model on a background thread started at boot, so pages that don't
+# need it render without waiting for TensorFlow
 @st.cache_resource
+def start_model_loader():
+    return BackgroundLoader(load_backend, name='agrodoc-model-loader',
+                            retry_after=config.MODEL_LOAD_RETRY_SECONDS)
+
 def load_model():
-    model = tf.keras.models.load_model('Trained_Model.h5')
-    return model
-
-model = load_model()
-
-# Correct class names matching model's training order
-CLASS_NAMES = [
-    'Apple___Apple_scab',
-    'Apple___Black_rot',
-    'Apple___Cedar_apple_rust',
-    'Apple___healthy',
-    'Blueberry___healthy',
-    'Cherry_(including_sour)___healthy',
-    'Cherry_(including_sour)___Powdery_mildew',
-    'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
-    'Corn_(maize)___Common_rust_',
-    'Corn_(maize)___healthy',
-    'Corn_(maize)___Northern_Leaf_Blight',
-    'Grape___Black_rot',
-    'Grape___Esca_(Black_Measles)',
-    'Grape___healthy',
-    'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
-    'Orange___Haunglongbing_(Citrus_greening)',
-    'Peach___Bacterial_spot',
-    'Peach___healthy',
-    'Pepper,_bell___Bacterial_spot',
-    'Pepper,_bell___healthy',
-    'Potato___Early_blight',
-    'Potato___healthy',
-    'Potato___Late_blight',
-    'Raspberry___healthy',
-    'Soybean___healthy',
-    'Squash___Powdery_mildew',
-    'Strawberry___healthy',
-    'Strawberry___Leaf_scorch',
-    'Tomato___Bacterial_spot',
-    'Tomato___Early_blight',
-    'Tomato___healthy',
-    'Tomato___Late_blight',
-    'Tomato___Leaf_Mold',
-    'Tomato___Septoria_leaf_spot',
-    'Tomato___Spider_mites Two-spotted_spider_mite',
-    'Tomato___Target_Spot',
-    'Tomato___Tomato_mosaic_virus',
-    'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
-]
-
-# Validate class count
-assert len(CLASS_NAMES) == 38, "Class names count mismatch with model output!"
+    with metrics.LOAD_MODEL_SECONDS.time():
+        return start_model_loader().get()
+
+# Shared across sessions so concurrent uploads run as one batch
+@st.cache_resource
+def load_batcher():
+    return MicroBatcher(load_model().predict,
+                        max_batch_size=config.BATCH_MAX_SIZE,
+                        max_wait_ms=config.BATCH_MAX_WAIT_MS)
+
+@st.cache_resource
+def load_prediction_cache():
+    if not config.PREDICTION_CACHE:
+        return None
+    # Cascade answers depend on the first-stage model and its threshold too
+    settings = f"cascade:{config.CASCADE_THRESHOLD}" if config.CASCADE else ''
+    return open_prediction_cache(config.CACHE_DB_PATH, model_files(),
+                                 int(config.CACHE_MAX_MB * 1024 * 1024), settings)
+
+@st.cache_resource
+def load_inference_client():
+    if not config.USE_INFERENCE_SERVER:
+        return None
+    return InferenceClient(config.INFERENCE_SERVER_ADDRESS)
+
+def run_inference(input_arr, image_bytes):
+    client = load_inference_client()
+    if client is not None:
+        try:
+            return client.predict(image_bytes)
+        except InferenceUnavailable:
+            pass  # Server down or failing, score in-process instead
+    return load_batcher().predict(input_arr)
+
+@st.cache_resource
+def load_duplicate_index():
+    if not config.NEAR_DUPLICATES:
+        return None
+    return DuplicateIndex(DB_PATH,
+                          max_distance=config.DUPLICATE_MAX_DISTANCE,
+                          window_hours=config.DUPLICATE_WINDOW_HOURS)
+
+@st.cache_resource
+def start_metrics_endpoint():
+    if not config.METRICS_ENABLED:
+        return None
+    return metrics.start_metrics_server(config.METRICS_ADDRESS)
+
+# With an inference server the model is only loaded here as a fallback
+model_loader = None if config.USE_INFERENCE_SERVER else start_model_loader()
+if model_loader and not config.BACKGROUND_MODEL_LOAD:
+    load_model()
+duplicate_index = load_duplicate_index()
+start_metrics_endpoint()
 
 # Session state management
 session_defaults = {
@@ -121,7 +180,9 @@ session_defaults = {
     'uploaded_file': None,
     'processing': False,
     'prediction_done': False,
-    'prediction_page': 0,
+    # Start cursor of every history page visited so far, for Previous
+    'prediction_cursors': (None,),
+    'prediction_next_cursor': None,
     'selected_date': datetime.date.today()
 }
 
@@ -131,25 +192,27 @@ for key, value in session_defaults.items():
 
 # Database functions
 def check_notifications():
-    c.execute('''SELECT message FROM notifications 
-               WHERE active = 1 AND (expiry_date > CURRENT_DATE OR expiry_date IS NULL)''')
-    return [row[0] for row in c.fetchall()]
+    return [row[0] for row in db.fetchall('''SELECT message FROM notifications 
+               WHERE active = 1 AND (expiry_date > CURRENT_DATE OR expiry_date IS NULL)''')]
 
 def create_user(name, email, password, phone):
     try:
         hashed_password = pbkdf2_sha256.hash(password)
-        c.execute('INSERT INTO users (name, email, password, phone) VALUES (?, ?, ?, ?)',
-                 (name, email, hashed_password, phone))
-        conn.commit()
+        with db.transaction() as conn:
+            conn.execute('INSERT INTO users (name, email, password, phone) VALUES (?, ?, ?, ?)',
+                         (name, email, hashed_password, phone))
         return True
     except sqlite3.IntegrityError:
         return False
 
 def verify_user(email, password):
-    c.execute('SELECT * FROM users WHERE email = ?', (email,))
-    user = c.fetchone()
-    if user and pbkdf2_sha256.verify(password, user[3]):
-        return user
+    with metrics.VERIFY_USER_SECONDS.time():
+        with metrics.db_seconds('verify_user').time():
+            user = db.fetchone('SELECT * FROM users WHERE email = ?', (email,))
+        if user and pbkdf2_sha256.verify(password, user[3]):
+            metrics.logins('success').inc()
+            return user
+    metrics.logins('failure').inc()
     return None
 
 # Navigation
@@ -158,6 +221,47 @@ def show_navigation():
     pages = ["Home", "Predictions", "Reviews", "About", "Account"]
     st.session_state.page = st.sidebar.radio("Menu", pages)
 
+def model_status():
+    if model_loader is None:
+        st.sidebar.caption(f"🛰️ Inference server at {config.INFERENCE_SERVER_ADDRESS}")
+    elif model_loader.ready():
+        st.sidebar.caption(f"🟢 Model ready ({model_loader.load_seconds:.1f}s to load)")
+    elif model_loader.failed():
+        st.sidebar.caption("🔴 Model failed to load; uploads will retry it")
+    else:
+        st.sidebar.caption("🟡 Loading model...")
+
+def batch_stats_panel():
+    if not config.SHOW_BATCH_STATS or not model_loader or not model_loader.ready():
+        return
+    stats = load_batcher().stats()
+    with st.sidebar.expander("⚙️ Inference Queue"):
+        st.write(f"Queue depth: {stats['queue_depth']}")
+        st.write(f"Last batch size: {stats['last_batch_size']}")
+        st.write(f"Average batch size: {stats['avg_batch_size']:.2f}")
+        st.write(f"Batches run: {stats['batches']} ({stats['images']} images)")
+        if config.CASCADE:
+            cascade = load_model().stats()
+            st.write(f"Answered by first stage: {cascade['early_exits']}/{cascade['images']} "
+                     f"({cascade['early_exit_rate']:.0%})")
+        st.caption(f"max batch {stats['max_batch_size']}, max wait {stats['max_wait_ms']:.0f} ms")
+
+def metrics_panel():
+    user = st.session_state.user
+    if not user or user[2] not in config.ADMIN_EMAILS:
+        return
+    with st.sidebar.expander("📊 Performance"):
+        for row in metrics.summary():
+            if row['kind'] == 'counter':
+                st.write(f"{row['name']}: {row['value']}")
+            elif row['name'].startswith('agrodoc_image_bytes'):
+                st.write(f"{row['name']}: {row['count']} uploads, "
+                         f"p50 {row['p50'] / 1024:.0f} KB, p99 {row['p99'] / 1024:.0f} KB")
+            else:
+                st.write(f"{row['name']}: {row['count']} calls, p50 {row['p50'] * 1000:.1f} ms, "
+                         f"p95 {row['p95'] * 1000:.1f} ms, p99 {row['p99'] * 1000:.1f} ms")
+        st.caption(f"Percentiles over the last {metrics.REGISTRY.window} samples per series")
+
 # Pages
 def home_page():
     st.title("🌱 Agrodoc - Plant Disease Detection")
@@ -186,50 +290,64 @@ def home_page():
             st.experimental_rerun()
 
 def process_image(uploaded_file):
+    start = time.perf_counter()
     try:
+        from preprocessing import load_image, model_input
+        
+        prediction_cache = load_prediction_cache()
+        metrics.IMAGE_BYTES.observe(uploaded_file.size)
+        
         with st.spinner('Analyzing plant health...'):
-            # Preprocess image to match training pipeline
-            image = Image.open(uploaded_file).convert('RGB')
-            img_array = np.array(image)
+            with metrics.DECODE_SECONDS.time():
+                image = load_image(uploaded_file)
+                image.load()
+            # Shared preprocessing, written into this session thread's
+            # reusable input buffer
+            with metrics.PREPROCESS_SECONDS.time():
+                input_arr = model_input(image)
             
-            # Convert BGR to RGB if needed
-            if img_array.shape[2] == 3:
-                img = cv2.cvtColor(img_array, cv2.COLOR_BGR2RGB)
-            else:
-                img = img_array
-            
-            # Resize and normalize
-            img = cv2.resize(img, (128, 128))
-            img = img.astype('float32') / 255.0  # Explicit type conversion
+            # Make prediction, unless this exact input or a near duplicate
+            # from the same user was scored recently
+            user_id = st.session_state.user[0]
+            cache_key = input_key(input_arr) if prediction_cache else None
+            prediction = prediction_cache.get(cache_key) if prediction_cache else None
+            phash = dhash(image) if duplicate_index else None
+            near_duplicate = None
+            if prediction is None and duplicate_index:
+                near_duplicate = duplicate_index.find(user_id, phash)
             
-            # Expand dimensions for model input
-            input_arr = np.expand_dims(img, axis=0)
-            
-            # Make prediction
-            prediction = model.predict(input_arr)
-            confidence = np.max(prediction)
-            result_index = np.argmax(prediction)
-            disease = CLASS_NAMES[result_index]
+            if near_duplicate:
+                metrics.cache_lookups('near_duplicate').inc()
+                disease, confidence = near_duplicate
+            else:
+                if prediction is None:
+                    metrics.cache_lookups('miss').inc()
+                    with metrics.INFERENCE_SECONDS.time():
+                        prediction = run_inference(input_arr, uploaded_file.getbuffer())
+                    if prediction_cache:
+                        prediction_cache.put(cache_key, prediction)
+                else:
+                    metrics.cache_lookups('hit').inc()
+                confidence = np.max(prediction)
+                result_index = np.argmax(prediction)
+                disease = CLASS_NAMES[result_index]
             
             # Save prediction
-            timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"{timestamp}_{uploaded_file.name}"
-            file_path = os.path.join('uploads', filename)
-            image.save(file_path)
+            with metrics.SAVE_SECONDS.time():
+                file_path = save_upload(uploaded_file.getbuffer(), uploaded_file.name)
             
-            c.execute('''INSERT INTO predictions 
-                       (user_id, image_path, prediction, confidence) 
-                       VALUES (?, ?, ?, ?)''',
-                     (st.session_state.user[0], file_path, disease, float(confidence)))
-            conn.commit()
+            with metrics.db_seconds('insert_prediction').time():
+                save_prediction(user_id, file_path, disease, float(confidence), phash)
             
             # Update session state
             st.session_state.latest_prediction = (image, disease, confidence)
             st.session_state.prediction_done = True
 
     except Exception as e:
+        metrics.PROCESS_ERRORS.inc()
         st.error(f"Error: {str(e)}")
     finally:
+        metrics.PROCESS_SECONDS.observe(time.perf_counter() - start)
         st.session_state.processing = False
         st.experimental_rerun()
 
@@ -250,26 +368,23 @@ def prediction_page():
     
     st.subheader("Filter Predictions")
     selected_date = st.date_input("Select date", value=st.session_state.selected_date)
+    if selected_date != st.session_state.selected_date:
+        st.session_state.prediction_cursors = (None,)
     st.session_state.selected_date = selected_date
     
     col1, col2, col3 = st.columns([2, 3, 2])
     with col1:
-        if st.button("Previous") and st.session_state.prediction_page > 0:
-            st.session_state.prediction_page -= 1
+        if st.button("Previous") and len(st.session_state.prediction_cursors) > 1:
+            st.session_state.prediction_cursors = st.session_state.prediction_cursors[:-1]
     with col3:
-        if st.button("Next"):
-            st.session_state.prediction_page += 1
+        if st.button("Next") and st.session_state.prediction_next_cursor:
+            st.session_state.prediction_cursors += (st.session_state.prediction_next_cursor,)
     
-    offset = st.session_state.prediction_page * 10
-    query = '''SELECT timestamp, prediction, confidence 
-               FROM predictions 
-               WHERE user_id = ? AND DATE(timestamp) = ?
-               ORDER BY timestamp DESC 
-               LIMIT 10 OFFSET ?'''
-    c.execute(query, (st.session_state.user[0], 
-                     st.session_state.selected_date, 
-                     offset))
-    history = c.fetchall()
+    with metrics.db_seconds('history_page').time(), \
+            pending_predictions(st.session_state.user[0]) as pending:
+        history, st.session_state.prediction_next_cursor = history_page(
+            db, st.session_state.user[0], 10, st.session_state.prediction_cursors[-1],
+            day=selected_date, pending=pending)
     
     if history:
         st.subheader("Prediction History")
@@ -297,21 +412,20 @@ def review_page():
         rating = st.slider("Rating (1-5 stars)", 1, 5)
         if st.form_submit_button("Submit Review"):
             try:
-                c.execute('''INSERT INTO reviews 
-                           (user_id, review_text, rating) 
-                           VALUES (?, ?, ?)''',
-                         (st.session_state.user[0], review_text, rating))
-                conn.commit()
+                with db.transaction() as conn:
+                    conn.execute('''INSERT INTO reviews 
+                                 (user_id, review_text, rating) 
+                                 VALUES (?, ?, ?)''',
+                                 (st.session_state.user[0], review_text, rating))
                 st.success("Thank you for your review!")
             except sqlite3.Error as e:
                 st.error(f"Database error: {str(e)}")
 
     st.subheader("Recent Reviews")
     try:
-        c.execute('''SELECT users.name, reviews.review_text, reviews.rating, reviews.created_at 
-                   FROM reviews JOIN users ON reviews.user_id = users.id 
-                   ORDER BY reviews.created_at DESC LIMIT 10''')
-        reviews = c.fetchall()
+        reviews = db.fetchall('''SELECT users.name, reviews.review_text, reviews.rating, reviews.created_at 
+                                 FROM reviews JOIN users ON reviews.user_id = users.id 
+                                 ORDER BY reviews.created_at DESC LIMIT 10''')
         
         for review in reviews:
             stars = "⭐" * review[2]
@@ -379,13 +493,13 @@ def account_page():
             st.experimental_rerun()
         
         st.subheader("Preferences")
-        c.execute('SELECT show_notifications FROM users WHERE id = ?',
-                 (st.session_state.user[0],))
-        show_notifications = st.checkbox("Enable notifications", value=c.fetchone()[0])
+        enabled = db.fetchone('SELECT show_notifications FROM users WHERE id = ?',
+                              (st.session_state.user[0],))[0]
+        show_notifications = st.checkbox("Enable notifications", value=enabled)
         if show_notifications != st.session_state.user[5]:
-            c.execute('UPDATE users SET show_notifications = ? WHERE id = ?',
-                     (show_notifications, st.session_state.user[0]))
-            conn.commit()
+            with db.transaction() as conn:
+                conn.execute('UPDATE users SET show_notifications = ? WHERE id = ?',
+                             (show_notifications, st.session_state.user[0]))
             st.success("Preferences updated!")
     else:
         login_register_tab()
@@ -417,8 +531,7 @@ def check_authentication():
     if not st.session_state.user:
         query_params = st.experimental_get_query_params()
         if 'user_id' in query_params:
-            c.execute('SELECT * FROM users WHERE id = ?', (query_params['user_id'][0],))
-            user = c.fetchone()
+            user = db.fetchone('SELECT * FROM users WHERE id = ?', (query_params['user_id'][0],))
             if user:
                 st.session_state.user = user
         else:
@@ -432,6 +545,9 @@ def main():
         return
     
     show_navigation()
+    model_status()
+    batch_stats_panel()
+    metrics_panel()
     
     if st.session_state.page == 'Home':
         home_page()
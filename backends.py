@@ -0,0 +1,393 @@
+import itertools
+import json
+import os
+import sys
+import threading
+import warnings
+
+import numpy as np
+
+import config
+
+# Inference engines behind load_model(). Every backend exposes
+# predict(input_arr) -> (batch, 38) softmax array and the model_path it was
+# loaded from, so process_image and the MicroBatcher do not care which one
+# is in use.
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def configure_threads():
+    """Applies the configured TensorFlow thread pools, before its runtime starts if possible"""
+    intra, inter = config.INTRA_OP_THREADS, config.INTER_OP_THREADS
+    if 'tensorflow' not in sys.modules:
+        # Read by TensorFlow when its runtime starts, so nothing has to be
+        # imported for backends that may not need TensorFlow at all. A
+        # configured or tuned count replaces any inherited value; only when
+        # neither is set does TensorFlow fall back to the environment
+        if intra:
+            os.environ['TF_NUM_INTRAOP_THREADS'] = str(intra)
+        if inter:
+            os.environ['TF_NUM_INTEROP_THREADS'] = str(inter)
+        return
+    import tensorflow as tf
+    try:
+        if intra and tf.config.threading.get_intra_op_parallelism_threads() != intra:
+            tf.config.threading.set_intra_op_parallelism_threads(intra)
+        if inter and tf.config.threading.get_inter_op_parallelism_threads() != inter:
+            tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError:
+        warnings.warn("TensorFlow was initialized before its thread settings could be applied; "
+                      "keeping its current thread pools")
+
+def compute_threads(name=None):
+    """Threads one process running the given backend computes with"""
+    name = name or config.BACKEND
+    if name.startswith('tflite'):
+        return config.TFLITE_THREADS or 1
+    # Inter-op threads only matter when independent ops can run side by
+    # side, which the sequential CNN never has, so the intra-op pool is
+    # what competes for cores
+    inherited = os.environ.get('TF_NUM_INTRAOP_THREADS', '')
+    return config.INTRA_OP_THREADS or (int(inherited) if inherited.isdigit() else 0) or available_cores()
+
+def check_thread_oversubscription(workers=None, name=None):
+    """Warns when the inference threads of all workers on the host exceed its cores"""
+    workers = workers or config.WORKERS_PER_HOST
+    total, cores = workers * compute_threads(name), available_cores()
+    if total > cores:
+        warnings.warn(f"{workers} worker(s) x {compute_threads(name)} inference threads = {total} threads "
+                      f"on {cores} cores; set AGRODOC_INTRA_OP_THREADS or run tune_threads.py "
+                      f"with --workers {workers}")
+        return False
+    return True
+
+class KerasBackend:
+    name = 'keras'
+
+    def __init__(self, model_path, compiled=False, jit_compile=False, warmup=False):
+        import tensorflow as tf
+        self.model_path = model_path
+        self.model = tf.keras.models.load_model(model_path)
+        self._infer = None
+        if compiled:
+            # model.predict builds a data adapter and runs callbacks on every
+            # call; a traced function with a fixed signature skips all of it
+            model = self.model
+            self._infer = tf.function(
+                lambda images: model(images, training=False),
+                input_signature=[tf.TensorSpec((None, 128, 128, 3), tf.float32)],
+                jit_compile=jit_compile,
+            )
+        if warmup:
+            self.predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+
+    def predict(self, input_arr):
+        if self._infer is None:
+            return self.model.predict(input_arr, verbose=0)
+        return self._infer(np.asarray(input_arr, dtype=np.float32)).numpy()
+
+def _tflite_interpreter(model_path, num_threads, shared_weights=False):
+    # tflite_runtime is a few MB and avoids importing TensorFlow at all;
+    # fall back to the interpreter bundled with TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter, OpResolverType
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+        OpResolverType = tf.lite.experimental.OpResolverType
+    kwargs = {}
+    if shared_weights:
+        # The flatbuffer given by path is mmap'd read-only and the builtin
+        # kernels read constant tensors in place, so every worker on the host
+        # shares one copy of the weights through the page cache. The default
+        # XNNPACK delegate would repack them into private memory instead.
+        kwargs['experimental_op_resolver_type'] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    return Interpreter(model_path=model_path, num_threads=num_threads, **kwargs)
+
+class TFLiteBackend:
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None, warmup=False, shared_weights=False):
+        self.model_path = model_path
+        self.interpreter = _tflite_interpreter(model_path, num_threads, shared_weights)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input['shape'][0])
+        # An interpreter holds its tensors in place and must not be shared
+        # between threads mid-invoke
+        self._lock = threading.Lock()
+        if warmup:
+            self.predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+
+    def _resize(self, batch_size):
+        self.interpreter.resize_tensor_input(self._input['index'],
+                                             [batch_size, *self._input['shape'][1:]])
+        self.interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def _quantize(self, input_arr):
+        dtype = self._input['dtype']
+        scale, zero_point = self._input['quantization']
+        if scale:
+            # Integer model: map float pixels onto the calibrated input range
+            info = np.iinfo(dtype)
+            input_arr = np.clip(np.round(input_arr / scale + zero_point), info.min, info.max)
+        return input_arr.astype(dtype, copy=False)
+
+    def _dequantize(self, output):
+        scale, zero_point = self._output['quantization']
+        if scale:
+            return (output.astype(np.float32) - zero_point) * scale
+        return output.copy()
+
+    def predict(self, input_arr):
+        with self._lock:
+            if len(input_arr) != self._batch_size:
+                self._resize(len(input_arr))
+            self.interpreter.set_tensor(self._input['index'], self._quantize(input_arr))
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']))
+
+REDUCED_PRECISION = ('float16', 'bfloat16')
+
+# CPU flags for native half-precision arithmetic; elsewhere the weights are
+# kept in half precision but upcast to float32 one layer at a time. Only
+# bfloat16 qualifies: TensorFlow's CPU float16 convolutions fall back to
+# generic kernels several times slower than float32 even on AVX512-FP16.
+_NATIVE_FLAGS = {
+    'bfloat16': {'avx512_bf16', 'amx_bf16'},
+}
+
+def native_half_precision(dtype):
+    if dtype not in _NATIVE_FLAGS:
+        return False
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return bool(_NATIVE_FLAGS[dtype] & set(line.split()))
+    except OSError:
+        pass
+    return False
+
+def _to_bfloat16_bits(array):
+    """float32 -> bfloat16 bit patterns as uint16, rounding to nearest even"""
+    bits = np.ascontiguousarray(array, dtype=np.float32).view(np.uint32)
+    return ((bits + 0x7FFF + ((bits >> 16) & 1)) >> 16).astype(np.uint16)
+
+# Layer config entries the reduced-precision executor needs
+_SPEC_KEYS = ('activation', 'strides', 'padding', 'dilation_rate', 'pool_size', 'use_bias',
+              'scale', 'offset', 'keepdims')
+
+def convert_to_reduced_precision(h5_path, output_path, dtype):
+    """Writes the layer specs and half-precision weights of a Sequential Keras model"""
+    import tensorflow as tf
+    model = tf.keras.models.load_model(h5_path)
+    specs, arrays = [], {}
+    for i, layer in enumerate(model.layers):
+        layer_config = layer.get_config()
+        specs.append({'type': layer.__class__.__name__,
+                      **{key: layer_config[key] for key in _SPEC_KEYS if key in layer_config}})
+        for j, weight in enumerate(layer.get_weights()):
+            arrays[f"w{i}_{j}"] = (_to_bfloat16_bits(weight) if dtype == 'bfloat16'
+                                   else weight.astype(np.float16))
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, spec=np.array(json.dumps({'dtype': dtype, 'layers': specs})), **arrays)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+class ReducedPrecisionBackend:
+    """Runs a Sequential CNN from float16/bfloat16 weights without building a Keras model
+
+    With native compute the whole network runs in half precision (softmax
+    in float32); otherwise each layer's weights are cast to float32 just
+    for that layer, so the model stays half-size in memory.
+    """
+    name = 'reduced-precision'
+
+    def __init__(self, model_path, compute='auto', warmup=False):
+        import tensorflow as tf
+        self.model_path = model_path
+        with np.load(model_path) as data:
+            spec = json.loads(str(data['spec']))
+            self.dtype = spec['dtype']
+            self.layers = spec['layers']
+            half = tf.bfloat16 if self.dtype == 'bfloat16' else tf.float16
+            self.weights = []
+            for i in range(len(self.layers)):
+                layer_weights = []
+                for j in itertools.count():
+                    key = f"w{i}_{j}"
+                    if key not in data:
+                        break
+                    value = tf.constant(data[key])
+                    if self.dtype == 'bfloat16':
+                        value = tf.bitcast(value, tf.bfloat16)
+                    layer_weights.append(tf.Variable(value, trainable=False))
+                self.weights.append(layer_weights)
+        if compute == 'auto':
+            compute = 'native' if native_half_precision(self.dtype) else 'upcast'
+        self.compute = compute
+        self._compute_dtype = half if compute == 'native' else tf.float32
+        self._infer = tf.function(self._forward,
+                                  input_signature=[tf.TensorSpec((None, 128, 128, 3), tf.float32)])
+        if warmup:
+            self.predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+
+    def _activation(self, x, name):
+        import tensorflow as tf
+        if name in (None, 'linear'):
+            return x
+        if name == 'relu':
+            return tf.nn.relu(x)
+        if name == 'softmax':
+            return tf.nn.softmax(tf.cast(x, tf.float32))
+        raise ValueError(f"Unsupported activation: {name}")
+
+    def _forward(self, images):
+        import tensorflow as tf
+        x = tf.cast(images, self._compute_dtype)
+        for spec, weights in zip(self.layers, self.weights):
+            kind = spec['type']
+            weights = [tf.cast(w, self._compute_dtype) for w in weights]
+            if kind == 'Conv2D':
+                x = tf.nn.conv2d(x, weights[0], strides=spec['strides'], padding=spec['padding'].upper(),
+                                 dilations=spec['dilation_rate'])
+            elif kind == 'SeparableConv2D':
+                x = tf.nn.separable_conv2d(x, weights[0], weights[1], strides=[1, *spec['strides'], 1],
+                                           padding=spec['padding'].upper(), dilations=spec['dilation_rate'])
+            elif kind == 'Dense':
+                x = tf.matmul(x, weights[0])
+            elif kind == 'MaxPooling2D':
+                x = tf.nn.max_pool2d(x, spec['pool_size'], spec['strides'] or spec['pool_size'],
+                                     spec['padding'].upper())
+            elif kind == 'GlobalAveragePooling2D':
+                x = tf.reduce_mean(x, axis=[1, 2], keepdims=spec.get('keepdims', False))
+            elif kind == 'Flatten':
+                x = tf.reshape(x, [tf.shape(x)[0], -1])
+            elif kind == 'Rescaling':
+                x = x * tf.cast(spec['scale'], x.dtype) + tf.cast(spec['offset'], x.dtype)
+            elif kind not in ('Dropout', 'InputLayer', 'Activation'):
+                raise ValueError(f"Unsupported layer for reduced precision: {kind}")
+            if kind in ('Conv2D', 'SeparableConv2D', 'Dense') and spec.get('use_bias', True):
+                x = tf.nn.bias_add(x, weights[-1])
+            if 'activation' in spec:
+                x = self._activation(x, spec['activation'])
+        return tf.cast(x, tf.float32)
+
+    def predict(self, input_arr):
+        return self._infer(np.asarray(input_arr, dtype=np.float32)).numpy()
+
+class CascadeBackend:
+    """Scores with a small model first and sends only unsure rows to the full one"""
+    name = 'cascade'
+
+    def __init__(self, first, second, threshold):
+        self.first = first
+        self.second = second
+        self.threshold = threshold
+        self.model_path = second.model_path
+        self._lock = threading.Lock()
+        self.images = 0
+        self.early_exits = 0
+
+    def predict(self, input_arr):
+        # Copied because the unsure rows are overwritten in place
+        probabilities = np.array(self.first.predict(input_arr), dtype=np.float32)
+        unsure = np.max(probabilities, axis=1) < self.threshold
+        if unsure.any():
+            probabilities[unsure] = self.second.predict(input_arr[unsure])
+        with self._lock:
+            self.images += len(input_arr)
+            self.early_exits += int(len(input_arr) - unsure.sum())
+        return probabilities
+
+    def stats(self):
+        with self._lock:
+            return {'images': self.images, 'early_exits': self.early_exits,
+                    'early_exit_rate': self.early_exits / self.images if self.images else 0.0}
+
+def convert_to_tflite(h5_path, tflite_path):
+    """Converts the Keras H5 model into a float32 TFLite flatbuffer"""
+    import tensorflow as tf
+    model = tf.keras.models.load_model(h5_path)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    tflite_model = converter.convert()
+    # Workers may map the published file at any moment, so never rewrite it
+    # in place
+    tmp_path = f"{tflite_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(tflite_model)
+    os.replace(tmp_path, tflite_path)
+    return tflite_path
+
+def ensure_tflite_model(h5_path=None, tflite_path=None):
+    """Runs the conversion once, or again when the H5 file is newer"""
+    h5_path = h5_path or config.MODEL_PATH
+    tflite_path = tflite_path or config.TFLITE_MODEL_PATH
+    if (not os.path.exists(tflite_path)
+            or os.path.getmtime(tflite_path) < os.path.getmtime(h5_path)):
+        convert_to_tflite(h5_path, tflite_path)
+    return tflite_path
+
+def ensure_reduced_precision_model(dtype, h5_path=None):
+    """Converts the H5 model once per dtype, or again when the H5 file is newer"""
+    h5_path = h5_path or config.MODEL_PATH
+    output_path = f"{os.path.splitext(h5_path)[0]}.{dtype}.npz"
+    if (not os.path.exists(output_path)
+            or os.path.getmtime(output_path) < os.path.getmtime(h5_path)):
+        convert_to_reduced_precision(h5_path, output_path, dtype)
+    return output_path
+
+def model_file(name=None):
+    """Path of the artifact the given backend loads, converting it first if needed"""
+    name = name or config.BACKEND
+    if name == 'keras':
+        return config.MODEL_PATH
+    if name in REDUCED_PRECISION:
+        return ensure_reduced_precision_model(name)
+    if name == 'tflite':
+        return ensure_tflite_model()
+    if name == 'tflite-int8':
+        # Produced by quantize.py, which needs calibration data, so it is
+        # never built implicitly here
+        if not os.path.exists(config.TFLITE_INT8_MODEL_PATH):
+            raise FileNotFoundError(f"{config.TFLITE_INT8_MODEL_PATH} not found, run quantize.py first")
+        return config.TFLITE_INT8_MODEL_PATH
+    raise ValueError(f"Unknown inference backend: {name}")
+
+def model_files(name=None):
+    """Every artifact whose weights shape the active backend's predictions"""
+    paths = [model_file(name)]
+    if config.CASCADE:
+        paths.append(config.CASCADE_MODEL_PATH)
+    return paths
+
+def load_model_file(path):
+    configure_threads()
+    if path.endswith('.npz'):
+        return ReducedPrecisionBackend(path, compute=config.REDUCED_PRECISION_COMPUTE,
+                                       warmup=config.WARMUP_ON_LOAD)
+    if path.endswith('.tflite'):
+        return TFLiteBackend(path, num_threads=config.TFLITE_THREADS,
+                             warmup=config.WARMUP_ON_LOAD, shared_weights=config.SHARED_WEIGHTS)
+    return KerasBackend(path,
+                        compiled=config.COMPILED_INFERENCE,
+                        jit_compile=config.XLA_JIT,
+                        warmup=config.WARMUP_ON_LOAD)
+
+def load_backend(name=None, cascade=None):
+    name = name or config.BACKEND
+    cascade = config.CASCADE if cascade is None else cascade
+    check_thread_oversubscription(name=name)
+    backend = load_model_file(model_file(name))
+    if cascade:
+        backend = CascadeBackend(load_model_file(config.CASCADE_MODEL_PATH), backend,
+                                 config.CASCADE_THRESHOLD)
+    return backend
@@ -0,0 +1,342 @@
+import argparse
+import contextlib
+import functools
+import io
+import ipaddress
+import json
+import os
+import secrets
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from email.parser import BytesHeaderParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+import config
+from backends import load_backend
+from class_names import CLASS_NAMES
+from database import init_db
+from preprocessing import load_image, to_model_input
+from uploads import save_upload
+
+# Batch prediction API for partner co-ops. POST /v1/batch takes a zip archive
+# or a multipart upload of many photos and streams one NDJSON line per image
+# back as each model batch finishes.
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+class UploadTooLarge(ValueError):
+    pass
+
+def extract_images(content_type, body, stack, max_unpacked):
+    """Returns (name, read) pairs from a zip or multipart/form-data body.
+
+    body is a seekable file. Nothing is decompressed or copied into memory
+    until read() is called from the decode threads: zip members stay
+    compressed, multipart parts are ranges of body. Archives and temporary
+    files are closed by `stack`. Raises UploadTooLarge when the images would
+    unpack to more than max_unpacked bytes, before any of them is read.
+    """
+    if content_type.startswith('multipart/'):
+        header = Message()
+        header['Content-Type'] = content_type
+        boundary = header.get_boundary()
+        if not boundary:
+            raise ValueError("multipart upload without a boundary")
+        # Scanned before any part is read, since reads move the file position
+        parts = list(_multipart_parts(body, boundary.encode()))
+        lock = threading.Lock()
+        items = []
+        for headers, start, end in parts:
+            name = headers.get_filename() or headers.get_param('name', header='content-disposition') or 'upload'
+            if name.lower().endswith('.zip'):
+                items.extend(_zip_images(_copy_range(body, start, end, stack), stack))
+            else:
+                items.append((name, end - start, functools.partial(_read_range, body, lock, start, end - start)))
+    else:
+        items = _zip_images(body, stack)
+    # Sizes come from the archive directory; zipfile never returns more
+    # than a member's declared file_size, so the sum bounds what is read
+    unpacked = sum(size for _, size, _ in items)
+    if unpacked > max_unpacked:
+        raise UploadTooLarge(f"images unpack to {unpacked >> 20} MB, limit is {max_unpacked >> 20} MB")
+    return [(name, read) for name, _, read in items]
+
+def _multipart_parts(body, boundary, chunk_size=1 << 20, max_headers=64 * 1024):
+    """Yields (headers, start, end) for each part of a multipart body,
+    with the part's content at body offsets [start, end). Reads body in
+    chunks, holding at most about one chunk in memory."""
+    delimiter = b'\r\n--' + boundary
+    # The leading CRLF lets the first delimiter match like the others
+    buffer, base, position = b'\r\n', -2, 0
+    part = None
+    while True:
+        index = buffer.find(delimiter, position)
+        after = index + len(delimiter)
+        closing = index >= 0 and buffer[after:after + 2] == b'--'
+        headers_end = buffer.find(b'\r\n\r\n', after) if index >= 0 and not closing else -1
+        if index < 0 or not (closing or headers_end >= 0):
+            if index >= 0 and len(buffer) - index > max_headers:
+                raise ValueError("multipart part headers are too long")
+            chunk = body.read(chunk_size)
+            if not chunk:
+                raise ValueError("multipart body ended before its closing boundary")
+            # Keep only what a delimiter could still start in
+            drop = index if index >= 0 else max(position, len(buffer) - len(delimiter) + 1)
+            base += drop
+            buffer = buffer[drop:] + chunk
+            position = 0
+            continue
+        if part is not None:
+            yield (*part, base + index)
+        if closing:
+            return
+        line_end = buffer.index(b'\r\n', after)
+        part = (BytesHeaderParser(policy=HTTP).parsebytes(buffer[line_end + 2:headers_end + 4]),
+                base + headers_end + 4)
+        position = headers_end + 4
+
+def _read_range(file, lock, start, size):
+    with lock:
+        file.seek(start)
+        return file.read(size)
+
+def _copy_range(file, start, end, stack, chunk_size=1 << 20):
+    """Copies body[start:end] to a temporary file, for zipfile to open"""
+    copy = stack.enter_context(tempfile.TemporaryFile())
+    file.seek(start)
+    remaining = end - start
+    while remaining:
+        chunk = file.read(min(chunk_size, remaining))
+        copy.write(chunk)
+        remaining -= len(chunk)
+    copy.seek(0)
+    return copy
+
+def _zip_images(file, stack):
+    archive = stack.enter_context(zipfile.ZipFile(file))
+    return [(info.filename, info.file_size, functools.partial(archive.read, info))
+            for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)]
+
+def spool_body(rfile, length, chunk_size=1 << 20):
+    """Copies the request body to a temporary file, in memory while it is small"""
+    body = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    remaining = length
+    while remaining:
+        chunk = rfile.read(min(chunk_size, remaining))
+        if not chunk:
+            raise ValueError(f"body ended {remaining} bytes short of Content-Length")
+        body.write(chunk)
+        remaining -= len(chunk)
+    body.seek(0)
+    return body
+
+def decode(item, upload_dir):
+    """Saves the original bytes like process_image and builds the model input"""
+    name, read = item
+    try:
+        data = read()
+        input_arr = to_model_input(load_image(io.BytesIO(data)))
+    except Exception as e:
+        return name, None, None, str(e)
+    # Archives often repeat file names across folders
+    file_path = save_upload(data, f"{secrets.token_hex(4)}_{os.path.basename(name)}", upload_dir)
+    return name, file_path, input_arr, None
+
+def decoded_batches(pool, items, batch_size, upload_dir):
+    """Yields lists of decoded items, keeping at most two batches of decodes in flight"""
+    futures = []
+    position = 0
+    while position < len(items) or futures:
+        while position < len(items) and len(futures) < 2 * batch_size:
+            futures.append(pool.submit(decode, items[position], upload_dir))
+            position += 1
+        batch, futures = futures[:batch_size], futures[batch_size:]
+        yield [future.result() for future in batch]
+
+def user_exists(db_path, user_id):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute('SELECT 1 FROM users WHERE id = ?', (user_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def top_k(probabilities, k):
+    indices = np.argsort(probabilities)[::-1][:k]
+    return [{'class': CLASS_NAMES[i], 'confidence': float(probabilities[i])} for i in indices]
+
+class BatchHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if status >= 400:
+            # Errors are sent before (or while) reading the upload; close the
+            # connection so its unread bytes aren't parsed as the next request
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        data = (json.dumps(payload) + '\n').encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/v1/batch':
+            self._send_json(404, {'error': 'not found'})
+            return
+        if config.API_TOKEN and not secrets.compare_digest(self.headers.get('Authorization', ''),
+                                                           f"Bearer {config.API_TOKEN}"):
+            self._send_json(401, {'error': 'unauthorized'})
+            return
+
+        params = parse_qs(url.query)
+        try:
+            user_id = int(params['user_id'][0])
+            k = int(params.get('top_k', ['3'])[0])
+        except (KeyError, ValueError):
+            self._send_json(400, {'error': 'user_id is required, top_k must be an integer'})
+            return
+        if k < 1:
+            self._send_json(400, {'error': 'top_k must be at least 1'})
+            return
+        k = min(k, len(CLASS_NAMES))
+        if not user_exists(self.server.db_path, user_id):
+            self._send_json(400, {'error': f"unknown user_id {user_id}"})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length > config.API_MAX_UPLOAD_MB * 1024 * 1024:
+            self._send_json(413, {'error': 'upload too large'})
+            return
+        with contextlib.ExitStack() as stack:
+            try:
+                body = stack.enter_context(spool_body(self.rfile, length))
+                items = extract_images(self.headers.get('Content-Type', ''), body, stack,
+                                       config.API_MAX_UNPACKED_MB * 1024 * 1024)
+            except UploadTooLarge as e:
+                self._send_json(413, {'error': str(e)})
+                return
+            except Exception as e:
+                self._send_json(400, {'error': f"could not read upload: {e}"})
+                return
+            self._stream_results(items, user_id, k)
+
+    def _stream_results(self, items, user_id, k):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        rows, errors, failure = [], 0, None
+        try:
+            for batch in decoded_batches(self.server.decode_pool, items,
+                                         self.server.batch_size, self.server.upload_dir):
+                decoded = [entry for entry in batch if entry[3] is None]
+                for name, _, _, error in batch:
+                    if error is not None:
+                        errors += 1
+                        self._write_chunk({'file': name, 'error': error})
+                if not decoded:
+                    continue
+                with self.server.model_lock:
+                    probabilities = self.server.backend.predict(np.concatenate([entry[2] for entry in decoded]))
+                for (name, file_path, _, _), row in zip(decoded, probabilities):
+                    index = int(np.argmax(row))
+                    rows.append((user_id, file_path, CLASS_NAMES[index], float(row[index])))
+                    self._write_chunk({'file': name, 'class': CLASS_NAMES[index],
+                                       'confidence': float(row[index]), 'top_k': top_k(row, k)})
+        except Exception as e:
+            failure = e
+        # One transaction for the whole upload instead of a commit per
+        # image, written even if the client went away mid-stream
+        if rows:
+            try:
+                self._save(rows)
+            except Exception as e:
+                failure = failure or e
+                rows = []
+
+        # Always end the stream, so clients never wait on a truncated response
+        try:
+            if failure is None:
+                self._write_chunk({'done': True, 'predicted': len(rows), 'errors': errors})
+            else:
+                self._write_chunk({'error': f"batch failed: {failure}", 'done': False,
+                                   'predicted': len(rows), 'errors': errors})
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            pass  # Client disconnected
+
+    def _save(self, rows):
+        conn = sqlite3.connect(self.server.db_path)
+        try:
+            conn.executemany('''INSERT INTO predictions (user_id, image_path, prediction, confidence)
+                                VALUES (?, ?, ?, ?)''', rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def log_message(self, format, *args):
+        pass
+
+class BatchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, batch_size, decode_threads, db_path='plant_disease.db', upload_dir='uploads'):
+        super().__init__(address, BatchHandler)
+        self.batch_size = batch_size
+        self.db_path = db_path
+        init_db(db_path)
+        self.upload_dir = upload_dir
+        os.makedirs(upload_dir, exist_ok=True)
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_threads)
+        self.backend = load_backend()
+        # Large batches already use every core; run one at a time
+        self.model_lock = threading.Lock()
+
+def main():
+    host, port = config.API_ADDRESS.rsplit(':', 1)
+    parser = argparse.ArgumentParser(description="Batch prediction REST API")
+    parser.add_argument('--host', default=host)
+    parser.add_argument('--port', type=int, default=int(port))
+    parser.add_argument('--batch-size', type=int, default=config.API_BATCH_SIZE)
+    parser.add_argument('--decode-threads', type=int, default=config.API_DECODE_THREADS)
+    args = parser.parse_args()
+
+    # Without a token anyone who can reach the port can store predictions
+    if not config.API_TOKEN and not is_loopback(args.host):
+        parser.error(f"refusing to listen on {args.host} without AGRODOC_API_TOKEN; "
+                     "set a token or bind to 127.0.0.1")
+    server = BatchServer((args.host, args.port), args.batch_size, args.decode_threads)
+    print(f"Batch API on http://{args.host}:{args.port}/v1/batch")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
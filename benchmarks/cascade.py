@@ -0,0 +1,61 @@
+"""Early-exit rate, latency and agreement of cascade mode per threshold.
+
+Scores an evaluation folder with the first-stage and full models, then for
+each confidence threshold reports the share of images the first stage
+answers, top-1 agreement of the cascade with the full model, and the mean
+single-image latency of the real cascade. Run from the repository root:
+
+    python -m benchmarks.cascade --eval-dir valid --thresholds 0.8 0.9 0.95 0.99
+"""
+import argparse
+import time
+
+import numpy as np
+
+import config
+from backends import CascadeBackend, load_backend, load_model_file
+from quantize import image_dataset
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--eval-dir', default='valid', help="Images to evaluate on, sub-folders allowed")
+    parser.add_argument('--first-stage', default=config.CASCADE_MODEL_PATH)
+    parser.add_argument('--backend', default=config.BACKEND, help="Backend of the full model")
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.8, 0.9, 0.95, 0.99])
+    parser.add_argument('--latency-images', type=int, default=200,
+                        help="Images timed one at a time per threshold")
+    args = parser.parse_args()
+
+    full = load_backend(args.backend, cascade=False)
+    first = load_model_file(args.first_stage)
+
+    images = np.concatenate([batch.numpy() for batch in image_dataset(args.eval_dir, 32, shuffle=False)])
+    full_probabilities = np.concatenate([full.predict(images[i:i + 32]) for i in range(0, len(images), 32)])
+    first_probabilities = np.concatenate([first.predict(images[i:i + 32]) for i in range(0, len(images), 32)])
+    full_top1 = np.argmax(full_probabilities, axis=1)
+    first_top1 = np.argmax(first_probabilities, axis=1)
+    first_confidence = np.max(first_probabilities, axis=1)
+
+    timed = images[:args.latency_images]
+
+    def mean_latency_ms(backend):
+        backend.predict(timed[:1])
+        start = time.perf_counter()
+        for i in range(len(timed)):
+            backend.predict(timed[i:i + 1])
+        return (time.perf_counter() - start) * 1000.0 / len(timed)
+
+    print(f"{len(images)} images; first stage alone agrees with the full model on "
+          f"{np.mean(first_top1 == full_top1):.2%}")
+    print(f"full model only: {mean_latency_ms(full):.2f} ms/image, first stage only: "
+          f"{mean_latency_ms(first):.2f} ms/image")
+    print(f"\n{'threshold':>9} {'early exit':>11} {'agreement':>10} {'ms/image':>9}")
+    for threshold in args.thresholds:
+        early = first_confidence >= threshold
+        cascade_top1 = np.where(early, first_top1, full_top1)
+        latency = mean_latency_ms(CascadeBackend(first, full, threshold))
+        print(f"{threshold:>9.3f} {early.mean():>11.1%} {np.mean(cascade_top1 == full_top1):>10.2%} "
+              f"{latency:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+"""Concurrent prediction inserts and history paging against SQLite.
+
+N writer threads insert predictions the way process_image does while M
+reader threads page through a user's history like the Predictions page.
+Compares the old layout (one connection shared by every session, rollback
+journal) with per-thread connections on the default journal and with
+database.ConnectionPool (per-thread, WAL, tuned pragmas). Run from the
+repository root:
+
+    python -m benchmarks.db_concurrency --writers 4 --readers 8 --seconds 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from class_names import CLASS_NAMES
+from database import ConnectionPool
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS predictions
+            (id INTEGER PRIMARY KEY AUTOINCREMENT,
+             user_id INTEGER NOT NULL,
+             image_path TEXT NOT NULL,
+             prediction TEXT NOT NULL,
+             confidence REAL NOT NULL,
+             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)'''
+
+def create_db(path, users, rows_per_user):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions(user_id)')
+    rng = random.Random(0)
+    conn.executemany('INSERT INTO predictions (user_id, image_path, prediction, confidence) VALUES (?, ?, ?, ?)',
+                     ((user, f"uploads/{user}_{i}.jpg", rng.choice(CLASS_NAMES), rng.random())
+                      for user in range(users) for i in range(rows_per_user)))
+    conn.commit()
+    conn.close()
+
+class SharedConnection:
+    """The old layout: one module-level connection used by every session thread"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def insert(self, row):
+        with self._lock:
+            self._conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence) '
+                               'VALUES (?, ?, ?, ?)', row)
+            self._conn.commit()
+
+    def page(self, user_id, limit, offset):
+        with self._lock:
+            total = self._conn.execute('SELECT COUNT(*) FROM predictions WHERE user_id = ?',
+                                       (user_id,)).fetchone()[0]
+            rows = self._conn.execute('SELECT timestamp, prediction, confidence FROM predictions '
+                                      'WHERE user_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?',
+                                      (user_id, limit, offset)).fetchall()
+        return total, rows
+
+    def close(self):
+        self._conn.close()
+
+class ThreadConnections:
+    """A connection per thread, from ConnectionPool or plain sqlite3.connect"""
+
+    def __init__(self, path, pooled):
+        self._pool = ConnectionPool(path) if pooled else None
+        self._path = path
+        self._local = threading.local()
+        self._opened = []
+
+    def _conn(self):
+        if self._pool is not None:
+            return self._pool.connection()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self._path, timeout=5.0, check_same_thread=False)
+            self._opened.append(conn)
+        return conn
+
+    def insert(self, row):
+        conn = self._conn()
+        conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence) '
+                     'VALUES (?, ?, ?, ?)', row)
+        conn.commit()
+
+    def page(self, user_id, limit, offset):
+        conn = self._conn()
+        total = conn.execute('SELECT COUNT(*) FROM predictions WHERE user_id = ?', (user_id,)).fetchone()[0]
+        rows = conn.execute('SELECT timestamp, prediction, confidence FROM predictions '
+                            'WHERE user_id = ? ORDER BY timestamp DESC LIMIT ? OFFSET ?',
+                            (user_id, limit, offset)).fetchall()
+        return total, rows
+
+    def close(self):
+        for conn in self._opened:
+            conn.close()
+        if self._pool is not None:
+            self._pool.close()
+
+MODES = {
+    'shared': SharedConnection,
+    'per-thread': lambda path: ThreadConnections(path, pooled=False),
+    'pool': lambda path: ThreadConnections(path, pooled=True),
+}
+
+def run(mode, path, writers, readers, users, rows_per_user, seconds):
+    db = MODES[mode](path)
+    stop = threading.Event()
+    samples = {'write': [], 'read': []}
+    errors = {'write': 0, 'read': 0}
+    lock = threading.Lock()
+
+    def session(kind, seed):
+        rng = random.Random(seed)
+        latencies, failed = [], 0
+        while not stop.is_set():
+            user_id = rng.randrange(users)
+            start = time.perf_counter()
+            try:
+                if kind == 'write':
+                    db.insert((user_id, f"uploads/{seed}_{len(latencies)}.jpg",
+                               rng.choice(CLASS_NAMES), rng.random()))
+                else:
+                    db.page(user_id, 8, 8 * rng.randrange(max(1, rows_per_user // 8)))
+            except sqlite3.OperationalError:
+                failed += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000.0)
+        with lock:
+            samples[kind].extend(latencies)
+            errors[kind] += failed
+
+    threads = ([threading.Thread(target=session, args=('write', i)) for i in range(writers)]
+               + [threading.Thread(target=session, args=('read', 1000 + i)) for i in range(readers)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    db.close()
+
+    result = {}
+    for kind in ('write', 'read'):
+        values = np.asarray(samples[kind] or [0.0])
+        result[kind] = {
+            'per_s': len(samples[kind]) / seconds,
+            'p50_ms': float(np.percentile(values, 50)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'errors': errors[kind],
+        }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=4, help="Sessions inserting predictions")
+    parser.add_argument('--readers', type=int, default=8, help="Sessions paging through history")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--rows-per-user', type=int, default=100, help="Predictions seeded per user")
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--modes', nargs='+', default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.users * args.rows_per_user:,} seeded rows")
+    print(f"{'mode':<11} {'writes/s':>9} {'w p50 ms':>9} {'w p99 ms':>9} {'w err':>6} "
+          f"{'reads/s':>9} {'r p50 ms':>9} {'r p99 ms':>9} {'r err':>6}")
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            create_db(path, args.users, args.rows_per_user)
+            result = run(mode, path, args.writers, args.readers, args.users, args.rows_per_user, args.seconds)
+        write, read = result['write'], result['read']
+        print(f"{mode:<11} {write['per_s']:>9.1f} {write['p50_ms']:>9.2f} {write['p99_ms']:>9.2f} "
+              f"{write['errors']:>6} {read['per_s']:>9.1f} {read['p50_ms']:>9.2f} {read['p99_ms']:>9.2f} "
+              f"{read['errors']:>6}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""Full-resolution vs reduced-resolution decoding of uploads.
+
+Each variant runs in a fresh process so its peak RSS is measured on its own.
+The script also checks that the reduced decode gives model inputs, and with
+--backend predictions, that agree with the full-resolution path. Run from
+the repository root:
+
+    python -m benchmarks.decode --megapixels 12 48 --backend keras
+"""
+import argparse
+import glob
+import io
+import multiprocessing
+import resource
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.hot_path import synthetic_jpeg
+from perf import summarize, time_calls
+from preprocessing import IMAGE_SIZE, load_image, to_model_input
+
+def full_resolution(data):
+    """The preprocessing process_image used before reduced decoding"""
+    image = Image.open(io.BytesIO(data)).convert('RGB')
+    img = cv2.resize(np.array(image), IMAGE_SIZE)
+    return np.array([img], dtype=np.float32)
+
+def pil_draft(data):
+    return to_model_input(load_image(io.BytesIO(data)))
+
+def cv2_reduced(data):
+    img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_COLOR_4)
+    img = cv2.resize(cv2.cvtColor(img, cv2.COLOR_BGR2RGB), IMAGE_SIZE)
+    return np.array([img], dtype=np.float32)
+
+VARIANTS = {'full': full_resolution, 'pil-draft': pil_draft, 'cv2-reduced-4': cv2_reduced}
+
+def _reset_peak_rss():
+    # The high-water mark survives fork and exec, so a spawned child starts
+    # with the parent's peak; writing 5 to clear_refs resets it on Linux
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _peak_rss_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def _measure(variant, data, runs):
+    _reset_peak_rss()
+    if variant is None:
+        return None, _peak_rss_mb()
+    fn = VARIANTS[variant]
+    fn(data)
+    return summarize(time_calls(lambda: fn(data), runs=runs, warmup=0)), _peak_rss_mb()
+
+def measure(variant, data, runs):
+    """Decode latency and peak RSS of one variant, in a fresh process.
+
+    variant None measures a process that only did the imports.
+    """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_measure, (variant, data, runs))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--megapixels', type=float, nargs='+', default=[12, 48])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--images', default='test/test/*.JPG')
+    parser.add_argument('--backend', help="Also compare top-1 predictions with this backend")
+    args = parser.parse_args()
+
+    for megapixels in args.megapixels:
+        width = int(round((megapixels * 1e6 * 4 / 3) ** 0.5))
+        height = width * 3 // 4
+        data = synthetic_jpeg(width, height)
+        print(f"\n{width}x{height} JPEG, {len(data) / 1e6:.1f} MB")
+        _, baseline = measure(None, data, args.runs)
+        print(f"{'variant':<14} {'p50 ms':>8} {'p95 ms':>8} {'peak RSS MB':>12}")
+        print(f"{'(imports)':<14} {'':>8} {'':>8} {baseline:>12.1f}")
+        for variant in VARIANTS:
+            stats, peak = measure(variant, data, args.runs)
+            print(f"{variant:<14} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {peak:>12.1f}")
+
+    samples = []
+    for path in sorted(glob.glob(args.images)):
+        with open(path, 'rb') as f:
+            samples.append(f.read())
+    samples += [synthetic_jpeg(4000, 3000, seed=seed) for seed in range(4)]
+    before = np.concatenate([full_resolution(data) for data in samples])
+    after = np.concatenate([pil_draft(data) for data in samples])
+    diff = np.abs(before - after)
+    print(f"\nModel input difference over {len(samples)} images: "
+          f"mean {diff.mean():.2f}, max {diff.max():.0f} (0-255 scale)")
+    if args.backend:
+        from backends import load_backend
+
+        backend = load_backend(args.backend)
+        agree = np.argmax(backend.predict(before), axis=1) == np.argmax(backend.predict(after), axis=1)
+        print(f"Top-1 agreement: {agree.sum()}/{agree.size}")
+
+if __name__ == '__main__':
+    main()
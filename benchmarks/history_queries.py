@@ -0,0 +1,165 @@
+"""History query latency before and after the composite index and keyset pagination.
+
+Builds a predictions table (10M rows over 100k users by default, with a few
+heavy users deep enough for page 500) and times the Predictions page
+queries: first page, page 500, one day's predictions and the row count.
+"before" is the single-column user_id index with OFFSET paging and
+DATE(timestamp) filters; "after" is idx_predictions_user_time with the
+history.py queries. The row count is not an index comparison: "before"
+is COUNT(*) over the user_id index, "after" is the user_prediction_totals
+summary row that history.py reads now. The generated database, with its
+summary tables, is kept at --db and reused.
+Run from the repository root:
+
+    python -m benchmarks.history_queries --rows 10000000 --users 100000 --db /tmp/history_bench.db
+"""
+import argparse
+import datetime
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from database import SUMMARY_SCHEMA, ConnectionPool, rebuild_summaries
+from history import TIMESTAMP_FORMAT, count_predictions, history_page, predictions_on
+from perf import summarize
+
+PAGE_SIZE = 8
+
+def build(path, rows, users, deep_users, deep_rows, seed=0):
+    """Rows arrive in time order from random users, as uploads do. The
+    summary tables are filled in one pass after the load, not by triggers"""
+    conn = sqlite3.connect(path)
+    existing = conn.execute("SELECT name FROM sqlite_master WHERE name = 'predictions'").fetchone()
+    if existing and conn.execute('SELECT MAX(id) FROM predictions').fetchone()[0] == rows:
+        if not conn.execute("SELECT name FROM sqlite_master WHERE name = 'user_prediction_totals'").fetchone():
+            summarize_rows(conn)
+        conn.close()
+        return
+    conn.execute('DROP TABLE IF EXISTS predictions')
+    conn.execute('''CREATE TABLE predictions
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER NOT NULL,
+                     image_path TEXT NOT NULL,
+                     prediction TEXT NOT NULL,
+                     confidence REAL NOT NULL,
+                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    rng = np.random.default_rng(seed)
+    owners = np.concatenate([np.repeat(np.arange(deep_users), deep_rows),
+                             rng.integers(deep_users, users, rows - deep_users * deep_rows)])
+    rng.shuffle(owners)
+    start = datetime.datetime(2025, 1, 1)
+    # About one upload every 3 seconds, so some share a timestamp
+    offsets = np.cumsum(rng.integers(0, 7, rows))
+    chunk = 200_000
+    for first in range(0, rows, chunk):
+        conn.executemany('INSERT INTO predictions (user_id, image_path, prediction, confidence, timestamp) '
+                         'VALUES (?, ?, ?, ?, ?)',
+                         ((int(owners[i]), f"uploads/{i}.jpg", 'Tomato___healthy', 0.9,
+                           (start + datetime.timedelta(seconds=int(offsets[i]))).strftime(TIMESTAMP_FORMAT))
+                          for i in range(first, min(rows, first + chunk))))
+        conn.commit()
+    summarize_rows(conn)
+    conn.close()
+
+def summarize_rows(conn):
+    for statement in SUMMARY_SCHEMA:
+        conn.execute(statement)
+    rebuild_summaries(conn)
+    conn.commit()
+
+def set_index(path, layout):
+    conn = sqlite3.connect(path)
+    if layout == 'before':
+        conn.execute('DROP INDEX IF EXISTS idx_predictions_user_time')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_user ON predictions(user_id)')
+    else:
+        conn.execute('DROP INDEX IF EXISTS idx_predictions_user')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_user_time '
+                     'ON predictions(user_id, timestamp DESC, id DESC)')
+    conn.execute('ANALYZE')
+    conn.close()
+
+def old_page(db, user_id, page):
+    return db.fetchall('''SELECT timestamp, prediction, confidence
+                          FROM predictions WHERE user_id = ?
+                          ORDER BY timestamp DESC
+                          LIMIT ? OFFSET ?''', (user_id, PAGE_SIZE, page * PAGE_SIZE))
+
+def old_day(db, user_id, day):
+    return db.fetchall('''SELECT timestamp, prediction, confidence
+                          FROM predictions
+                          WHERE user_id = ? AND DATE(timestamp) = ?
+                          ORDER BY timestamp DESC''', (user_id, day.isoformat()))
+
+def old_count(db, user_id):
+    return db.fetchone('SELECT COUNT(*) FROM predictions WHERE user_id = ?', (user_id,))[0]
+
+def cursor_before_page(db, user_id, page):
+    """Keyset cursor a user would hold after paging to `page`, found without timing"""
+    row = db.fetchone('''SELECT timestamp, id FROM predictions WHERE user_id = ?
+                         ORDER BY timestamp DESC, id DESC LIMIT 1 OFFSET ?''',
+                      (user_id, page * PAGE_SIZE - 1))
+    return (*row, 0)
+
+def time_query(fn, users, repeats):
+    samples = []
+    for _ in range(repeats):
+        for user_id in users:
+            start = time.perf_counter()
+            fn(user_id)
+            samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default='history_bench.db', help="Generated database, reused between runs")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--deep-users', type=int, default=20, help="Users with enough rows for --deep-page")
+    parser.add_argument('--deep-rows', type=int, default=5000)
+    parser.add_argument('--deep-page', type=int, default=500)
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build(args.db, args.rows, args.users, args.deep_users, args.deep_rows)
+    print(f"{args.rows:,} rows over {args.users:,} users in {args.db} ({time.perf_counter() - start:.0f} s)")
+    users = list(range(args.deep_users))
+    page = args.deep_page
+
+    results = {}
+    for layout in ('before', 'after'):
+        set_index(args.db, layout)
+        db = ConnectionPool(args.db)
+        day = datetime.date.fromisoformat(db.fetchone('SELECT MAX(timestamp) FROM predictions WHERE user_id = 0')[0][:10])
+        if layout == 'before':
+            queries = {
+                'first page': lambda user_id: old_page(db, user_id, 0),
+                f'page {page}': lambda user_id: old_page(db, user_id, page - 1),
+                'one day': lambda user_id: old_day(db, user_id, day),
+                'count*': lambda user_id: old_count(db, user_id),
+            }
+        else:
+            cursors = {user_id: cursor_before_page(db, user_id, page - 1) for user_id in users}
+            queries = {
+                'first page': lambda user_id: history_page(db, user_id, PAGE_SIZE),
+                f'page {page}': lambda user_id: history_page(db, user_id, PAGE_SIZE, cursors[user_id]),
+                'one day': lambda user_id: predictions_on(db, user_id, day),
+                'count*': lambda user_id: count_predictions(db, user_id),
+            }
+        results[layout] = {name: time_query(fn, users, args.repeats) for name, fn in queries.items()}
+        db.close()
+
+    print(f"\n{'query':<12} {'before p50':>11} {'before p95':>11} {'after p50':>10} {'after p95':>10} {'speedup':>8}")
+    for name in results['before']:
+        before, after = results['before'][name], results['after'][name]
+        print(f"{name:<12} {before['p50_ms']:>9.3f}ms {before['p95_ms']:>9.3f}ms {after['p50_ms']:>8.3f}ms "
+              f"{after['p95_ms']:>8.3f}ms {before['p50_ms'] / after['p50_ms']:>7.1f}x")
+    print("\n* before: COUNT(*) over the user_id index; after: one user_prediction_totals row")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""Stage-by-stage benchmark of the process_image hot path.
+
+Times each step of an upload separately (decode, saving the original
+bytes to uploads/, preprocessing into the model input, model, SQLite
+insert and commit) on the bundled test images and on synthetic large
+photos, through the same functions process_image calls. It then sweeps
+model batch sizes and end-to-end thread counts. Results are written as
+JSON; save one run's output and pass it as --baseline to later runs to
+compare. Run from the repository root:
+
+    python -m benchmarks.hot_path --output baseline.json
+    python -m benchmarks.hot_path --baseline baseline.json
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import config
+from backends import load_backend
+from class_names import CLASS_NAMES
+from database import ConnectionPool, init_db, insert_prediction
+from perf import summarize
+from preprocessing import load_image, model_input
+from uploads import save_upload
+
+STAGES = ('decode', 'save', 'preprocess', 'predict', 'db_commit')
+
+def synthetic_jpeg(width, height, seed=0):
+    """A smooth, photo-like JPEG; pure noise would make decode unrealistically slow"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (height // 64 + 1, width // 64 + 1, 3), dtype=np.uint8)
+    pixels = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+def process(data, backend, upload_dir, db, timings=None):
+    """The steps of process_image in main.py, each timed on its own"""
+    marks = [time.perf_counter()]
+    image = load_image(io.BytesIO(data))
+    image.load()
+    marks.append(time.perf_counter())
+    file_path = save_upload(data, f"{threading.get_ident()}.jpg", upload_dir)
+    marks.append(time.perf_counter())
+    input_arr = model_input(image)
+    marks.append(time.perf_counter())
+    prediction = backend.predict(input_arr)
+    marks.append(time.perf_counter())
+    with db.transaction() as conn:
+        insert_prediction(conn, 1, file_path, CLASS_NAMES[int(np.argmax(prediction))], float(np.max(prediction)))
+    marks.append(time.perf_counter())
+    if timings is not None:
+        for stage, begin, end in zip(STAGES, marks, marks[1:]):
+            timings[stage].append((end - begin) * 1000.0)
+    return (marks[-1] - marks[0]) * 1000.0
+
+def bench_stages(images, runs, backend, upload_dir, db):
+    timings = {stage: [] for stage in STAGES}
+    totals = []
+    for i in range(runs):
+        totals.append(process(images[i % len(images)], backend, upload_dir, db, timings))
+    result = {stage: summarize(samples) for stage, samples in timings.items()}
+    result['total'] = summarize(totals)
+    return result
+
+def bench_batches(backend, batch_sizes, runs):
+    results = {}
+    for batch_size in batch_sizes:
+        sample = np.random.default_rng(0).uniform(0, 255, (batch_size, 128, 128, 3)).astype(np.float32)
+        backend.predict(sample)
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            backend.predict(sample)
+            samples.append((time.perf_counter() - start) * 1000.0)
+        stats = summarize(samples)
+        stats['throughput_ips'] = batch_size * 1000.0 / stats['mean_ms']
+        results[str(batch_size)] = stats
+    return results
+
+def bench_threads(images, thread_counts, runs, backend, upload_dir, db):
+    results = {}
+    for threads in thread_counts:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = list(pool.map(
+                lambda i: process(images[i % len(images)], backend, upload_dir, db),
+                range(runs)))
+        elapsed = time.perf_counter() - start
+        stats = summarize(latencies)
+        stats['throughput_ips'] = runs / elapsed
+        results[str(threads)] = stats
+    return results
+
+def flatten(tree, prefix=''):
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)) and (key.endswith('_ms') or key == 'throughput_ips'):
+            flat[name] = value
+    return flat
+
+def compare(current, baseline, threshold):
+    """Prints changes against the baseline and returns the regressed metrics"""
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    regressions = []
+    print(f"\n{'metric':<48} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name in sorted(now.keys() & before.keys()):
+        if not name.endswith(('p50_ms', 'p95_ms', 'p99_ms', 'throughput_ips')) or not before[name]:
+            continue
+        change = (now[name] - before[name]) / before[name]
+        # Latency should go down, throughput up
+        worse = change > threshold if name.endswith('_ms') else change < -threshold
+        if worse:
+            regressions.append(name)
+        print(f"{name:<48} {before[name]:>10.2f} {now[name]:>10.2f} {change:>+7.1%}{'  !' if worse else ''}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='test/test/*.JPG')
+    parser.add_argument('--large-sizes', nargs='*', default=['4000x3000', '8000x6000'],
+                        help="Synthetic photo sizes, WIDTHxHEIGHT")
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--backend', default=config.BACKEND)
+    parser.add_argument('--output', help="Write results JSON here")
+    parser.add_argument('--baseline', help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    image_sets = {'bundled': []}
+    for path in sorted(glob.glob(args.images)):
+        with open(path, 'rb') as f:
+            image_sets['bundled'].append(f.read())
+    if not image_sets['bundled']:
+        sys.exit(f"No images match {args.images}")
+    for size in args.large_sizes:
+        width, height = (int(v) for v in size.split('x'))
+        image_sets[f"synthetic_{size}"] = [synthetic_jpeg(width, height)]
+
+    backend = load_backend(args.backend)
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        init_db(db_path)
+        db = ConnectionPool(db_path)
+        results = {
+            'stages': {name: bench_stages(images, args.runs if name == 'bundled' else max(5, args.runs // 10),
+                                          backend, workdir, db)
+                       for name, images in image_sets.items()},
+            'batch': bench_batches(backend, args.batch_sizes, max(5, args.runs // 5)),
+            'threads': bench_threads(image_sets['bundled'], args.threads, args.runs, backend, workdir, db),
+        }
+        db.close()
+
+    report = {
+        'meta': {'backend': args.backend, 'python': platform.python_version(),
+                 'machine': platform.machine(), 'cpus': os.cpu_count(),
+                 'created': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'results': results,
+    }
+    for name, stages in results['stages'].items():
+        print(f"\n{name}")
+        for stage, stats in stages.items():
+            print(f"  {stage:<10} p50 {stats['p50_ms']:>9.3f} ms  p95 {stats['p95_ms']:>9.3f} ms  "
+                  f"p99 {stats['p99_ms']:>9.3f} ms")
+    print("\nbatch size   p50 ms   images/s")
+    for batch_size, stats in results['batch'].items():
+        print(f"{batch_size:>10} {stats['p50_ms']:>8.2f} {stats['throughput_ips']:>10.1f}")
+    print("\nthreads      p50 ms   p99 ms   images/s")
+    for threads, stats in results['threads'].items():
+        print(f"{threads:>7} {stats['p50_ms']:>10.2f} {stats['p99_ms']:>8.2f} {stats['throughput_ips']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
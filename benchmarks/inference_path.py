@@ -0,0 +1,49 @@
+"""Per-request latency of model.predict versus the compiled inference function.
+
+Run from the repository root:
+
+    python -m benchmarks.inference_path --runs 200
+"""
+import argparse
+
+import numpy as np
+
+import config
+from backends import KerasBackend
+from perf import summarize, time_calls
+
+# process_image in main.py sleeps this long after inference unless
+# AGRODOC_LATENCY_MODE is set
+ARTIFICIAL_DELAY_MS = 1000.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1)
+    args = parser.parse_args()
+
+    sample = np.random.default_rng(0).uniform(
+        0, 255, (args.batch_size, 128, 128, 3)).astype(np.float32)
+
+    variants = [
+        ('model.predict', KerasBackend(args.model)),
+        ('compiled', KerasBackend(args.model, compiled=True, warmup=True)),
+        ('compiled+xla', KerasBackend(args.model, compiled=True, jit_compile=True, warmup=True)),
+    ]
+    results = {}
+    for label, backend in variants:
+        results[label] = summarize(time_calls(lambda: backend.predict(sample), runs=args.runs))
+
+    print(f"{'path':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for label, stats in results.items():
+        print(f"{label:<16} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['p99_ms']:>10.2f}")
+
+    baseline = results['model.predict']['p50_ms'] + ARTIFICIAL_DELAY_MS
+    for label in ('compiled', 'compiled+xla'):
+        saved = baseline - results[label]['p50_ms']
+        print(f"{label} with latency mode saves {saved:.1f} ms per request at p50 "
+              f"({saved - ARTIFICIAL_DELAY_MS:.1f} ms from inference alone)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Load test for inference_server.py on localhost.
+
+Start the server first (python inference_server.py --workers 4), then run
+from the repository root:
+
+    python -m benchmarks.load_test --concurrency 8 --requests 400
+"""
+import argparse
+import glob
+import threading
+import time
+
+import config
+from inference_client import InferenceClient
+from perf import summarize
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--address', default=config.INFERENCE_SERVER_ADDRESS)
+    parser.add_argument('--images', default='test/test/*.JPG')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help="Total requests across all threads")
+    args = parser.parse_args()
+
+    payloads = []
+    for path in sorted(glob.glob(args.images)):
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    if not payloads:
+        raise SystemExit(f"No images match {args.images}")
+
+    client = InferenceClient(args.address, retry_after=0)
+    client.predict(payloads[0])
+
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(args.requests))
+
+    def run():
+        samples = []
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                client.predict(payloads[i % len(payloads)])
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                continue
+            samples.append((time.perf_counter() - start) * 1000.0)
+        with lock:
+            latencies.extend(samples)
+
+    threads = [threading.Thread(target=run) for _ in range(args.concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    stats = summarize(latencies)
+    print(f"{len(latencies)} ok, {len(errors)} errors in {elapsed:.2f}s "
+          f"with {args.concurrency} concurrent clients")
+    print(f"throughput {len(latencies) / elapsed:.1f} req/s")
+    print(f"latency p50 {stats['p50_ms']:.1f} ms, p95 {stats['p95_ms']:.1f} ms, p99 {stats['p99_ms']:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Schema setup cost per Streamlit rerun before and after run-once migrations.
+
+Streamlit re-executes main.py, and its init_db() call, on every widget
+interaction. "before" is the old init_db() + migrate_db() pair, which
+reconnected and re-ran every CREATE ... IF NOT EXISTS, the index
+statements, the summary-table DDL and the welcome-notification insert on
+each rerun. "after rerun" is init_db() in a process that has already
+migrated; "after boot" is the first call in a new process (file lock plus
+one schema_version read). --writers threads keep committing predictions
+meanwhile, as other sessions do, since the old insert needed the write
+lock. Run from the repository root:
+
+    python -m benchmarks.migrations --reruns 500 --writers 1
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database
+from class_names import CLASS_NAMES
+from database import SUMMARY_SCHEMA, init_db
+from perf import summarize
+
+LEGACY_STATEMENTS = [
+    '''CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL, phone TEXT, show_notifications BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, image_path TEXT NOT NULL,
+        prediction TEXT NOT NULL, confidence REAL NOT NULL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY(user_id) REFERENCES users(id))''',
+    '''CREATE TABLE IF NOT EXISTS reviews (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, rating INTEGER NOT NULL, review TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY(user_id) REFERENCES users(id))''',
+    '''CREATE TABLE IF NOT EXISTS users
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL, phone TEXT, show_notifications BOOLEAN DEFAULT TRUE,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS predictions
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, image_path TEXT NOT NULL,
+        prediction TEXT NOT NULL, confidence REAL NOT NULL, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id))''',
+    '''CREATE TABLE IF NOT EXISTS notifications
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, content TEXT NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS reviews
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, rating INTEGER NOT NULL,
+        review TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP, FOREIGN KEY(user_id) REFERENCES users(id))''',
+    '''CREATE TABLE IF NOT EXISTS upload_hashes
+       (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, prediction_id INTEGER NOT NULL,
+        phash INTEGER NOT NULL, created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id), FOREIGN KEY(prediction_id) REFERENCES predictions(id))''',
+    'CREATE INDEX IF NOT EXISTS idx_predictions_user_time ON predictions(user_id, timestamp DESC, id DESC)',
+    'DROP INDEX IF EXISTS idx_predictions_user',
+    'CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_upload_hashes_user ON upload_hashes(user_id, created_at)',
+    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='user_prediction_totals'",
+    *SUMMARY_SCHEMA,
+    '''INSERT INTO notifications (title, content, is_active)
+       SELECT 'Welcome!', 'Thank you for using Agrodoc!', 1
+       WHERE NOT EXISTS (SELECT 1 FROM notifications)''',
+]
+
+def legacy_rerun(path):
+    """The old init_db() and migrate_db() bodies, as run at the top of every rerun"""
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_STATEMENTS:
+        conn.execute(statement)
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(path)
+    conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notifications'")
+    conn.execute('PRAGMA table_info(notifications)').fetchall()
+    conn.close()
+
+def fresh_process_boot(path):
+    database._migrated.clear()
+    init_db(path)
+
+def start_writers(path, count, stop):
+    def write(index):
+        conn = sqlite3.connect(path, timeout=30)
+        rng = random.Random(index)
+        while not stop.is_set():
+            conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence) VALUES (?, ?, ?, ?)',
+                         (rng.randrange(100), 'uploads/bench.jpg', rng.choice(CLASS_NAMES), rng.random()))
+            conn.commit()
+        conn.close()
+
+    threads = [threading.Thread(target=write, args=(i,), daemon=True) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+def time_reruns(fn, reruns):
+    samples = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return summarize(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reruns', type=int, default=500)
+    parser.add_argument('--writers', type=int, nargs='+', default=[0, 1],
+                        help="Concurrent writer threads for each run")
+    args = parser.parse_args()
+
+    variants = {
+        'before': legacy_rerun,
+        'after boot': fresh_process_boot,
+        'after rerun': init_db,
+    }
+    print(f"before: {len(LEGACY_STATEMENTS) + 2} statements per rerun; after: none once migrated")
+    print(f"{'writers':>7} {'variant':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for writers in args.writers:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            database._migrated.clear()
+            init_db(path)
+            sqlite3.connect(path).execute('PRAGMA journal_mode=WAL').fetchone()
+            stop = threading.Event()
+            threads = start_writers(path, writers, stop)
+            try:
+                for name, fn in variants.items():
+                    result = time_reruns(lambda: fn(path), args.reruns)
+                    print(f"{writers:>7} {name:<12} {result['p50_ms']:>9.4f} {result['p95_ms']:>9.4f} "
+                          f"{result['p99_ms']:>9.4f}")
+            finally:
+                stop.set()
+                for thread in threads:
+                    thread.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Near-duplicate lookup time with multi-index hashing versus a linear scan.
+
+Run from the repository root:
+
+    python -m benchmarks.phash_lookup --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+
+from near_duplicates import MultiIndexHash, hamming
+from perf import summarize
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--distance', type=int, default=6)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'hashes':>10} {'build s':>9} {'mih p50 ms':>10} {'mih p99 ms':>10} "
+          f"{'scan p50 ms':>12} {'hits/query':>11}")
+    for size in args.sizes:
+        rng = random.Random(args.seed)
+        hashes = [rng.getrandbits(64) for _ in range(size)]
+
+        start = time.perf_counter()
+        index = MultiIndexHash()
+        for position, value in enumerate(hashes):
+            index.add(value, position)
+        build_seconds = time.perf_counter() - start
+
+        # Half the queries are burst shots of a stored hash, half are new photos
+        queries = [flip_bits(rng.choice(hashes), rng.randint(0, args.distance), rng)
+                   if i % 2 == 0 else rng.getrandbits(64)
+                   for i in range(args.queries)]
+
+        mih_samples, hits = [], 0
+        for query in queries:
+            start = time.perf_counter()
+            hits += len(index.search(query, args.distance))
+            mih_samples.append((time.perf_counter() - start) * 1000.0)
+
+        scan_samples = []
+        for query in queries[:20]:
+            start = time.perf_counter()
+            [value for value in hashes if hamming(query, value) <= args.distance]
+            scan_samples.append((time.perf_counter() - start) * 1000.0)
+
+        mih, scan = summarize(mih_samples), summarize(scan_samples)
+        print(f"{size:>10} {build_seconds:>9.2f} {mih['p50_ms']:>10.3f} {mih['p99_ms']:>10.3f} "
+              f"{scan['p50_ms']:>12.3f} {hits / len(queries):>11.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Disk size, load time, memory and latency of float32 vs half-precision weights.
+
+Each variant is loaded in a fresh process the way load_model() does it, so
+load time includes reading the artifact and RSS is the growth over a process
+that only imported TensorFlow. Check predictions against the float32 model
+with parity_check.py. Run from the repository root:
+
+    python -m benchmarks.precision --runs 200 --batch-size 32
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+# variant -> (AGRODOC_BACKEND, AGRODOC_REDUCED_PRECISION_COMPUTE)
+VARIANTS = {
+    'float32': ('keras', 'auto'),
+    'float16-native': ('float16', 'native'),
+    'float16-upcast': ('float16', 'upcast'),
+    'bfloat16-native': ('bfloat16', 'native'),
+    'bfloat16-upcast': ('bfloat16', 'upcast'),
+}
+
+def _rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+def _measure(variant, runs, batch_size):
+    backend_name, compute = VARIANTS[variant]
+    os.environ['AGRODOC_REDUCED_PRECISION_COMPUTE'] = compute
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+    import numpy as np
+    import tensorflow as tf  # noqa: F401 - counted in the baseline, not the load
+
+    from backends import load_model_file, model_file
+    from perf import summarize, time_calls
+
+    path = model_file(backend_name)
+    baseline = _rss_mb()
+    start = time.perf_counter()
+    backend = load_model_file(path)
+    backend.predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+    load_seconds = time.perf_counter() - start
+    loaded = _rss_mb()
+
+    rng = np.random.default_rng(0)
+    single = rng.uniform(0, 255, (1, 128, 128, 3)).astype(np.float32)
+    batch = rng.uniform(0, 255, (batch_size, 128, 128, 3)).astype(np.float32)
+    backend.predict(batch)
+    return {
+        'disk_mb': os.path.getsize(path) / 1e6,
+        'load_s': load_seconds,
+        'rss_mb': loaded - baseline,
+        'single': summarize(time_calls(lambda: backend.predict(single), runs=runs)),
+        'batch': summarize(time_calls(lambda: backend.predict(batch), runs=max(1, runs // batch_size))),
+        'compute': getattr(backend, 'compute', 'float32'),
+    }
+
+def measure(variant, runs, batch_size):
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(_measure, (variant, runs, batch_size))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--runs', type=int, default=200, help="Timed single-image predictions per variant")
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    # Convert up front so no variant's load time includes the conversion
+    from backends import REDUCED_PRECISION, ensure_reduced_precision_model
+    for dtype in REDUCED_PRECISION:
+        ensure_reduced_precision_model(dtype)
+
+    print(f"{'variant':<16} {'compute':>8} {'disk MB':>8} {'load s':>7} {'RSS MB':>8} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {f'batch {args.batch_size} ms':>12}")
+    for variant in args.variants:
+        row = measure(variant, args.runs, args.batch_size)
+        print(f"{variant:<16} {row['compute']:>8} {row['disk_mb']:>8.1f} {row['load_s']:>7.2f} "
+              f"{row['rss_mb']:>8.1f} {row['single']['p50_ms']:>7.2f} {row['single']['p99_ms']:>7.2f} "
+              f"{row['batch']['p50_ms']:>12.1f}")
+
+if __name__ == '__main__':
+    main()
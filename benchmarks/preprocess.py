@@ -0,0 +1,85 @@
+"""Allocations and throughput of the preprocessing step.
+
+Compares the per-request array allocations of the old main.py and app.py
+preprocessing with the allocating and pooled paths in preprocessing.py, then
+measures throughput with several sessions preprocessing at once. Images are
+decoded and exported to uint8 arrays up front, a cost every variant shares,
+so only preprocessing is measured. Run from the repository root:
+
+    python -m benchmarks.preprocess --threads 1 2 4 8
+"""
+import argparse
+import glob
+import io
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.hot_path import synthetic_jpeg
+from preprocessing import load_image, model_input, to_model_input
+
+def main_before(image):
+    img = cv2.resize(np.array(image), (128, 128))
+    return np.array([img], dtype=np.float32)
+
+def app_before(image):
+    img = cv2.cvtColor(np.array(image), cv2.COLOR_BGR2RGB)
+    img = cv2.resize(img, (128, 128))
+    img = img.astype('float32') / 255.0
+    return np.expand_dims(img, axis=0)
+
+VARIANTS = {'main.py before': main_before, 'app.py before': app_before,
+            'to_model_input': to_model_input, 'model_input (pooled)': model_input}
+
+def allocated_per_call(fn, images, runs):
+    """Mean peak bytes traced while one call runs (numpy reports its buffers to tracemalloc)"""
+    fn(images[0])
+    tracemalloc.start()
+    total = 0
+    for i in range(runs):
+        image = images[i % len(images)]
+        start, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(image)
+        total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return total / runs
+
+def throughput(fn, images, threads, runs):
+    def work(i):
+        fn(images[i % len(images)])
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(work, range(threads)))
+        start = time.perf_counter()
+        list(pool.map(work, range(runs)))
+        return runs / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='test/test/*.JPG')
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    images = [np.asarray(load_image(path)) for path in sorted(glob.glob(args.images))]
+    if not images:
+        raise SystemExit(f"No images match {args.images}")
+    large = [np.asarray(load_image(io.BytesIO(synthetic_jpeg(8000, 6000))))]
+
+    print(f"Peak KB allocated per call; 48 MP photos are draft-decoded to {large[0].shape[1]}x{large[0].shape[0]}")
+    header = f"{'variant':<22} {'KB/call 256px':>14} {'KB/call 48MP':>13}"
+    header += ''.join(f" {f'{t} thr img/s':>12}" for t in args.threads)
+    print(header)
+    for name, fn in VARIANTS.items():
+        row = f"{name:<22} {allocated_per_call(fn, images, 200) / 1024:>14.1f}"
+        row += f" {allocated_per_call(fn, large, 20) / 1024:>13.1f}"
+        for threads in args.threads:
+            row += f" {throughput(fn, images, threads, args.runs):>12.0f}"
+        print(row)
+
+if __name__ == '__main__':
+    main()
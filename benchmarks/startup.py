@@ -0,0 +1,55 @@
+"""Time-to-first-render and time-to-first-prediction of the Streamlit app.
+
+Each measurement runs the app script in a fresh interpreter (Streamlit bare
+mode), once with the model loaded before the first render and once with the
+background loader. Run from the repository root:
+
+    python -m benchmarks.startup --script main.py --repeats 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+def child(script):
+    start = time.perf_counter()
+    import runpy
+    import numpy as np
+    app = runpy.run_path(script, run_name='__main__')
+    first_render = time.perf_counter() - start
+    app['load_batcher']().predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+    first_prediction = time.perf_counter() - start
+    print(json.dumps({'first_render_s': first_render, 'first_prediction_s': first_prediction}))
+
+def measure(script, background):
+    env = dict(os.environ,
+               AGRODOC_BACKGROUND_MODEL_LOAD='1' if background else '0',
+               STREAMLIT_LOGGER_LEVEL='error',
+               TF_CPP_MIN_LOG_LEVEL='3')
+    result = subprocess.run([sys.executable, '-m', 'benchmarks.startup', '--child', '--script', script],
+                            env=env, capture_output=True, text=True, check=True)
+    last_line = [line for line in result.stdout.splitlines() if line.startswith('{')][-1]
+    return json.loads(last_line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--script', default='main.py')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.script)
+        return
+
+    print(f"{'mode':<12} {'first render s':>15} {'first prediction s':>19}")
+    for label, background in (('blocking', False), ('background', True)):
+        runs = [measure(args.script, background) for _ in range(args.repeats)]
+        render = sorted(run['first_render_s'] for run in runs)[len(runs) // 2]
+        prediction = sorted(run['first_prediction_s'] for run in runs)[len(runs) // 2]
+        print(f"{label:<12} {render:>15.2f} {prediction:>19.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Resident memory and load time per worker process for each model artifact.
+
+Starts N worker processes that each load the model the way load_model() does,
+then reads /proc/self/smaps_rollup while all of them are alive, so PSS shows
+how much of the weights is really shared. Linux only. Run from the
+repository root:
+
+    python -m benchmarks.worker_memory --workers 1 4 8
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+# variant -> (AGRODOC_BACKEND, AGRODOC_SHARED_WEIGHTS)
+VARIANTS = {
+    'keras': ('keras', '0'),
+    'tflite': ('tflite', '0'),
+    'tflite-shared': ('tflite', '1'),
+}
+
+def memory_mb():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024.0
+    return {
+        'rss': fields['Rss'],
+        'pss': fields['Pss'],
+        'private': fields['Private_Clean'] + fields['Private_Dirty'],
+    }
+
+def worker(barrier, results):
+    import numpy as np
+    from backends import load_backend
+
+    start = time.perf_counter()
+    backend = load_backend()
+    backend.predict(np.zeros((1, 128, 128, 3), dtype=np.float32))
+    load_seconds = time.perf_counter() - start
+
+    barrier.wait()
+    results.put(dict(memory_mb(), load_s=load_seconds))
+    barrier.wait()
+
+def run(variant, workers):
+    backend, shared = VARIANTS[variant]
+    os.environ['AGRODOC_BACKEND'] = backend
+    os.environ['AGRODOC_SHARED_WEIGHTS'] = shared
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '3')
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(barrier, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in range(workers)]
+    for process in processes:
+        process.join()
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    args = parser.parse_args()
+
+    # Build the flatbuffer up front so no worker pays for the conversion
+    from backends import ensure_tflite_model
+    ensure_tflite_model()
+
+    print(f"{'variant':<14} {'workers':>7} {'rss MB':>8} {'pss MB':>8} {'private MB':>11} "
+          f"{'host total MB':>14} {'load s':>7}")
+    for variant in args.variants:
+        for workers in args.workers:
+            samples = run(variant, workers)
+            mean = {key: sum(s[key] for s in samples) / len(samples) for key in samples[0]}
+            print(f"{variant:<14} {workers:>7} {mean['rss']:>8.1f} {mean['pss']:>8.1f} "
+                  f"{mean['private']:>11.1f} {mean['pss'] * workers:>14.1f} {mean['load_s']:>7.2f}")
+
+if __name__ == '__main__':
+    main()
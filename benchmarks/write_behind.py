@@ -0,0 +1,85 @@
+"""Prediction inserts per second with and without the write-behind queue.
+
+Session threads save predictions the way process_image does, either with a
+commit per row or through database.PredictionWriter, and the run ends with
+the writer's flush() so every timed row is durable. Run from the repository
+root:
+
+    python -m benchmarks.write_behind --sessions 8 --rows 2000 --synchronous FULL
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.db_concurrency import create_db
+from class_names import CLASS_NAMES
+from database import ConnectionPool, PredictionWriter
+
+def run(path, sessions, rows, synchronous, writer_settings=None):
+    pool = ConnectionPool(path, synchronous=synchronous)
+    writer = PredictionWriter(pool, **writer_settings) if writer_settings else None
+    latencies = [[] for _ in range(sessions)]
+
+    def session(index):
+        rng = random.Random(index)
+        for i in range(rows // sessions):
+            row = (rng.randrange(1000), f"uploads/{index}_{i}.jpg", rng.choice(CLASS_NAMES), rng.random())
+            start = time.perf_counter()
+            if writer:
+                writer.add(*row)
+            else:
+                with pool.transaction() as conn:
+                    conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence) '
+                                 'VALUES (?, ?, ?, ?)', row)
+            latencies[index].append((time.perf_counter() - start) * 1000.0)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if writer:
+        writer.close()
+    elapsed = time.perf_counter() - start
+
+    written = pool.fetchone('SELECT COUNT(*) FROM predictions')[0]
+    pool.close()
+    samples = np.concatenate([np.asarray(values) for values in latencies])
+    return {
+        'inserts_per_s': len(samples) / elapsed,
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'rows': written,
+        'groups': writer.stats()['groups'] if writer else len(samples),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=8, help="Threads saving predictions")
+    parser.add_argument('--rows', type=int, default=2000, help="Predictions saved per run")
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'], default='FULL',
+                        help="PRAGMA synchronous; FULL syncs the WAL on every commit")
+    parser.add_argument('--max-rows', type=int, nargs='+', default=[100], help="Write-behind group sizes")
+    parser.add_argument('--max-wait-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    variants = [('commit per row', None)]
+    variants += [(f"write-behind {n}", {'max_rows': n, 'max_wait_ms': args.max_wait_ms}) for n in args.max_rows]
+    print(f"{args.sessions} sessions, {args.rows} predictions, synchronous={args.synchronous}")
+    print(f"{'variant':<18} {'inserts/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'commits':>8} {'rows':>6}")
+    for name, settings in variants:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.db')
+            create_db(path, users=1000, rows_per_user=10)
+            result = run(path, args.sessions, args.rows, args.synchronous, settings)
+        print(f"{name:<18} {result['inserts_per_s']:>10.0f} {result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+              f"{result['groups']:>8} {result['rows']:>6}")
+
+if __name__ == '__main__':
+    main()
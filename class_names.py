@@ -0,0 +1,44 @@
+# Correct class names matching model's training order
+CLASS_NAMES = [
+    'Apple___Apple_scab',
+    'Apple___Black_rot',
+    'Apple___Cedar_apple_rust',
+    'Apple___healthy',
+    'Blueberry___healthy',
+    'Cherry_(including_sour)___healthy',
+    'Cherry_(including_sour)___Powdery_mildew',
+    'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
+    'Corn_(maize)___Common_rust_',
+    'Corn_(maize)___healthy',
+    'Corn_(maize)___Northern_Leaf_Blight',
+    'Grape___Black_rot',
+    'Grape___Esca_(Black_Measles)',
+    'Grape___healthy',
+    'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)',
+    'Orange___Haunglongbing_(Citrus_greening)',
+    'Peach___Bacterial_spot',
+    'Peach___healthy',
+    'Pepper,_bell___Bacterial_spot',
+    'Pepper,_bell___healthy',
+    'Potato___Early_blight',
+    'Potato___healthy',
+    'Potato___Late_blight',
+    'Raspberry___healthy',
+    'Soybean___healthy',
+    'Squash___Powdery_mildew',
+    'Strawberry___healthy',
+    'Strawberry___Leaf_scorch',
+    'Tomato___Bacterial_spot',
+    'Tomato___Early_blight',
+    'Tomato___healthy',
+    'Tomato___Late_blight',
+    'Tomato___Leaf_Mold',
+    'Tomato___Septoria_leaf_spot',
+    'Tomato___Spider_mites Two-spotted_spider_mite',
+    'Tomato___Target_Spot',
+    'Tomato___Tomato_mosaic_virus',
+    'Tomato___Tomato_Yellow_Leaf_Curl_Virus',
+]
+
+# Validate class count
+assert len(CLASS_NAMES) == 38, "Class names count mismatch with model output!"
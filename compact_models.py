@@ -0,0 +1,68 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+from class_names import CLASS_NAMES
+
+# Small CNNs for the same 38 classes and 128x128 raw 0-255 RGB input as
+# Trained_Model.h5. The full model's 5 conv blocks end in Flatten and a
+# 1500-unit Dense head holding most of its weights; these variants keep
+# the block layout but start with fewer filters, can use depthwise-separable
+# convolutions, and end in global average pooling.
+
+def build_compact_cnn(base_filters=16, blocks=4, separable=False, dropout=0.2, name=None):
+    """Conv blocks of doubling width, then GlobalAveragePooling and a softmax layer"""
+    conv = layers.SeparableConv2D if separable else layers.Conv2D
+    model = tf.keras.Sequential(name=name)
+    model.add(tf.keras.Input((128, 128, 3)))
+    # The full model sees raw 0-255 pixels too, but a thin network trains
+    # far more reliably on scaled input, so scale inside the model
+    model.add(layers.Rescaling(1.0 / 255))
+    for block in range(blocks):
+        filters = base_filters * 2 ** block
+        # A separable first layer would give a 3-channel depthwise conv
+        # almost nothing to do, so the stem is always a regular convolution
+        block_conv = layers.Conv2D if block == 0 else conv
+        model.add(block_conv(filters, (3, 3), padding='same', activation='relu'))
+        model.add(block_conv(filters, (3, 3), padding='same', activation='relu'))
+        model.add(layers.MaxPooling2D(pool_size=(2, 2), strides=2))
+    model.add(layers.GlobalAveragePooling2D())
+    model.add(layers.Dropout(dropout))
+    # Logits and softmax as separate layers so distill.py can read the logits
+    model.add(layers.Dense(len(CLASS_NAMES), name='logits'))
+    model.add(layers.Activation('softmax', name='probabilities'))
+    return model
+
+def count_flops(model):
+    """Floating point operations of one forward pass on a single 128x128 image"""
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    forward = tf.function(lambda images: model(images, training=False))
+    frozen = convert_variables_to_constants_v2(
+        forward.get_concrete_function(tf.TensorSpec((1, 128, 128, 3), tf.float32)))
+    options = tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+    options['output'] = 'none'
+    return tf.compat.v1.profiler.profile(graph=frozen.graph, options=options).total_float_ops
+
+def accuracy(predict, dataset):
+    """Top-1 accuracy of predict(images) -> probabilities over a labelled dataset"""
+    correct = total = 0
+    for images, labels in dataset:
+        probabilities = predict(images.numpy())
+        correct += int(np.sum(np.argmax(probabilities, axis=1) == np.argmax(labels.numpy(), axis=1)))
+        total += len(labels)
+    return correct / total if total else 0.0
+
+def labelled_dataset(directory, batch_size=32, shuffle=True):
+    # Same loader and resize settings as TrainModel.ipynb
+    return tf.keras.utils.image_dataset_from_directory(
+        directory,
+        labels="inferred",
+        label_mode="categorical",
+        color_mode="rgb",
+        batch_size=batch_size,
+        image_size=(128, 128),
+        shuffle=shuffle,
+        seed=42,
+        interpolation="bilinear",
+    )
@@ -0,0 +1,122 @@
+import json
+import os
+
+# Runtime settings, overridable through AGRODOC_* environment variables
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+def _env_optional_int(name):
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+def _tuned_settings(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+MODEL_PATH = os.environ.get('AGRODOC_MODEL_PATH', 'Trained_Model.h5')
+
+# Thread pools and batch size picked for this host by tune_threads.py. The
+# AGRODOC_* variables below still override what the file says
+THREAD_SETTINGS_PATH = os.environ.get('AGRODOC_THREAD_SETTINGS_PATH', 'thread_settings.json')
+_tuned = _tuned_settings(THREAD_SETTINGS_PATH)
+# TensorFlow intra-op/inter-op pool sizes, applied before its runtime starts;
+# unset lets TensorFlow use every core in each process
+INTRA_OP_THREADS = _env_optional_int('AGRODOC_INTRA_OP_THREADS') or _tuned.get('intra_op_threads')
+INTER_OP_THREADS = _env_optional_int('AGRODOC_INTER_OP_THREADS') or _tuned.get('inter_op_threads')
+# Model-loading processes sharing this host, for the oversubscription warning
+WORKERS_PER_HOST = _env_int('AGRODOC_WORKERS_PER_HOST', 1)
+
+# Cross-session micro-batching of inference requests
+BATCH_MAX_SIZE = _env_int('AGRODOC_BATCH_MAX_SIZE', _tuned.get('batch_size', 16))
+BATCH_MAX_WAIT_MS = _env_float('AGRODOC_BATCH_MAX_WAIT_MS', 10)
+SHOW_BATCH_STATS = _env_bool('AGRODOC_SHOW_BATCH_STATS', False)
+
+# Inference engine used by load_model(): 'keras', 'tflite', 'tflite-int8',
+# or 'float16'/'bfloat16' for the Keras model with half-precision weights
+BACKEND = os.environ.get('AGRODOC_BACKEND', 'keras')
+# Half-precision backends: 'native' computes in float16/bfloat16, 'upcast'
+# casts each layer's weights to float32 as it runs, 'auto' picks native when
+# the CPU has bfloat16 instructions (AVX512-BF16 or AMX)
+REDUCED_PRECISION_COMPUTE = os.environ.get('AGRODOC_REDUCED_PRECISION_COMPUTE', 'auto')
+TFLITE_MODEL_PATH = os.environ.get('AGRODOC_TFLITE_MODEL_PATH', 'Trained_Model.tflite')
+TFLITE_THREADS = _env_optional_int('AGRODOC_TFLITE_THREADS') or INTRA_OP_THREADS
+# Run TFLite weights straight from the memory-mapped flatbuffer so worker
+# processes on one host share them
+SHARED_WEIGHTS = _env_bool('AGRODOC_SHARED_WEIGHTS', False)
+TFLITE_INT8_MODEL_PATH = os.environ.get('AGRODOC_TFLITE_INT8_MODEL_PATH', 'Trained_Model.int8.tflite')
+
+# Keras backend: traced fixed-signature inference instead of model.predict,
+# optional XLA compilation and a dummy batch at load time
+COMPILED_INFERENCE = _env_bool('AGRODOC_COMPILED_INFERENCE', True)
+XLA_JIT = _env_bool('AGRODOC_XLA_JIT', False)
+WARMUP_ON_LOAD = _env_bool('AGRODOC_WARMUP_ON_LOAD', True)
+
+# Skip the artificial pause after inference in process_image
+LATENCY_MODE = _env_bool('AGRODOC_LATENCY_MODE', False)
+
+# Prediction cache keyed on the preprocessed input tensor
+PREDICTION_CACHE = _env_bool('AGRODOC_PREDICTION_CACHE', True)
+CACHE_DB_PATH = os.environ.get('AGRODOC_CACHE_DB_PATH', 'prediction_cache.db')
+CACHE_MAX_MB = _env_float('AGRODOC_CACHE_MAX_MB', 64)
+
+# Write-behind queue for prediction rows: commit them in groups of up to
+# this many rows or after this long, instead of one commit per upload
+WRITE_BEHIND = _env_bool('AGRODOC_WRITE_BEHIND', False)
+WRITE_BEHIND_MAX_ROWS = _env_int('AGRODOC_WRITE_BEHIND_MAX_ROWS', 100)
+WRITE_BEHIND_MAX_WAIT_MS = _env_float('AGRODOC_WRITE_BEHIND_MAX_WAIT_MS', 200)
+# Past this many queued rows uploads insert synchronously instead
+WRITE_BEHIND_MAX_QUEUE = _env_int('AGRODOC_WRITE_BEHIND_MAX_QUEUE', 10000)
+
+# Near-duplicate uploads: reuse a user's recent result when the perceptual
+# hash of the new photo is within this Hamming distance. Off by default: the
+# new photo is never scored, so it gets the earlier photo's diagnosis
+NEAR_DUPLICATES = _env_bool('AGRODOC_NEAR_DUPLICATES', False)
+DUPLICATE_MAX_DISTANCE = _env_int('AGRODOC_DUPLICATE_MAX_DISTANCE', 6)
+DUPLICATE_WINDOW_HOURS = _env_float('AGRODOC_DUPLICATE_WINDOW_HOURS', 24)
+
+# Load and warm up the model on a background thread at boot instead of
+# blocking the first page render
+BACKGROUND_MODEL_LOAD = _env_bool('AGRODOC_BACKGROUND_MODEL_LOAD', True)
+# After a failed load, the next model request this many seconds later tries again
+MODEL_LOAD_RETRY_SECONDS = _env_float('AGRODOC_MODEL_LOAD_RETRY_SECONDS', 30)
+
+# Standalone inference server (inference_server.py). When enabled the app
+# sends uploads there and falls back to in-process inference if it is down
+USE_INFERENCE_SERVER = _env_bool('AGRODOC_USE_INFERENCE_SERVER', False)
+INFERENCE_SERVER_ADDRESS = os.environ.get('AGRODOC_INFERENCE_SERVER_ADDRESS', '127.0.0.1:8765')
+INFERENCE_SERVER_WORKERS = _env_int('AGRODOC_INFERENCE_SERVER_WORKERS', 2)
+
+# Batch prediction REST API (batch_api.py)
+API_ADDRESS = os.environ.get('AGRODOC_API_ADDRESS', '127.0.0.1:8080')
+API_TOKEN = os.environ.get('AGRODOC_API_TOKEN', '')
+API_BATCH_SIZE = _env_int('AGRODOC_API_BATCH_SIZE', 64)
+API_DECODE_THREADS = _env_int('AGRODOC_API_DECODE_THREADS', 8)
+API_MAX_UPLOAD_MB = _env_int('AGRODOC_API_MAX_UPLOAD_MB', 512)
+# Total size of the images once unpacked from the upload's zip archives
+API_MAX_UNPACKED_MB = _env_int('AGRODOC_API_MAX_UNPACKED_MB', 2048)
+
+# Prometheus text metrics on GET /metrics at this address. Users whose
+# email is listed in AGRODOC_ADMIN_EMAILS see the performance sidebar panel
+METRICS_ENABLED = _env_bool('AGRODOC_METRICS_ENABLED', True)
+METRICS_ADDRESS = os.environ.get('AGRODOC_METRICS_ADDRESS', '127.0.0.1:9464')
+ADMIN_EMAILS = {email.strip() for email in os.environ.get('AGRODOC_ADMIN_EMAILS', '').split(',') if email.strip()}
+
+# Cascade mode: a small first-stage model (train_first_stage.py) answers
+# when its top softmax score reaches the threshold, everything else goes to
+# the full backend above
+CASCADE = _env_bool('AGRODOC_CASCADE', False)
+CASCADE_MODEL_PATH = os.environ.get('AGRODOC_CASCADE_MODEL_PATH', 'Trained_Model.stage1.h5')
+CASCADE_THRESHOLD = _env_float('AGRODOC_CASCADE_THRESHOLD', 0.9)
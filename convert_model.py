@@ -0,0 +1,16 @@
+import argparse
+
+import config
+from backends import convert_to_tflite
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the trained Keras model to TFLite")
+    parser.add_argument('--model', default=config.MODEL_PATH, help="Keras H5 model")
+    parser.add_argument('--output', default=config.TFLITE_MODEL_PATH, help="TFLite flatbuffer to write")
+    args = parser.parse_args()
+
+    convert_to_tflite(args.model, args.output)
+    print(f"Wrote {args.output}")
+
+if __name__ == '__main__':
+    main()
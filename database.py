@@ -1,117 +1,607 @@
+import atexit
+import datetime
+import itertools
+import logging
+import os
 import sqlite3
-import streamlit as st
-
-def init_db():
-    conn = sqlite3.connect('plant_disease.db')
-    c = conn.cursor()
-    
-    # Create tables if they don't exist
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password TEXT NOT NULL,
-        phone TEXT,
-        show_notifications BOOLEAN DEFAULT 1,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        image_path TEXT NOT NULL,
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows; SQLite's own locking still serializes the steps
+    fcntl = None
+
+DB_PATH = 'plant_disease.db'
+
+logger = logging.getLogger(__name__)
+
+class _Lease:
+    """A thread's connection; goes back to the pool when the thread's locals are dropped"""
+
+    def __init__(self, pool, conn):
+        self.conn = conn
+        weakref.finalize(self, pool._release, conn)
+
+class ConnectionPool:
+    """Per-thread SQLite connections in WAL mode.
+
+    Each thread gets its own connection on first use, so Streamlit sessions
+    never share a cursor or an open transaction. WAL lets the history pages
+    read while another session writes; writers wait up to busy_timeout_ms
+    for each other instead of failing. When a thread exits its connection
+    is kept for the next thread, along with its cache of prepared
+    statements (sqlite3 reuses them per connection, keyed on the SQL text).
+    """
+
+    def __init__(self, db_path=DB_PATH, busy_timeout_ms=5000, cache_size_kb=16384,
+                 mmap_size_mb=256, cached_statements=256, max_idle=8, synchronous='NORMAL'):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.synchronous = synchronous
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.cached_statements = cached_statements
+        self.max_idle = max_idle
+        self._local = threading.local()
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        # check_same_thread is off only so an idle connection can move to a
+        # new thread; a connection is never used by two threads at once
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                               cached_statements=self.cached_statements, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        # NORMAL is durable across application crashes in WAL mode; only a
+        # power loss can drop the last commits
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size_mb) * 1024 * 1024}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    return
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # Already closed by close()
+
+    def connection(self):
+        """This thread's connection"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            lease = self._local.lease = _Lease(self, conn or self._connect())
+        return lease.conn
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def fetchone(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Yields this thread's connection, committing on success and rolling back on error"""
+        conn = self.connection()
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+def insert_prediction(conn, user_id, image_path, prediction, confidence, timestamp=None):
+    """Inserts one prediction row and returns its id; the caller commits"""
+    if timestamp is None:
+        cursor = conn.execute('''INSERT INTO predictions (user_id, image_path, prediction, confidence)
+                                 VALUES (?, ?, ?, ?)''', (user_id, image_path, prediction, confidence))
+    else:
+        cursor = conn.execute('''INSERT INTO predictions (user_id, image_path, prediction, confidence, timestamp)
+                                 VALUES (?, ?, ?, ?, ?)''', (user_id, image_path, prediction, confidence, timestamp))
+    return cursor.lastrowid
+
+class _PendingPrediction:
+    __slots__ = ('seq', 'user_id', 'image_path', 'prediction', 'confidence', 'timestamp', 'on_insert',
+                 'attempts')
+
+    def __init__(self, seq, user_id, image_path, prediction, confidence, on_insert):
+        self.seq = seq
+        self.user_id = user_id
+        self.image_path = image_path
+        self.prediction = prediction
+        self.confidence = confidence
+        # Stamped now, in CURRENT_TIMESTAMP's format, so the row sorts where
+        # it would have with an immediate insert
+        self.timestamp = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        self.on_insert = on_insert
+        self.attempts = 0
+
+    def insert(self, conn):
+        """Inserts the row; returns on_insert's after-commit function, if any"""
+        prediction_id = insert_prediction(conn, self.user_id, self.image_path, self.prediction,
+                                          self.confidence, self.timestamp)
+        if self.on_insert is not None:
+            return self.on_insert(conn, prediction_id)
+        return None
+
+def run_after_commit(callbacks):
+    """Calls the functions on_insert hooks returned, once their rows are committed.
+
+    The rows are stored by then, so a failure is logged rather than raised
+    or retried.
+    """
+    for callback in callbacks:
+        if callback is None:
+            continue
+        try:
+            callback()
+        except Exception:
+            logger.exception("After-commit update for a stored prediction failed")
+
+class PredictionWriter:
+    """Write-behind queue that commits prediction rows in groups.
+
+    add() returns at once; a background thread inserts up to max_rows
+    queued rows in one transaction when that many are waiting or
+    max_wait_ms after the oldest arrived. Until then the rows are only in memory, so history
+    queries merge in visible(user_id). flush() is the durability barrier
+    and runs at interpreter exit.
+
+    If a group fails, its rows are retried one transaction each, so one bad
+    row cannot hold back the rows queued after it; a row that fails
+    max_attempts times is logged and dropped. Once max_queue rows are
+    waiting (the database is locked or down), add() inserts synchronously
+    instead of queueing more.
+    """
+
+    def __init__(self, pool, max_rows=100, max_wait_ms=200, max_queue=10000, max_attempts=3):
+        self.pool = pool
+        self.max_rows = max(1, int(max_rows))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.max_queue = max(1, int(max_queue))
+        self.max_attempts = max(1, int(max_attempts))
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        # Held while a group is inserted and dequeued, so readers see each
+        # row either in the queue or in the table, never both or neither
+        self._flush_lock = threading.Lock()
+        self._seq = 0
+        self._written = 0
+        self._flush_requested = False
+        self._closed = False
+        self._groups = 0
+        self._failed_groups = 0
+        self._errors = 0
+        self._sync_inserts = 0
+        self._last_group_size = 0
+
+        self._worker = threading.Thread(target=self._run, name='agrodoc-prediction-writer', daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def add(self, user_id, image_path, prediction, confidence, on_insert=None):
+        """Queues a prediction row.
+
+        on_insert(conn, prediction_id) runs in the same transaction once the
+        row has its id, for rows that reference it. It may return a function
+        to call once that transaction has committed, for in-memory state that
+        must not see rows that are rolled back or retried. With the queue
+        full the row is inserted before add() returns, and any error is raised.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("PredictionWriter is closed")
+            self._seq += 1
+            row = _PendingPrediction(self._seq, user_id, image_path, prediction, confidence, on_insert)
+            if len(self._queue) < self.max_queue:
+                self._queue.append(row)
+                self._cond.notify_all()
+                return
+            self._sync_inserts += 1
+        with self.pool.transaction() as conn:
+            after_commit = row.insert(conn)
+        run_after_commit([after_commit])
+
+    @contextmanager
+    def visible(self, user_id):
+        """Yields the user's queued (timestamp, prediction, confidence) rows, newest first.
+
+        No group commits until the block exits, so queries run inside it
+        and merged with these rows count every prediction exactly once.
+        """
+        with self._flush_lock:
+            with self._cond:
+                rows = [(row.timestamp, row.prediction, row.confidence)
+                        for row in reversed(self._queue) if row.user_id == user_id]
+            yield rows
+
+    def flush(self, timeout=None):
+        """Blocks until every row queued before the call is committed or dropped"""
+        with self._cond:
+            target = self._seq
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue or self._queue[0].seq > target, timeout)
+
+    def close(self, timeout=30.0):
+        """Flushes and stops the writer; False if rows were still unwritten after timeout"""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            unwritten = len(self._queue)
+        if flushed:
+            self._worker.join()
+        else:
+            logger.error("PredictionWriter closed with %d prediction rows unwritten", unwritten)
+        return flushed
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'groups': self._groups,
+                'rows': self._written,
+                'avg_group_size': self._written / self._groups if self._groups else 0.0,
+                'last_group_size': self._last_group_size,
+                'failed_groups': self._failed_groups,
+                'errors': self._errors,
+                'sync_inserts': self._sync_inserts,
+            }
+
+    def _wait_for_group(self):
+        # Wait for a first row, then until the group is full, its window has
+        # elapsed or someone is waiting on flush()
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return False
+            # Rows being retried already waited out their backoff
+            deadline = time.monotonic() + self.max_wait
+            while (len(self._queue) < self.max_rows and not self._flush_requested
+                   and not self._closed and not self._queue[0].attempts):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            self._flush_requested = False
+            return True
+
+    def _write_rows(self, group):
+        """Inserts each row in its own transaction; returns (written, rows to retry)"""
+        written, retry = 0, []
+        for row in group:
+            try:
+                with self.pool.transaction() as conn:
+                    after_commit = row.insert(conn)
+            except Exception:
+                row.attempts += 1
+                if row.attempts < self.max_attempts:
+                    retry.append(row)
+                    continue
+                logger.exception("Dropping prediction row for user %s (%s) after %d failed attempts",
+                                 row.user_id, row.image_path, row.attempts)
+                with self._cond:
+                    self._errors += 1
+            else:
+                written += 1
+                run_after_commit([after_commit])
+        return written, retry
+
+    def _write_group(self):
+        with self._flush_lock:
+            with self._cond:
+                group = list(itertools.islice(self._queue, self.max_rows))
+            failed = False
+            try:
+                with self.pool.transaction() as conn:
+                    after_commit = [row.insert(conn) for row in group]
+            except Exception:
+                failed = True
+                written, retry = self._write_rows(group)
+            else:
+                written, retry = len(group), []
+                run_after_commit(after_commit)
+            with self._cond:
+                for _ in group:
+                    self._queue.popleft()
+                # Rows still to retry go back to the front, in their order
+                self._queue.extendleft(reversed(retry))
+                self._written += written
+                self._groups += 1
+                self._failed_groups += failed
+                self._last_group_size = len(group)
+                self._cond.notify_all()
+        if retry:
+            # Give a locked or unavailable database a moment before retrying
+            time.sleep(min(self.max_wait, 0.5) or 0.05)
+
+    def _run(self):
+        while self._wait_for_group():
+            self._write_group()
+
+# Per-user totals and per-user/day/class counts of predictions, so the
+# Predictions page reads a handful of rows however long a user's history is.
+# Confidence is kept as a sum so rows can be added and removed exactly;
+# averages are confidence_sum / predictions. Triggers keep both tables in
+# step with every insert, delete and update of predictions, whichever code
+# path makes it. Rows without a user_id belong to no history and are left
+# out (an INTEGER PRIMARY KEY would turn a NULL into a made-up user).
+SUMMARY_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS user_prediction_totals
+       (user_id INTEGER PRIMARY KEY,
+        predictions INTEGER NOT NULL,
+        confidence_sum REAL NOT NULL)''',
+    '''CREATE TABLE IF NOT EXISTS user_daily_predictions
+       (user_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
         prediction TEXT NOT NULL,
-        confidence REAL NOT NULL,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS reviews (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER,
-        rating INTEGER NOT NULL,
-        review TEXT,
-        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(id)
-    )''')
-    
-    # Create users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  email TEXT UNIQUE NOT NULL,
-                  password TEXT NOT NULL,
-                  phone TEXT,
-                  show_notifications BOOLEAN DEFAULT TRUE,
-                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Create predictions table
-    c.execute('''CREATE TABLE IF NOT EXISTS predictions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  image_path TEXT NOT NULL,
-                  prediction TEXT NOT NULL,
-                  confidence REAL NOT NULL,
-                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY(user_id) REFERENCES users(id))''')
-    
-    # Create notifications table (with title column)
-    c.execute('''CREATE TABLE IF NOT EXISTS notifications
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  title TEXT NOT NULL,
-                  content TEXT NOT NULL,
-                  is_active BOOLEAN DEFAULT TRUE,
-                  created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
-    
-    # Create reviews table
-    c.execute('''CREATE TABLE IF NOT EXISTS reviews
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER NOT NULL,
-                  rating INTEGER NOT NULL,
-                  review TEXT,
-                  timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY(user_id) REFERENCES users(id))''')
-    
-    # Create indexes
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_predictions_user 
-              ON predictions(user_id)''')
-    c.execute('''CREATE INDEX IF NOT EXISTS idx_reviews_user 
-              ON reviews(user_id)''')
-    
-    # Insert sample notification if none exists
-    c.execute('''INSERT INTO notifications (title, content, is_active)
-                 SELECT 'Welcome!', 'Thank you for using Agrodoc!', 1
-                 WHERE NOT EXISTS (SELECT 1 FROM notifications)''')
-    
-    conn.commit()
-    conn.close()
-
-def migrate_db():
-    """Handles database migrations safely"""
-    conn = sqlite3.connect('plant_disease.db')
-    c = conn.cursor()
-    
-    try:
-        # First check if notifications table exists
-        c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notifications'")
-        table_exists = c.fetchone() is not None
-        
-        if table_exists:
-            # Check if title column exists
-            c.execute("PRAGMA table_info(notifications)")
-            columns = [column[1] for column in c.fetchall()]
-            if 'title' not in columns:
-                c.execute('''ALTER TABLE notifications ADD COLUMN title TEXT''')
-                # Set default value for existing notifications
-                c.execute('''UPDATE notifications SET title = 'Important Update' 
-                           WHERE title IS NULL''')
-                conn.commit()
-                st.success("Database migration completed successfully")
-    except Exception as e:
-        st.error(f"Migration error: {str(e)}")
-    finally:
-        conn.close()
-
-# Initialize database and run migrations in correct order
-init_db()  # Create tables first
-migrate_db()  # Then run migrations
\ No newline at end of file
+        predictions INTEGER NOT NULL,
+        confidence_sum REAL NOT NULL,
+        PRIMARY KEY (user_id, day, prediction)) WITHOUT ROWID''',
+    '''CREATE TRIGGER IF NOT EXISTS predictions_summary_insert AFTER INSERT ON predictions
+       BEGIN
+           INSERT INTO user_prediction_totals (user_id, predictions, confidence_sum)
+           SELECT NEW.user_id, 1, NEW.confidence WHERE NEW.user_id IS NOT NULL
+           ON CONFLICT (user_id) DO UPDATE SET predictions = predictions + 1,
+                                               confidence_sum = confidence_sum + excluded.confidence_sum;
+           INSERT INTO user_daily_predictions (user_id, day, prediction, predictions, confidence_sum)
+           SELECT NEW.user_id, substr(NEW.timestamp, 1, 10), NEW.prediction, 1, NEW.confidence
+           WHERE NEW.user_id IS NOT NULL
+           ON CONFLICT (user_id, day, prediction) DO UPDATE SET predictions = predictions + 1,
+                                                                confidence_sum = confidence_sum + excluded.confidence_sum;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS predictions_summary_delete AFTER DELETE ON predictions
+       BEGIN
+           UPDATE user_prediction_totals
+           SET predictions = predictions - 1, confidence_sum = confidence_sum - OLD.confidence
+           WHERE user_id = OLD.user_id;
+           DELETE FROM user_prediction_totals WHERE user_id = OLD.user_id AND predictions <= 0;
+           UPDATE user_daily_predictions
+           SET predictions = predictions - 1, confidence_sum = confidence_sum - OLD.confidence
+           WHERE user_id = OLD.user_id AND day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction;
+           DELETE FROM user_daily_predictions
+           WHERE user_id = OLD.user_id AND day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction
+                 AND predictions <= 0;
+       END''',
+    '''CREATE TRIGGER IF NOT EXISTS predictions_summary_update
+       AFTER UPDATE OF user_id, prediction, confidence, timestamp ON predictions
+       BEGIN
+           UPDATE user_prediction_totals
+           SET predictions = predictions - 1, confidence_sum = confidence_sum - OLD.confidence
+           WHERE user_id = OLD.user_id;
+           DELETE FROM user_prediction_totals WHERE user_id = OLD.user_id AND predictions <= 0;
+           UPDATE user_daily_predictions
+           SET predictions = predictions - 1, confidence_sum = confidence_sum - OLD.confidence
+           WHERE user_id = OLD.user_id AND day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction;
+           DELETE FROM user_daily_predictions
+           WHERE user_id = OLD.user_id AND day = substr(OLD.timestamp, 1, 10) AND prediction = OLD.prediction
+                 AND predictions <= 0;
+           INSERT INTO user_prediction_totals (user_id, predictions, confidence_sum)
+           SELECT NEW.user_id, 1, NEW.confidence WHERE NEW.user_id IS NOT NULL
+           ON CONFLICT (user_id) DO UPDATE SET predictions = predictions + 1,
+                                               confidence_sum = confidence_sum + excluded.confidence_sum;
+           INSERT INTO user_daily_predictions (user_id, day, prediction, predictions, confidence_sum)
+           SELECT NEW.user_id, substr(NEW.timestamp, 1, 10), NEW.prediction, 1, NEW.confidence
+           WHERE NEW.user_id IS NOT NULL
+           ON CONFLICT (user_id, day, prediction) DO UPDATE SET predictions = predictions + 1,
+                                                                confidence_sum = confidence_sum + excluded.confidence_sum;
+       END''',
+]
+
+def rebuild_summaries(conn):
+    """Recomputes the summary tables from predictions; the caller commits"""
+    conn.execute('DELETE FROM user_prediction_totals')
+    conn.execute('DELETE FROM user_daily_predictions')
+    conn.execute('''INSERT INTO user_prediction_totals (user_id, predictions, confidence_sum)
+                    SELECT user_id, COUNT(*), SUM(confidence) FROM predictions
+                    WHERE user_id IS NOT NULL GROUP BY user_id''')
+    conn.execute('''INSERT INTO user_daily_predictions (user_id, day, prediction, predictions, confidence_sum)
+                    SELECT user_id, substr(timestamp, 1, 10), prediction, COUNT(*), SUM(confidence)
+                    FROM predictions WHERE user_id IS NOT NULL GROUP BY user_id, substr(timestamp, 1, 10), prediction''')
+
+# Schema changes as ordered, run-once steps. schema_version records the
+# steps a database has had, so a booted process checks one row instead of
+# re-running every CREATE on each Streamlit rerun. Steps run inside a
+# transaction with their version row and are written to be idempotent:
+# databases created before schema_version existed already have some of
+# their objects, and get the version rows recorded without changes.
+
+def _create_base_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     name TEXT NOT NULL,
+                     email TEXT UNIQUE NOT NULL,
+                     password TEXT NOT NULL,
+                     phone TEXT,
+                     show_notifications BOOLEAN DEFAULT 1,
+                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS predictions
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     image_path TEXT NOT NULL,
+                     prediction TEXT NOT NULL,
+                     confidence REAL NOT NULL,
+                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     FOREIGN KEY(user_id) REFERENCES users(id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS reviews
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER,
+                     rating INTEGER NOT NULL,
+                     review TEXT,
+                     timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                     FOREIGN KEY(user_id) REFERENCES users(id))''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS notifications
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     title TEXT NOT NULL,
+                     content TEXT NOT NULL,
+                     is_active BOOLEAN DEFAULT TRUE,
+                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews(user_id)')
+
+def _add_notification_titles(conn):
+    # Notifications tables from before titles existed
+    columns = [column[1] for column in conn.execute('PRAGMA table_info(notifications)')]
+    if 'title' not in columns:
+        conn.execute('ALTER TABLE notifications ADD COLUMN title TEXT')
+        conn.execute("UPDATE notifications SET title = 'Important Update' WHERE title IS NULL")
+
+def _seed_notifications(conn):
+    conn.execute('''INSERT INTO notifications (title, content, is_active)
+                    SELECT 'Welcome!', 'Thank you for using Agrodoc!', 1
+                    WHERE NOT EXISTS (SELECT 1 FROM notifications)''')
+
+def _create_upload_hashes(conn):
+    # Perceptual hashes of past uploads, used to spot near-duplicate photos
+    conn.execute('''CREATE TABLE IF NOT EXISTS upload_hashes
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     user_id INTEGER NOT NULL,
+                     prediction_id INTEGER NOT NULL,
+                     phash INTEGER NOT NULL,
+                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                     FOREIGN KEY(user_id) REFERENCES users(id),
+                     FOREIGN KEY(prediction_id) REFERENCES predictions(id))''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_upload_hashes_user ON upload_hashes(user_id, created_at)')
+
+def _index_history(conn):
+    # History pages seek along (user_id, timestamp DESC, id DESC); it also
+    # serves every lookup the old single-column user_id index did
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_predictions_user_time '
+                 'ON predictions(user_id, timestamp DESC, id DESC)')
+    conn.execute('DROP INDEX IF EXISTS idx_predictions_user')
+
+def _create_summaries(conn):
+    # Filled from the existing predictions only when the tables are new
+    backfill = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' "
+                            "AND name='user_prediction_totals'").fetchone() is None
+    for statement in SUMMARY_SCHEMA:
+        conn.execute(statement)
+    if backfill:
+        rebuild_summaries(conn)
+
+def _skip_null_user_summaries(conn):
+    # The first summary triggers counted rows with a NULL user_id under a
+    # made-up user (or failed on user_daily_predictions). Swap in the
+    # current triggers, and recount only if any such rows exist.
+    for trigger in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS predictions_summary_{trigger}')
+    for statement in SUMMARY_SCHEMA:
+        conn.execute(statement)
+    if conn.execute('SELECT 1 FROM predictions WHERE user_id IS NULL LIMIT 1').fetchone():
+        rebuild_summaries(conn)
+
+# (version, name, step); append new steps, never edit or reorder applied ones
+MIGRATIONS = [
+    (1, 'users, predictions, reviews and notifications', _create_base_tables),
+    (2, 'notification titles', _add_notification_titles),
+    (3, 'welcome notification', _seed_notifications),
+    (4, 'upload hashes', _create_upload_hashes),
+    (5, 'history index', _index_history),
+    (6, 'prediction summaries', _create_summaries),
+    (7, 'summaries skip rows without a user', _skip_null_user_summaries),
+]
+
+def _create_prediction_cache(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS prediction_cache
+                    (input_hash TEXT NOT NULL,
+                     model_hash TEXT NOT NULL,
+                     probabilities BLOB NOT NULL,
+                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                     PRIMARY KEY (input_hash, model_hash))''')
+
+# The prediction cache lives in its own file (config.CACHE_DB_PATH)
+CACHE_MIGRATIONS = [
+    (1, 'prediction cache', _create_prediction_cache),
+]
+
+_migrated = set()
+_migrate_lock = threading.Lock()
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock across processes, e.g. several Streamlit servers booting at once"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def schema_version(conn):
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(db_path=DB_PATH, migrations=MIGRATIONS):
+    """Brings db_path up to the last of `migrations`, once per process.
+
+    Returns the names of the steps applied; later calls in the same
+    process return [] without opening the database.
+    """
+    key = (os.path.realpath(db_path), id(migrations))
+    if key in _migrated:
+        return []
+    with _migrate_lock:
+        if key in _migrated:
+            return []
+        applied = []
+        with _file_lock(f"{db_path}.migrate.lock"):
+            # Autocommit, so each step's BEGIN/COMMIT covers its DDL too
+            conn = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                                (version INTEGER PRIMARY KEY,
+                                 name TEXT NOT NULL,
+                                 applied_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+                current = schema_version(conn)
+                for version, name, step in migrations:
+                    if version <= current:
+                        continue
+                    conn.execute('BEGIN IMMEDIATE')
+                    try:
+                        # Re-read under the write lock in case another
+                        # process got here first without the file lock
+                        if schema_version(conn) >= version:
+                            conn.execute('ROLLBACK')
+                            continue
+                        step(conn)
+                        conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                                     (version, name))
+                    except BaseException:
+                        conn.execute('ROLLBACK')
+                        raise
+                    conn.execute('COMMIT')
+                    applied.append(name)
+            finally:
+                conn.close()
+        _migrated.add(key)
+    return applied
+
+def init_db(db_path=DB_PATH):
+    """Creates or upgrades the app database; a no-op after the first call in a process"""
+    return migrate(db_path, MIGRATIONS)
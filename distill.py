@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+
+import tensorflow as tf
+
+import config
+from backends import KerasBackend
+from compact_models import accuracy, build_compact_cnn, count_flops, labelled_dataset
+from quantize import single_image_latency
+
+# Knowledge distillation: Trained_Model.h5 is the teacher and each student
+# below learns from its softened predictions as well as the true labels.
+# Every student is saved with a JSON sidecar of parameter count, FLOPs, CPU
+# latency and validation accuracy, so a point on the speed/accuracy curve
+# can be picked and served (directly, or as the cascade first stage).
+
+STUDENTS = {
+    'gap-32x5': dict(base_filters=32, blocks=5),
+    'gap-16x4': dict(base_filters=16, blocks=4),
+    'sep-32x5': dict(base_filters=32, blocks=5, separable=True),
+    'sep-16x4': dict(base_filters=16, blocks=4, separable=True),
+    'sep-8x4': dict(base_filters=8, blocks=4, separable=True),
+}
+
+def distill(student, teacher, training_set, validation_set, epochs, temperature, alpha, learning_rate):
+    """Trains student in place and keeps the weights with the best validation accuracy"""
+    logits_model = tf.keras.Model(student.inputs, student.get_layer('logits').output)
+    optimizer = tf.keras.optimizers.Adam(learning_rate=learning_rate)
+
+    @tf.function
+    def train_step(images, labels):
+        # The teacher ends in softmax; its log-probabilities are its logits
+        # up to a per-image constant, which softmax ignores
+        teacher_probabilities = teacher(images, training=False)
+        soft_targets = tf.nn.softmax(tf.math.log(teacher_probabilities + 1e-8) / temperature)
+        with tf.GradientTape() as tape:
+            logits = logits_model(images, training=True)
+            hard_loss = tf.keras.losses.categorical_crossentropy(labels, logits, from_logits=True)
+            # Cross-entropy against soft targets differs from the KL
+            # divergence only by the teacher's entropy, a constant
+            soft_loss = tf.keras.losses.categorical_crossentropy(soft_targets, logits / temperature,
+                                                                 from_logits=True)
+            loss = tf.reduce_mean(alpha * hard_loss + (1 - alpha) * temperature ** 2 * soft_loss)
+        gradients = tape.gradient(loss, logits_model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, logits_model.trainable_variables))
+        return loss
+
+    best_accuracy, best_weights = -1.0, None
+    for epoch in range(epochs):
+        losses = [float(train_step(images, labels)) for images, labels in training_set]
+        validation_accuracy = accuracy(lambda images: student(images, training=False).numpy(), validation_set)
+        print(f"  epoch {epoch + 1}/{epochs}: loss {sum(losses) / len(losses):.4f}, "
+              f"validation accuracy {validation_accuracy:.2%}")
+        if validation_accuracy > best_accuracy:
+            best_accuracy, best_weights = validation_accuracy, student.get_weights()
+    student.set_weights(best_weights)
+    return student
+
+def measure(model, path, validation_set, runs):
+    backend = KerasBackend(path, compiled=True, warmup=True)
+    latency = single_image_latency(backend, runs)
+    return {
+        'model': path,
+        'params': int(model.count_params()),
+        'flops': int(count_flops(model)),
+        'p50_latency_ms': latency['p50_ms'],
+        'p99_latency_ms': latency['p99_ms'],
+        'validation_accuracy': accuracy(backend.predict, validation_set),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill Trained_Model.h5 into compact student models")
+    parser.add_argument('--teacher', default=config.MODEL_PATH)
+    parser.add_argument('--train-dir', default='train')
+    parser.add_argument('--valid-dir', default='valid')
+    parser.add_argument('--output-dir', default='students')
+    parser.add_argument('--students', nargs='+', choices=sorted(STUDENTS), default=list(STUDENTS))
+    parser.add_argument('--epochs', type=int, default=10)
+    parser.add_argument('--temperature', type=float, default=4.0)
+    parser.add_argument('--alpha', type=float, default=0.1, help="Weight of the hard-label loss")
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    parser.add_argument('--runs', type=int, default=200, help="Timed single-image predictions per model")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    training_set = labelled_dataset(args.train_dir)
+    validation_set = labelled_dataset(args.valid_dir, shuffle=False)
+    teacher = tf.keras.models.load_model(args.teacher)
+
+    report = {'teacher': measure(teacher, args.teacher, validation_set, args.runs)}
+    for name in args.students:
+        print(f"Distilling {name}")
+        student = build_compact_cnn(name=name.replace('-', '_'), **STUDENTS[name])
+        distill(student, teacher, training_set, validation_set,
+                args.epochs, args.temperature, args.alpha, args.learning_rate)
+        path = os.path.join(args.output_dir, f"{name}.h5")
+        student.save(path)
+        report[name] = measure(student, path, validation_set, args.runs)
+        with open(os.path.join(args.output_dir, f"{name}.json"), 'w') as f:
+            json.dump(report[name], f, indent=2)
+
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{'model':<10} {'params':>12} {'MFLOPs':>9} {'p50 ms':>8} {'val acc':>8}")
+    for name, row in report.items():
+        print(f"{name:<10} {row['params']:>12,} {row['flops'] / 1e6:>9.1f} "
+              f"{row['p50_latency_ms']:>8.2f} {row['validation_accuracy']:>8.2%}")
+
+if __name__ == '__main__':
+    main()
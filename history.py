@@ -0,0 +1,112 @@
+import datetime
+
+# Prediction history queries for the Predictions page. Row queries are
+# answered from the idx_predictions_user_time index on
+# (user_id, timestamp DESC, id DESC): date filters are half-open timestamp
+# ranges rather than DATE(timestamp), which hides the column from the
+# index, and pages seek past the last row shown (keyset pagination)
+# instead of skipping OFFSET rows, so a deep page costs the same as the
+# first. Counts and charts come from the trigger-maintained summary tables
+# (see database.SUMMARY_SCHEMA) rather than from the rows. Rows queued by the
+# write-behind PredictionWriter are passed in as `pending` and included.
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Cursor of the newest possible stored row, for a next page after a first
+# page filled with queued rows only
+TOP = ('9999-12-31 23:59:59', 0)
+
+def day_bounds(day):
+    """[start, end) timestamps covering one calendar day"""
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    return start.strftime(TIMESTAMP_FORMAT), end.strftime(TIMESTAMP_FORMAT)
+
+def _on_day(rows, day):
+    prefix = day.isoformat()
+    return [row for row in rows if row[0].startswith(prefix)]
+
+def count_predictions(db, user_id, pending=()):
+    row = db.fetchone('SELECT predictions FROM user_prediction_totals WHERE user_id = ?', (user_id,))
+    return len(pending) + (row[0] if row else 0)
+
+def _merge(groups, pending, key):
+    """Adds queued rows into {group: [predictions, confidence_sum]}"""
+    for row in pending:
+        totals = groups.setdefault(key(row), [0, 0.0])
+        totals[0] += 1
+        totals[1] += row[2]
+    return groups
+
+def daily_summary(db, user_id, since=None, pending=()):
+    """(day, predictions, average confidence) per day from `since` on, oldest first"""
+    since = since.isoformat() if since else ''
+    groups = {day: [count, total] for day, count, total in
+              db.fetchall('''SELECT day, SUM(predictions), SUM(confidence_sum)
+                             FROM user_daily_predictions
+                             WHERE user_id = ? AND day >= ?
+                             GROUP BY day''', (user_id, since))}
+    _merge(groups, [row for row in pending if row[0][:10] >= since], lambda row: row[0][:10])
+    return [(day, count, total / count) for day, (count, total) in sorted(groups.items())]
+
+def class_summary(db, user_id, day, pending=()):
+    """(prediction, predictions, average confidence) on one day, most frequent first"""
+    groups = {prediction: [count, total] for prediction, count, total in
+              db.fetchall('''SELECT prediction, predictions, confidence_sum
+                             FROM user_daily_predictions
+                             WHERE user_id = ? AND day = ?''', (user_id, day.isoformat()))}
+    _merge(groups, _on_day(pending, day), lambda row: row[1])
+    return sorted(((prediction, count, total / count) for prediction, (count, total) in groups.items()),
+                  key=lambda row: (-row[1], row[0]))
+
+def predictions_on(db, user_id, day, pending=()):
+    """Every (timestamp, prediction, confidence) of the user on one day, newest first"""
+    start, end = day_bounds(day)
+    return _on_day(pending, day) + db.fetchall('''SELECT timestamp, prediction, confidence
+                                                  FROM predictions
+                                                  WHERE user_id = ? AND timestamp >= ? AND timestamp < ?
+                                                  ORDER BY timestamp DESC, id DESC''',
+                                               (user_id, start, end))
+
+def history_page(db, user_id, limit, cursor=None, day=None, pending=()):
+    """One page of (timestamp, prediction, confidence) rows, newest first.
+
+    cursor is None for the first page, otherwise the next_cursor returned
+    with the previous page. Returns (rows, next_cursor); next_cursor is None
+    on the last page.
+
+    Queued rows are newer than anything stored, so they fill the first
+    pages, paged by position (the cursor's third field); stored rows
+    follow, paged by (timestamp, id). The writer commits the oldest queued
+    rows first, so positions counted from the newest stay put: a row
+    committed between two pages can show twice, but none is skipped.
+    """
+    timestamp, row_id, offset = cursor or (*TOP, 0)
+    rows = []
+    if (timestamp, row_id) == TOP:
+        queued = _on_day(pending, day) if day else list(pending)
+        rows = queued[offset:offset + limit]
+        offset += len(rows)
+        if offset < len(queued):
+            return rows, (*TOP, offset)
+    conditions, params = ['user_id = ?'], [user_id]
+    if day is not None:
+        conditions.append('timestamp >= ? AND timestamp < ?')
+        params += day_bounds(day)
+    # The first comparison bounds the index range; the second breaks ties
+    # between rows saved in the same second
+    conditions.append('timestamp <= ? AND (timestamp < ? OR id < ?)')
+    params += [timestamp, timestamp, row_id]
+    wanted = limit - len(rows)
+    # One extra row tells whether there is a next page
+    stored = db.fetchall(f'''SELECT id, timestamp, prediction, confidence
+                             FROM predictions
+                             WHERE {' AND '.join(conditions)}
+                             ORDER BY timestamp DESC, id DESC
+                             LIMIT ?''', (*params, wanted + 1))
+    rows += [row[1:] for row in stored[:wanted]]
+    if len(stored) > wanted:
+        next_cursor = (stored[wanted - 1][1], stored[wanted - 1][0], offset) if wanted else (*TOP, offset)
+    else:
+        next_cursor = None
+    return rows, next_cursor
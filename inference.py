@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+class _Request:
+    __slots__ = ('inputs', 'done', 'result', 'error')
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class MicroBatcher:
+    """Gathers concurrent predict calls from all sessions into shared forward passes"""
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._batches = 0
+        self._images = 0
+        self._last_batch_size = 0
+
+        self._worker = threading.Thread(target=self._run, name='agrodoc-batcher', daemon=True)
+        self._worker.start()
+
+    def predict(self, input_arr):
+        """Blocks until the batch holding `input_arr` has run and returns its rows"""
+        request = _Request(input_arr)
+        with self._cond:
+            self._queue.append(request)
+            self._cond.notify()
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'batches': self._batches,
+                'images': self._images,
+                'avg_batch_size': self._images / self._batches if self._batches else 0.0,
+                'last_batch_size': self._last_batch_size,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+            }
+
+    def _collect(self):
+        # Take the oldest request, then keep gathering until the batch is full
+        # or the wait window that started with it has elapsed
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            batch = [self._queue.popleft()]
+            size = len(batch[0].inputs)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                if not self._queue:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                    continue
+                if size + len(self._queue[0].inputs) > self.max_batch_size:
+                    break
+                request = self._queue.popleft()
+                batch.append(request)
+                size += len(request.inputs)
+            return batch, size
+
+    def _run(self):
+        while True:
+            batch, size = self._collect()
+            try:
+                if len(batch) == 1:
+                    outputs = self.predict_fn(batch[0].inputs)
+                else:
+                    outputs = self.predict_fn(np.concatenate([r.inputs for r in batch]))
+                offset = 0
+                for request in batch:
+                    count = len(request.inputs)
+                    request.result = outputs[offset:offset + count]
+                    offset += count
+            except Exception as e:
+                for request in batch:
+                    request.error = e
+            finally:
+                with self._cond:
+                    self._batches += 1
+                    self._images += size
+                    self._last_batch_size = size
+                for request in batch:
+                    request.done.set()
+
+class _Load:
+    __slots__ = ('done', 'value', 'error', 'finished_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.finished_at = None
+
+class BackgroundLoader:
+    """Builds an expensive resource on a daemon thread so callers only wait when they need it.
+
+    A failed load is raised to callers until retry_after seconds have
+    passed; the next get() after that starts a new attempt and waits for
+    it, so a transient failure (a file still being copied, a full disk)
+    doesn't last until the process restarts.
+    """
+
+    def __init__(self, factory, name='agrodoc-loader', retry_after=30.0):
+        self._factory = factory
+        self._name = name
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self._load = self._start()
+
+    def _start(self):
+        load = _Load()
+        self.started_at = time.perf_counter()
+        threading.Thread(target=self._run, args=(load, self.started_at), name=self._name, daemon=True).start()
+        return load
+
+    def _run(self, load, started_at):
+        try:
+            load.value = self._factory()
+        except Exception as e:
+            load.error = e
+        finally:
+            self.load_seconds = time.perf_counter() - started_at
+            load.finished_at = time.monotonic()
+            load.done.set()
+
+    def ready(self):
+        return self._load.done.is_set() and self._load.error is None
+
+    def failed(self):
+        return self._load.done.is_set() and self._load.error is not None
+
+    def get(self):
+        with self._lock:
+            load = self._load
+            if (load.done.is_set() and load.error is not None
+                    and time.monotonic() - load.finished_at >= self.retry_after):
+                load = self._load = self._start()
+        load.done.wait()
+        if load.error is not None:
+            raise load.error
+        return load.value
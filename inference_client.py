@@ -0,0 +1,66 @@
+import http.client
+import json
+import threading
+import time
+
+import numpy as np
+
+class InferenceUnavailable(Exception):
+    """The inference server could not be reached or could not score the image;
+    callers fall back to in-process inference"""
+
+class InferenceClient:
+    """Talks to inference_server.py, reusing one keep-alive connection per thread"""
+
+    def __init__(self, address, timeout=30, retry_after=30):
+        self.host, port = address.rsplit(':', 1)
+        self.port = int(port)
+        self.timeout = timeout
+        # After a failed connection, skip the server for this many seconds
+        # instead of paying a connect timeout on every upload
+        self.retry_after = retry_after
+        self._down_until = 0.0
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def predict(self, image_bytes):
+        """Returns a (1, 38) softmax array for the raw image bytes"""
+        if time.monotonic() < self._down_until:
+            raise InferenceUnavailable(f"{self.host}:{self.port} marked down")
+        # A reused connection may have been closed by the server since the
+        # last call, so retry once on a fresh one
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.request('POST', '/predict', body=image_bytes,
+                             headers={'Content-Type': 'application/octet-stream'})
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                self._drop_connection()
+                if attempt:
+                    self._down_until = time.monotonic() + self.retry_after
+                    raise InferenceUnavailable(f"{self.host}:{self.port}: {e}") from e
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = {}  # e.g. an error page from a proxy in front
+        error = payload.get('error', f"HTTP {response.status}")
+        # 5xx means the server or its worker pool failed, not the image
+        if response.status >= 500:
+            raise InferenceUnavailable(f"{self.host}:{self.port}: {error}")
+        if response.status != 200:
+            raise ValueError(error)
+        return np.array([payload['probabilities']], dtype=np.float32)
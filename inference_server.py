@@ -0,0 +1,133 @@
+import argparse
+import io
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from backends import check_thread_oversubscription
+
+# Standalone inference server: owns the model in a pool of worker processes
+# and scores raw image bytes POSTed to /predict. The Streamlit pages talk to
+# it through inference_client.InferenceClient.
+
+_backend = None
+
+def _init_worker():
+    global _backend
+    from backends import load_backend
+    _backend = load_backend()
+
+class InvalidImage(ValueError):
+    """The request body is not an image the worker can decode"""
+
+def score_image(image_bytes):
+    """Runs in a worker process: decode, preprocess and predict one upload"""
+    from preprocessing import load_image, model_input
+    try:
+        image = load_image(io.BytesIO(image_bytes))
+        image.load()
+    except Exception as e:
+        # PIL reports bad uploads as OSError or ValueError subclasses
+        raise InvalidImage(str(e) or type(e).__name__) from None
+    input_arr = model_input(image)
+    return _backend.predict(input_arr)[0].tolist()
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients can reuse one connection per thread
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != '/health':
+            self._send_json(404, {'error': 'not found'})
+            return
+        self._send_json(200, {'status': 'ok', 'workers': self.server.workers,
+                              'backend': config.BACKEND})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        image_bytes = self.rfile.read(length)
+        pool = self.server.pool
+        try:
+            probabilities = pool.submit(score_image, image_bytes).result()
+        except InvalidImage as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        except BrokenProcessPool as e:
+            # A worker died (OOM kill, segfault); later requests get a new pool
+            self.server.replace_pool(pool)
+            self._send_json(503, {'error': f"worker pool restarted: {e}"})
+            return
+        except Exception as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        self._send_json(200, {'probabilities': probabilities})
+
+    def log_message(self, format, *args):
+        pass
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers):
+        super().__init__(address, InferenceHandler)
+        self.workers = workers
+        self._pool_lock = threading.Lock()
+        self.pool = self._new_pool()
+
+    def _new_pool(self):
+        # TensorFlow is not fork-safe, so workers are spawned fresh
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def replace_pool(self, broken):
+        """Swaps in a new worker pool, once, for every request that saw `broken` fail"""
+        with self._pool_lock:
+            if self.pool is not broken:
+                return
+            self.pool = self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown()
+
+def main():
+    host, port = config.INFERENCE_SERVER_ADDRESS.rsplit(':', 1)
+    parser = argparse.ArgumentParser(description="Serve model predictions over HTTP")
+    parser.add_argument('--host', default=host)
+    parser.add_argument('--port', type=int, default=int(port))
+    parser.add_argument('--workers', type=int, default=config.INFERENCE_SERVER_WORKERS)
+    args = parser.parse_args()
+
+    # Each worker process gets its own full set of inference threads
+    check_thread_oversubscription(args.workers)
+    server = InferenceServer((args.host, args.port), args.workers)
+    # Load the model in every worker before accepting traffic
+    for future in [server.pool.submit(int) for _ in range(args.workers)]:
+        future.result()
+    print(f"Serving {config.BACKEND} model on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
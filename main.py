@@ -1,23 +1,69 @@
 import streamlit as st
-import tensorflow as tf
-import cv2
 import numpy as np
-import matplotlib.pyplot as plt
 from PIL import Image
 import sqlite3
 from passlib.hash import pbkdf2_sha256
 import datetime
 import os
 import time
-from database import init_db
+from contextlib import contextmanager
+from database import DB_PATH, ConnectionPool, PredictionWriter, init_db, insert_prediction, run_after_commit
+from inference import BackgroundLoader, MicroBatcher
+from backends import load_backend, model_files
+from inference_client import InferenceClient, InferenceUnavailable
+from prediction_cache import input_key, open_prediction_cache
+from near_duplicates import DuplicateIndex, dhash
+from uploads import save_upload
+from history import class_summary, count_predictions, daily_summary, history_page, predictions_on
+from class_names import CLASS_NAMES
+import config
+import metrics
 import random
 import time
 from passlib.hash import pbkdf2_sha256
 
-# Initialize database
+# Create or upgrade the schema; runs once per process, not on every rerun
 init_db()
-conn = sqlite3.connect('plant_disease.db')
-c = conn.cursor()
+
+# One pool per process; every session thread gets its own connection from it
+@st.cache_resource
+def load_db_pool():
+    return ConnectionPool(DB_PATH)
+
+db = load_db_pool()
+
+@st.cache_resource
+def load_prediction_writer():
+    if not config.WRITE_BEHIND:
+        return None
+    return PredictionWriter(db, max_rows=config.WRITE_BEHIND_MAX_ROWS,
+                            max_wait_ms=config.WRITE_BEHIND_MAX_WAIT_MS,
+                            max_queue=config.WRITE_BEHIND_MAX_QUEUE)
+
+def save_prediction(user_id, file_path, disease, confidence, phash):
+    """Stores a prediction, through the write-behind queue when it is enabled"""
+    on_insert = None
+    if duplicate_index:
+        def on_insert(conn, prediction_id):
+            return duplicate_index.add(conn, user_id, phash, prediction_id, disease, confidence)
+    writer = load_prediction_writer()
+    if writer:
+        writer.add(user_id, file_path, disease, confidence, on_insert)
+        return
+    with db.transaction() as conn:
+        prediction_id = insert_prediction(conn, user_id, file_path, disease, confidence)
+        after_commit = on_insert(conn, prediction_id) if on_insert else None
+    run_after_commit([after_commit])
+
+@contextmanager
+def pending_predictions(user_id):
+    """The user's predictions still in the write-behind queue, newest first"""
+    writer = load_prediction_writer()
+    if not writer:
+        yield []
+        return
+    with writer.visible(user_id) as rows:
+        yield rows
 
 # Custom CSS for animations and styling
 st.markdown("""
@@ -71,30 +117,68 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Load model
+# Load model on a background thread started at boot, so pages that don't
+# need it render without waiting for TensorFlow
 @st.cache_resource
+def start_model_loader():
+    return BackgroundLoader(load_backend, name='agrodoc-model-loader',
+                            retry_after=config.MODEL_LOAD_RETRY_SECONDS)
+
 def load_model():
-    return tf.keras.models.load_model('Trained_Model.h5')
-
-model = load_model()
-
-# Class names
-CLASS_NAMES = [
-    'Apple___Apple_scab', 'Apple___Black_rot', 'Apple___Cedar_apple_rust', 
-    'Apple___healthy', 'Blueberry___healthy', 'Cherry_(including_sour)___healthy',
-    'Cherry_(including_sour)___Powdery_mildew', 'Corn_(maize)___Cercospora_leaf_spot Gray_leaf_spot',
-    'Corn_(maize)___Common_rust_', 'Corn_(maize)___healthy', 'Corn_(maize)___Northern_Leaf_Blight',
-    'Grape___Black_rot', 'Grape___Esca_(Black_Measles)', 'Grape___healthy',
-    'Grape___Leaf_blight_(Isariopsis_Leaf_Spot)', 'Orange___Haunglongbing_(Citrus_greening)',
-    'Peach___Bacterial_spot', 'Peach___healthy', 'Pepper,_bell___Bacterial_spot',
-    'Pepper,_bell___healthy', 'Potato___Early_blight', 'Potato___healthy',
-    'Potato___Late_blight', 'Raspberry___healthy', 'Soybean___healthy',
-    'Squash___Powdery_mildew', 'Strawberry___healthy', 'Strawberry___Leaf_scorch',
-    'Tomato___Bacterial_spot', 'Tomato___Early_blight', 'Tomato___healthy',
-    'Tomato___Late_blight', 'Tomato___Leaf_Mold', 'Tomato___Septoria_leaf_spot',
-    'Tomato___Spider_mites Two-spotted_spider_mite', 'Tomato___Target_Spot',
-    'Tomato___Tomato_mosaic_virus', 'Tomato___Tomato_Yellow_Leaf_Curl_Virus'
-]
+    with metrics.LOAD_MODEL_SECONDS.time():
+        return start_model_loader().get()
+
+# Shared across sessions so concurrent uploads run as one batch
+@st.cache_resource
+def load_batcher():
+    return MicroBatcher(load_model().predict,
+                        max_batch_size=config.BATCH_MAX_SIZE,
+                        max_wait_ms=config.BATCH_MAX_WAIT_MS)
+
+@st.cache_resource
+def load_prediction_cache():
+    if not config.PREDICTION_CACHE:
+        return None
+    # Cascade answers depend on the first-stage model and its threshold too
+    settings = f"cascade:{config.CASCADE_THRESHOLD}" if config.CASCADE else ''
+    return open_prediction_cache(config.CACHE_DB_PATH, model_files(),
+                                 int(config.CACHE_MAX_MB * 1024 * 1024), settings)
+
+@st.cache_resource
+def load_inference_client():
+    if not config.USE_INFERENCE_SERVER:
+        return None
+    return InferenceClient(config.INFERENCE_SERVER_ADDRESS)
+
+def run_inference(input_arr, image_bytes):
+    client = load_inference_client()
+    if client is not None:
+        try:
+            return client.predict(image_bytes)
+        except InferenceUnavailable:
+            pass  # Server down or failing, score in-process instead
+    return load_batcher().predict(input_arr)
+
+@st.cache_resource
+def load_duplicate_index():
+    if not config.NEAR_DUPLICATES:
+        return None
+    return DuplicateIndex(DB_PATH,
+                          max_distance=config.DUPLICATE_MAX_DISTANCE,
+                          window_hours=config.DUPLICATE_WINDOW_HOURS)
+
+@st.cache_resource
+def start_metrics_endpoint():
+    if not config.METRICS_ENABLED:
+        return None
+    return metrics.start_metrics_server(config.METRICS_ADDRESS)
+
+# With an inference server the model is only loaded here as a fallback
+model_loader = None if config.USE_INFERENCE_SERVER else start_model_loader()
+if model_loader and not config.BACKGROUND_MODEL_LOAD:
+    load_model()
+duplicate_index = load_duplicate_index()
+start_metrics_endpoint()
 
 # Session state management
 session_defaults = {
@@ -1069,26 +1153,28 @@ def display_disease_info():
 
 # Database operations
 def get_active_notifications():
-    c.execute('''SELECT title, content FROM notifications 
-               WHERE is_active = TRUE ORDER BY created_at DESC LIMIT 3''')
-    return c.fetchall()
+    return db.fetchall('''SELECT title, content FROM notifications 
+                          WHERE is_active = TRUE ORDER BY created_at DESC LIMIT 3''')
 
 # Authentication functions
 def create_user(name, email, password, phone):
     try:
         hashed_password = pbkdf2_sha256.hash(password)
-        c.execute('INSERT INTO users (name, email, password, phone) VALUES (?, ?, ?, ?)',
-                 (name, email, hashed_password, phone))
-        conn.commit()
+        with db.transaction() as conn:
+            conn.execute('INSERT INTO users (name, email, password, phone) VALUES (?, ?, ?, ?)',
+                         (name, email, hashed_password, phone))
         return True
     except sqlite3.IntegrityError:
         return False
 
 def verify_user(email, password):
-    c.execute('SELECT * FROM users WHERE email = ?', (email,))
-    user = c.fetchone()
-    if user and pbkdf2_sha256.verify(password, user[3]):
-        return user
+    with metrics.VERIFY_USER_SECONDS.time():
+        with metrics.db_seconds('verify_user').time():
+            user = db.fetchone('SELECT * FROM users WHERE email = ?', (email,))
+        if user and pbkdf2_sha256.verify(password, user[3]):
+            metrics.logins('success').inc()
+            return user
+    metrics.logins('failure').inc()
     return None
 
 # UI Components
@@ -1124,13 +1210,53 @@ def show_navigation():
         page = st.sidebar.radio("Menu", ["Home", "About", "Account"])
     st.session_state.page = page
 
+def model_status():
+    if model_loader is None:
+        st.sidebar.caption(f"🛰️ Inference server at {config.INFERENCE_SERVER_ADDRESS}")
+    elif model_loader.ready():
+        st.sidebar.caption(f"🟢 Model ready ({model_loader.load_seconds:.1f}s to load)")
+    elif model_loader.failed():
+        st.sidebar.caption("🔴 Model failed to load; uploads will retry it")
+    else:
+        st.sidebar.caption("🟡 Loading model...")
+
+def batch_stats_panel():
+    if not config.SHOW_BATCH_STATS or not model_loader or not model_loader.ready():
+        return
+    stats = load_batcher().stats()
+    with st.sidebar.expander("⚙️ Inference Queue"):
+        st.write(f"Queue depth: {stats['queue_depth']}")
+        st.write(f"Last batch size: {stats['last_batch_size']}")
+        st.write(f"Average batch size: {stats['avg_batch_size']:.2f}")
+        st.write(f"Batches run: {stats['batches']} ({stats['images']} images)")
+        if config.CASCADE:
+            cascade = load_model().stats()
+            st.write(f"Answered by first stage: {cascade['early_exits']}/{cascade['images']} "
+                     f"({cascade['early_exit_rate']:.0%})")
+        st.caption(f"max batch {stats['max_batch_size']}, max wait {stats['max_wait_ms']:.0f} ms")
+
+def metrics_panel():
+    user = st.session_state.user
+    if not user or user[2] not in config.ADMIN_EMAILS:
+        return
+    with st.sidebar.expander("📊 Performance"):
+        for row in metrics.summary():
+            if row['kind'] == 'counter':
+                st.write(f"{row['name']}: {row['value']}")
+            elif row['name'].startswith('agrodoc_image_bytes'):
+                st.write(f"{row['name']}: {row['count']} uploads, "
+                         f"p50 {row['p50'] / 1024:.0f} KB, p99 {row['p99'] / 1024:.0f} KB")
+            else:
+                st.write(f"{row['name']}: {row['count']} calls, p50 {row['p50'] * 1000:.1f} ms, "
+                         f"p95 {row['p95'] * 1000:.1f} ms, p99 {row['p99'] * 1000:.1f} ms")
+        st.caption(f"Percentiles over the last {metrics.REGISTRY.window} samples per series")
+
 # Notification System
 def dynamic_notifications():
     if st.session_state.user and not st.session_state.notification_shown:
         try:
-            c.execute('''SELECT show_notifications FROM users WHERE id = ?''', 
-                     (st.session_state.user[0],))
-            show_notifications = c.fetchone()[0]
+            show_notifications = db.fetchone('''SELECT show_notifications FROM users WHERE id = ?''', 
+                                             (st.session_state.user[0],))[0]
             
             if show_notifications:
                 notifications = get_active_notifications()
@@ -1144,9 +1270,9 @@ def dynamic_notifications():
                             </div>
                             """, unsafe_allow_html=True)
                         if st.button("Don't show these again"):
-                            c.execute('''UPDATE users SET show_notifications = 0 WHERE id = ?''',
-                                     (st.session_state.user[0],))
-                            conn.commit()
+                            with db.transaction() as conn:
+                                conn.execute('''UPDATE users SET show_notifications = 0 WHERE id = ?''',
+                                             (st.session_state.user[0],))
                             st.session_state.notification_shown = True
                             st.experimental_rerun()
         except Exception as e:
@@ -1185,50 +1311,79 @@ def home_page():
             st.write("Analyzing image... Please wait.")
 
 def process_image(uploaded_file):
-    os.makedirs('uploads', exist_ok=True)
+    start = time.perf_counter()
     
     try:
+        from preprocessing import load_image, model_input
+        
         st.session_state.latest_prediction = None
-        image = Image.open(uploaded_file)
-        img_array = np.array(image)
+        prediction_cache = load_prediction_cache()
+        metrics.IMAGE_BYTES.observe(uploaded_file.size)
+        # Decodes straight from the upload buffer, at reduced resolution for
+        # large JPEGs, instead of materialising the full-size photo
+        with metrics.DECODE_SECONDS.time():
+            image = load_image(uploaded_file)
+            image.load()
         
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"{timestamp}_{uploaded_file.name}"
-        file_path = os.path.join('uploads', filename)
-        image.save(file_path)
+        # The original bytes, not a re-encode of the reduced image
+        with metrics.SAVE_SECONDS.time():
+            file_path = save_upload(uploaded_file.getbuffer(), uploaded_file.name)
         
-        img = cv2.resize(img_array, (128, 128))
-        input_arr = tf.keras.preprocessing.image.img_to_array(img)
-        input_arr = np.array([input_arr])
+        # Written into this session thread's reusable input buffer, which
+        # stays valid until the thread preprocesses its next upload
+        with metrics.PREPROCESS_SECONDS.time():
+            input_arr = model_input(image)
         
-        with st.spinner('Analyzing plant health...'):
-            prediction = model.predict(input_arr)
-            time.sleep(1)
-            
-        confidence = np.max(prediction)
-        result_index = np.argmax(prediction)
-        disease = CLASS_NAMES[result_index]
+        # Re-uploads of the same picture skip the forward pass, and so do
+        # burst shots close to one of this user's recent uploads
+        user_id = st.session_state.user[0]
+        cache_key = input_key(input_arr) if prediction_cache else None
+        prediction = prediction_cache.get(cache_key) if prediction_cache else None
+        phash = dhash(image) if duplicate_index else None
+        near_duplicate = None
+        if prediction is None and duplicate_index:
+            near_duplicate = duplicate_index.find(user_id, phash)
+        
+        if near_duplicate:
+            metrics.cache_lookups('near_duplicate').inc()
+            disease, confidence = near_duplicate
+        else:
+            if prediction is None:
+                metrics.cache_lookups('miss').inc()
+                with st.spinner('Analyzing plant health...'):
+                    with metrics.INFERENCE_SECONDS.time():
+                        prediction = run_inference(input_arr, uploaded_file.getbuffer())
+                    if not config.LATENCY_MODE:
+                        time.sleep(1)
+                if prediction_cache:
+                    prediction_cache.put(cache_key, prediction)
+            else:
+                metrics.cache_lookups('hit').inc()
+            confidence = np.max(prediction)
+            result_index = np.argmax(prediction)
+            disease = CLASS_NAMES[result_index]
         
-        c.execute('''INSERT INTO predictions 
-                   (user_id, image_path, prediction, confidence) 
-                   VALUES (?, ?, ?, ?)''',
-                 (st.session_state.user[0], file_path, disease, float(confidence)))
-        conn.commit()
+        with metrics.db_seconds('insert_prediction').time():
+            save_prediction(user_id, file_path, disease, float(confidence), phash)
         
         st.session_state.latest_prediction = (image, disease, confidence)
         st.session_state.prediction_done = True
 
     except Exception as e:
+        metrics.PROCESS_ERRORS.inc()
         st.error(f"Error processing image: {str(e)}")
     finally:
+        metrics.PROCESS_SECONDS.observe(time.perf_counter() - start)
         st.session_state.processing = False
         st.experimental_rerun()
 
 def prediction_page():
     st.title("🔍 Prediction Results")
     
-    if 'current_page' not in st.session_state:
-        st.session_state.current_page = 0
+    if 'history_cursors' not in st.session_state:
+        # Start cursor of every page visited so far, for Previous
+        st.session_state.history_cursors = (None,)
+        st.session_state.history_next_cursor = None
     if 'selected_date' not in st.session_state:
         st.session_state.selected_date = None
 
@@ -1244,26 +1399,26 @@ def prediction_page():
     selected_date = st.date_input("Select a date to view historical predictions")
     
     if selected_date:
-        c.execute('''SELECT timestamp, prediction, confidence 
-                   FROM predictions 
-                   WHERE user_id = ? AND DATE(timestamp) = ?
-                   ORDER BY timestamp DESC''',
-                 (st.session_state.user[0], selected_date))
-        filtered_history = c.fetchall()
+        with metrics.db_seconds('history_by_date').time(), \
+                pending_predictions(st.session_state.user[0]) as pending:
+            filtered_history = predictions_on(db, st.session_state.user[0], selected_date, pending)
+            classes = class_summary(db, st.session_state.user[0], selected_date, pending)
         
         if filtered_history:
             st.subheader(f"Predictions for {selected_date}")
-            plot_history(filtered_history)
+            plot_class_summary(classes)
+            list_predictions(filtered_history)
         else:
             st.info(f"No predictions found for {selected_date}")
         return
 
     st.subheader("📈 Prediction History")
     
-    c.execute('''SELECT COUNT(*) FROM predictions 
-               WHERE user_id = ?''',
-             (st.session_state.user[0],))
-    total_predictions = c.fetchone()[0]
+    with metrics.db_seconds('history_count').time(), \
+            pending_predictions(st.session_state.user[0]) as pending:
+        total_predictions = count_predictions(db, st.session_state.user[0], pending)
+        days = daily_summary(db, st.session_state.user[0],
+                             datetime.date.today() - datetime.timedelta(days=HISTORY_CHART_DAYS - 1), pending)
     
     if total_predictions == 0:
         st.info("No prediction history found. Make your first prediction on the Home page!")
@@ -1272,26 +1427,26 @@ def prediction_page():
     items_per_page = 8
     total_pages = (total_predictions + items_per_page - 1) // items_per_page
     
+    cursors = st.session_state.history_cursors
     col1, col2, col3 = st.columns([2, 4, 2])
     with col1:
-        if st.button("Previous", disabled=st.session_state.current_page == 0):
-            st.session_state.current_page -= 1
+        if st.button("Previous", disabled=len(cursors) == 1):
+            cursors = st.session_state.history_cursors = cursors[:-1]
     with col3:
-        if st.button("Next", disabled=st.session_state.current_page >= total_pages-1):
-            st.session_state.current_page += 1
+        if st.button("Next", disabled=len(cursors) >= total_pages) and st.session_state.history_next_cursor:
+            cursors = st.session_state.history_cursors = cursors + (st.session_state.history_next_cursor,)
     with col2:
-        st.write(f"Page {st.session_state.current_page + 1} of {total_pages}")
+        st.write(f"Page {len(cursors)} of {total_pages}")
 
-    offset = st.session_state.current_page * items_per_page
-    c.execute('''SELECT timestamp, prediction, confidence 
-               FROM predictions WHERE user_id = ? 
-               ORDER BY timestamp DESC 
-               LIMIT ? OFFSET ?''',
-             (st.session_state.user[0], items_per_page, offset))
-    history = c.fetchall()
+    with metrics.db_seconds('history_page').time(), \
+            pending_predictions(st.session_state.user[0]) as pending:
+        history, st.session_state.history_next_cursor = history_page(
+            db, st.session_state.user[0], items_per_page, cursors[-1], pending=pending)
 
+    if days:
+        plot_daily_summary(days)
     if history:
-        plot_history(history)
+        list_predictions(history)
     else:
         st.info("No predictions found for this page")
 
@@ -1300,18 +1455,39 @@ def prediction_page():
         st.session_state.uploaded_file = None
         st.experimental_rerun()
 
-def plot_history(history):
-    dates = [row[0] for row in history]
-    confidences = [row[2] for row in history]
+# Days of daily totals drawn above the history pages
+HISTORY_CHART_DAYS = 30
+
+def plot_daily_summary(days):
+    import matplotlib.pyplot as plt
+    
+    dates = [row[0] for row in days]
     
     fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(dates, confidences, marker='o', color='#4CAF50')
+    ax.bar(dates, [row[1] for row in days], color='#4CAF50')
     ax.set_xlabel("Date", fontsize=10)
-    ax.set_ylabel("Confidence", fontsize=10)
-    ax.set_title("Prediction Confidence History", fontsize=12)
-    plt.xticks(rotation=45)
+    ax.set_ylabel("Predictions", fontsize=10)
+    confidence_ax = ax.twinx()
+    confidence_ax.plot(dates, [row[2] for row in days], marker='o', color='#FF9800')
+    confidence_ax.set_ylabel("Average confidence", fontsize=10)
+    confidence_ax.set_ylim(0, 1)
+    ax.set_title(f"Predictions per Day (last {HISTORY_CHART_DAYS} days)", fontsize=12)
+    plt.setp(ax.get_xticklabels(), rotation=45)
     st.pyplot(fig)
+
+def plot_class_summary(classes):
+    import matplotlib.pyplot as plt
     
+    fig, ax = plt.subplots(figsize=(10, max(2, 0.4 * len(classes))))
+    ax.barh([row[0] for row in classes], [row[1] for row in classes], color='#4CAF50')
+    ax.invert_yaxis()
+    for i, (_, count, confidence) in enumerate(classes):
+        ax.text(count, i, f" avg {confidence:.0%}", va='center', fontsize=9)
+    ax.set_xlabel("Predictions", fontsize=10)
+    ax.set_title("Predictions by Disease", fontsize=12)
+    st.pyplot(fig)
+
+def list_predictions(history):
     st.write("**Recent Predictions:**")
     for row in history:
         st.write(f"- {row[0][:10]}: {row[1]} ({row[2]:.2%})")
@@ -1346,19 +1522,18 @@ def review_page():
             submitted = st.form_submit_button("Submit Review")
             
             if submitted:
-                c.execute('''INSERT INTO reviews (user_id, rating, review)
-                          VALUES (?, ?, ?)''',
-                         (st.session_state.user[0], rating, review_text))
-                conn.commit()
+                with db.transaction() as conn:
+                    conn.execute('''INSERT INTO reviews (user_id, rating, review)
+                                 VALUES (?, ?, ?)''',
+                                 (st.session_state.user[0], rating, review_text))
                 st.success("Thank you for your review!")
     else:
         st.warning("Please login to submit a review")
     
     st.subheader("Recent Community Reviews")
-    c.execute('''SELECT users.name, reviews.rating, reviews.review, reviews.timestamp
-               FROM reviews JOIN users ON reviews.user_id = users.id
-               ORDER BY timestamp DESC LIMIT 10''')
-    user_reviews = c.fetchall()
+    user_reviews = db.fetchall('''SELECT users.name, reviews.rating, reviews.review, reviews.timestamp
+                                  FROM reviews JOIN users ON reviews.user_id = users.id
+                                  ORDER BY timestamp DESC LIMIT 10''')
     
     for name, rating, text, date in user_reviews:
         st.markdown(f"""
@@ -1563,10 +1738,11 @@ def account_page():
                 if st.button("Delete My Account", key="delete_account"):
                     try:
                         # Delete all user-related data
-                        c.execute('DELETE FROM users WHERE id = ?', (user_id,))
-                        c.execute('DELETE FROM predictions WHERE user_id = ?', (user_id,))
-                        c.execute('DELETE FROM reviews WHERE user_id = ?', (user_id,))
-                        conn.commit()
+                        with db.transaction() as conn:
+                            conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+                            conn.execute('DELETE FROM upload_hashes WHERE user_id = ?', (user_id,))
+                            conn.execute('DELETE FROM predictions WHERE user_id = ?', (user_id,))
+                            conn.execute('DELETE FROM reviews WHERE user_id = ?', (user_id,))
                         st.session_state.user = None
                         st.success("Account deleted successfully. Redirecting to home page...")
                         time.sleep(2)
@@ -1586,9 +1762,9 @@ def account_page():
                     if pbkdf2_sha256.verify(current_password, st.session_state.user[3]):
                         if new_password == confirm_password:
                             hashed_password = pbkdf2_sha256.hash(new_password)
-                            c.execute('UPDATE users SET password = ? WHERE id = ?', 
-                                     (hashed_password, user_id))
-                            conn.commit()
+                            with db.transaction() as conn:
+                                conn.execute('UPDATE users SET password = ? WHERE id = ?', 
+                                             (hashed_password, user_id))
                             st.success("Password updated successfully!")
                         else:
                             st.error("New passwords do not match!")
@@ -1600,9 +1776,9 @@ def account_page():
             with st.form("username_update"):
                 new_name = st.text_input("New Display Name", value=st.session_state.user[1])
                 if st.form_submit_button("Update Profile"):
-                    c.execute('UPDATE users SET name = ? WHERE id = ?', 
-                             (new_name, user_id))
-                    conn.commit()
+                    with db.transaction() as conn:
+                        conn.execute('UPDATE users SET name = ? WHERE id = ?', 
+                                     (new_name, user_id))
                     # Update session state
                     st.session_state.user = list(st.session_state.user)
                     st.session_state.user[1] = new_name
@@ -1639,9 +1815,9 @@ def account_page():
                         if time.time() > st.session_state.otp_expiry:
                             st.error("OTP has expired. Please request a new one.")
                         elif entered_otp == st.session_state.otp:
-                            c.execute('UPDATE users SET phone = ? WHERE id = ?',
-                                     (st.session_state.temp_phone, user_id))
-                            conn.commit()
+                            with db.transaction() as conn:
+                                conn.execute('UPDATE users SET phone = ? WHERE id = ?',
+                                             (st.session_state.temp_phone, user_id))
                             # Update session state
                             st.session_state.user = list(st.session_state.user)
                             st.session_state.user[4] = st.session_state.temp_phone
@@ -1652,14 +1828,14 @@ def account_page():
 
         # Preferences Section
         with st.expander("⚙️ Preferences", expanded=True):
-            c.execute('SELECT show_notifications FROM users WHERE id = ?', (user_id,))
-            show_notifications = c.fetchone()[0]
+            show_notifications = db.fetchone('SELECT show_notifications FROM users WHERE id = ?',
+                                             (user_id,))[0]
             
             notifications = st.checkbox("Show update notifications", value=show_notifications)
             if notifications != show_notifications:
-                c.execute('UPDATE users SET show_notifications = ? WHERE id = ?',
-                         (notifications, user_id))
-                conn.commit()
+                with db.transaction() as conn:
+                    conn.execute('UPDATE users SET show_notifications = ? WHERE id = ?',
+                                 (notifications, user_id))
                 st.success("Preferences updated!")
 
         # Logout Button
@@ -1705,6 +1881,9 @@ def login_register_tab():
 # Main app flow
 def main():
     show_navigation()
+    model_status()
+    batch_stats_panel()
+    metrics_panel()
     dynamic_notifications()
     
     if st.session_state.page == 'Home':
@@ -0,0 +1,190 @@
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# In-process counters and histograms for the Streamlit apps. Recording a
+# sample is a lock, a bisect and a deque append, cheap enough to leave on
+# for every request. The registry is rendered in Prometheus text format on
+# a local port and keeps a rolling window of recent samples per histogram
+# for the admin sidebar panel.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTE_BUCKETS = tuple(2 ** n for n in range(14, 26))  # 16 KB to 32 MB
+
+def _label_text(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+class Counter:
+    def __init__(self, labels):
+        self.labels = labels
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name):
+        return [f"{name}{_label_text(self.labels)} {self.value}"]
+
+class Histogram:
+    def __init__(self, labels, buckets, window):
+        self.labels = labels
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        # Most recent samples, for percentiles in the sidebar
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            self.recent.append(value)
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.recent), self.count, self.sum
+
+    def render(self, name):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines, cumulative = [], 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_label_text(self.labels, ('le', bound))} {cumulative}")
+        lines.append(f"{name}_bucket{_label_text(self.labels, ('le', '+Inf'))} {count}")
+        lines.append(f"{name}_sum{_label_text(self.labels)} {total}")
+        lines.append(f"{name}_count{_label_text(self.labels)} {count}")
+        return lines
+
+class Registry:
+    def __init__(self, window=1000):
+        self.window = window
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help_text, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            family = self._families.setdefault(name, (kind, help_text, {}))
+            if family[0] != kind:
+                raise ValueError(f"{name} is already registered as a {family[0]}")
+            series = family[2]
+            if key not in series:
+                series[key] = factory(key)
+            return series[key]
+
+    def counter(self, name, help_text, **labels):
+        return self._get('counter', name, help_text, labels, Counter)
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS, **labels):
+        return self._get('histogram', name, help_text, labels,
+                         lambda key: Histogram(key, buckets, self.window))
+
+    def families(self):
+        with self._lock:
+            return [(name, kind, help_text, list(series.items()))
+                    for name, (kind, help_text, series) in sorted(self._families.items())]
+
+    def render(self):
+        lines = []
+        for name, kind, help_text, series in self.families():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for _, metric in series:
+                lines.extend(metric.render(name))
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+def counter(name, help_text, **labels):
+    return REGISTRY.counter(name, help_text, **labels)
+
+def histogram(name, help_text, buckets=LATENCY_BUCKETS, **labels):
+    return REGISTRY.histogram(name, help_text, buckets, **labels)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(address, registry=REGISTRY):
+    """Serves GET /metrics from a daemon thread; returns None if the port is taken"""
+    host, port = address.rsplit(':', 1)
+    try:
+        server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    except OSError:
+        # Another app process on this host already exports its metrics here
+        return None
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, name='agrodoc-metrics', daemon=True).start()
+    return server
+
+def summary(registry=REGISTRY):
+    """One row per series for display: percentiles over the rolling window for histograms"""
+    rows = []
+    for name, kind, _, series in registry.families():
+        for labels, metric in series:
+            row = {'name': name + _label_text(labels), 'kind': kind}
+            if kind == 'counter':
+                row['value'] = metric.value
+            else:
+                recent, count, total = metric.snapshot()
+                row['count'] = count
+                row['mean'] = total / count if count else 0.0
+                for q in (50, 95, 99):
+                    row[f'p{q}'] = float(np.percentile(recent, q)) if recent else 0.0
+            rows.append(row)
+    return rows
+
+# Series recorded by the Streamlit apps
+PROCESS_SECONDS = histogram('agrodoc_process_image_seconds', "End-to-end time of process_image")
+DECODE_SECONDS = histogram('agrodoc_decode_seconds', "Opening and decoding an uploaded image")
+PREPROCESS_SECONDS = histogram('agrodoc_preprocess_seconds', "Resize and conversion to the model input")
+INFERENCE_SECONDS = histogram('agrodoc_inference_seconds', "Model scoring, including time queued for a batch")
+SAVE_SECONDS = histogram('agrodoc_save_upload_seconds', "Writing the upload to uploads/")
+LOAD_MODEL_SECONDS = histogram('agrodoc_load_model_seconds', "Time load_model() blocked waiting for the model")
+VERIFY_USER_SECONDS = histogram('agrodoc_verify_user_seconds', "Login check including password hashing")
+IMAGE_BYTES = histogram('agrodoc_image_bytes', "Size of uploaded images", BYTE_BUCKETS)
+PROCESS_ERRORS = counter('agrodoc_process_image_errors_total', "Uploads that failed with an exception")
+
+def db_seconds(query):
+    return histogram('agrodoc_db_seconds', "SQLite time by call site", query=query)
+
+def cache_lookups(result):
+    return counter('agrodoc_cache_lookups_total', "Prediction lookups by outcome", result=result)
+
+def logins(result):
+    return counter('agrodoc_logins_total', "Login attempts by outcome", result=result)
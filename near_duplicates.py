@@ -0,0 +1,192 @@
+import datetime
+import functools
+import itertools
+import sqlite3
+import threading
+from collections import deque
+
+from PIL import Image
+
+HASH_BITS = 64
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+# SQLite integers are signed 64-bit, the hashes are unsigned
+def to_signed(value):
+    return value - (1 << HASH_BITS) if value >= (1 << (HASH_BITS - 1)) else value
+
+def to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+class MultiIndexHash:
+    """Multi-index hashing for Hamming radius lookups over 64-bit hashes.
+
+    Each hash is split into `chunks` substrings with one dict per substring.
+    Any hash within distance r of the query agrees with it to within r // chunks
+    bits on at least one substring, so only those buckets need checking.
+    """
+
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._mask = (1 << self.chunk_bits) - 1
+        self._tables = [{} for _ in range(chunks)]
+        self._entries = []
+
+    @property
+    def size(self):
+        return len(self._entries)
+
+    def _chunk(self, key, index):
+        return (key >> (index * self.chunk_bits)) & self._mask
+
+    def _probes(self, chunk, radius):
+        yield chunk
+        for flips in range(1, radius + 1):
+            for bits in itertools.combinations(range(self.chunk_bits), flips):
+                value = chunk
+                for bit in bits:
+                    value ^= 1 << bit
+                yield value
+
+    def add(self, key, value):
+        position = len(self._entries)
+        self._entries.append((key, value))
+        for index, table in enumerate(self._tables):
+            table.setdefault(self._chunk(key, index), []).append(position)
+
+    def search(self, key, max_distance):
+        """Returns (distance, value) pairs within max_distance of key"""
+        radius = max_distance // self.chunks
+        seen = set()
+        results = []
+        for index, table in enumerate(self._tables):
+            for probe in self._probes(self._chunk(key, index), radius):
+                for position in table.get(probe, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+                    stored, value = self._entries[position]
+                    distance = hamming(key, stored)
+                    if distance <= max_distance:
+                        results.append((distance, value))
+        return results
+
+class _RecentHashes:
+    """One user's hashes, oldest first, with a MultiIndexHash over them"""
+
+    def __init__(self):
+        self.entries = deque()
+        self.index = MultiIndexHash()
+        self.stale = 0
+
+    def add(self, created, phash, disease, confidence):
+        self.entries.append((created, phash, disease, confidence))
+        self.index.add(phash, (created, disease, confidence))
+
+    def expire(self, since):
+        while self.entries and self.entries[0][0] < since:
+            self.entries.popleft()
+            self.stale += 1
+        # The tables keep expired positions until rebuilt; rebuild once they
+        # outnumber the live ones, so each entry is copied O(1) times
+        if self.stale > len(self.entries):
+            self.index = MultiIndexHash()
+            for created, phash, disease, confidence in self.entries:
+                self.index.add(phash, (created, disease, confidence))
+            self.stale = 0
+
+class DuplicateIndex:
+    """Per-user multi-index hash tables over the last window_hours of upload_hashes.
+
+    A user's expired hashes are dropped whenever that user uploads or looks
+    one up, and every user is swept a few times per window, so memory and
+    lookup cost track the uploads inside the window rather than uptime.
+    """
+
+    def __init__(self, db_path, max_distance=6, window_hours=24):
+        self.max_distance = max_distance
+        self.window = datetime.timedelta(hours=window_hours)
+        self._users = {}
+        self._lock = threading.Lock()
+        self._next_sweep = datetime.datetime.utcnow() + self.window / 4
+        self._load(db_path)
+
+    @property
+    def size(self):
+        with self._lock:
+            return sum(len(user.entries) for user in self._users.values())
+
+    def _load(self, db_path):
+        since = (datetime.datetime.utcnow() - self.window).strftime('%Y-%m-%d %H:%M:%S')
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute('''SELECT h.user_id, h.phash, p.prediction, p.confidence, h.created_at
+                                   FROM upload_hashes h JOIN predictions p ON p.id = h.prediction_id
+                                   WHERE h.created_at >= ?
+                                   ORDER BY h.created_at, h.id''', (since,)).fetchall()
+        finally:
+            conn.close()
+        for user_id, phash, disease, confidence, created_at in rows:
+            created = datetime.datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
+            self._users.setdefault(user_id, _RecentHashes()).add(created, to_unsigned(phash), disease, confidence)
+
+    def _expire(self, now):
+        """Ages out hashes older than the window; call with the lock held"""
+        since = now - self.window
+        if now >= self._next_sweep:
+            for user_id in list(self._users):
+                user = self._users[user_id]
+                user.expire(since)
+                if not user.entries:
+                    del self._users[user_id]
+            self._next_sweep = now + self.window / 4
+        return since
+
+    def find(self, user_id, phash):
+        """Closest recent (disease, confidence) for this user, or None"""
+        with self._lock:
+            since = self._expire(datetime.datetime.utcnow())
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            user.expire(since)
+            matches = [(distance, -created.timestamp(), disease, confidence)
+                       for distance, (created, disease, confidence) in user.index.search(phash, self.max_distance)
+                       if created >= since]
+        if not matches:
+            return None
+        _, _, disease, confidence = min(matches)
+        return disease, confidence
+
+    def add(self, cursor, user_id, phash, prediction_id, disease, confidence):
+        """Records a scored upload's hash; the caller commits with its prediction row.
+
+        Returns a function that adds the hash to the in-memory index. Call it
+        once the transaction has committed, so lookups are never answered
+        from a prediction that was rolled back.
+        """
+        created = datetime.datetime.utcnow().replace(microsecond=0)
+        cursor.execute('''INSERT INTO upload_hashes (user_id, prediction_id, phash, created_at)
+                          VALUES (?, ?, ?, ?)''',
+                       (user_id, prediction_id, to_signed(phash), created.strftime('%Y-%m-%d %H:%M:%S')))
+        return functools.partial(self._remember, user_id, created, phash, disease, confidence)
+
+    def _remember(self, user_id, created, phash, disease, confidence):
+        with self._lock:
+            since = self._expire(created)
+            user = self._users.setdefault(user_id, _RecentHashes())
+            user.expire(since)
+            user.add(created, phash, disease, confidence)
@@ -0,0 +1,58 @@
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+from backends import load_backend
+from preprocessing import load_image, to_model_input
+
+def compare_backends(reference, candidate, image_paths, tolerance=1e-3):
+    """Runs both backends over the images and lists per-image top-1 and confidence"""
+    rows = []
+    for path in image_paths:
+        input_arr = to_model_input(load_image(path))
+        ref = reference.predict(input_arr)[0]
+        cand = candidate.predict(input_arr)[0]
+        ref_index, cand_index = int(np.argmax(ref)), int(np.argmax(cand))
+        delta = abs(float(ref[ref_index]) - float(cand[cand_index]))
+        rows.append({
+            'image': os.path.basename(path),
+            'reference_class': ref_index,
+            'candidate_class': cand_index,
+            'reference_confidence': float(ref[ref_index]),
+            'candidate_confidence': float(cand[cand_index]),
+            'ok': ref_index == cand_index and delta <= tolerance,
+        })
+    return rows
+
+def print_report(rows, reference_name, candidate_name):
+    print(f"{'image':<28} {reference_name:>14} {candidate_name:>14}  status")
+    for row in rows:
+        ref = f"{row['reference_class']}@{row['reference_confidence']:.4f}"
+        cand = f"{row['candidate_class']}@{row['candidate_confidence']:.4f}"
+        print(f"{row['image']:<28} {ref:>14} {cand:>14}  {'ok' if row['ok'] else 'MISMATCH'}")
+    passed = sum(row['ok'] for row in rows)
+    print(f"{passed}/{len(rows)} images match")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that an inference backend agrees with Keras")
+    parser.add_argument('--backend', default='tflite', help="Backend to compare against keras")
+    parser.add_argument('--images', default='test/test/*.JPG', help="Glob of images to score")
+    parser.add_argument('--tolerance', type=float, default=1e-3,
+                        help="Largest allowed difference in top-1 confidence")
+    args = parser.parse_args()
+
+    image_paths = sorted(glob.glob(args.images))
+    if not image_paths:
+        sys.exit(f"No images match {args.images}")
+
+    rows = compare_backends(load_backend('keras'), load_backend(args.backend),
+                            image_paths, args.tolerance)
+    print_report(rows, 'keras', args.backend)
+    if not all(row['ok'] for row in rows):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import time
+
+import numpy as np
+
+# Small timing helpers shared by the model tools and benchmarks
+
+def time_calls(fn, runs=100, warmup=5):
+    """Calls fn() repeatedly and returns the per-call latencies in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return samples
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        'runs': int(samples.size),
+        'mean_ms': float(samples.mean()),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+    }
@@ -0,0 +1,103 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from database import CACHE_MIGRATIONS, migrate
+
+# Rough per-entry bookkeeping cost on top of the key and the softmax row
+_ENTRY_OVERHEAD = 128
+
+def input_key(input_arr):
+    """Content hash of the preprocessed (1,128,128,3) model input"""
+    arr = np.ascontiguousarray(input_arr, dtype=np.float32)
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(str(arr.shape).encode())
+    digest.update(arr.data)
+    return digest.hexdigest()
+
+def model_fingerprint(*model_paths, settings=''):
+    """Hash of the model files, plus any settings that change their outputs"""
+    digest = hashlib.sha256()
+    for model_path in model_paths:
+        with open(model_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    digest.update(settings.encode())
+    return digest.hexdigest()
+
+class PredictionCache:
+    """Two-tier cache of softmax outputs: byte-bounded in-memory LRU over SQLite"""
+
+    def __init__(self, db_path, model_hash, max_bytes=64 * 1024 * 1024):
+        self.model_hash = model_hash
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        migrate(db_path, CACHE_MIGRATIONS)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Entries computed by any other model file are stale
+        self._conn.execute('DELETE FROM prediction_cache WHERE model_hash != ?', (model_hash,))
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            probabilities = self._entries.get(key)
+            if probabilities is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return probabilities
+
+            row = self._conn.execute('''SELECT probabilities FROM prediction_cache
+                                        WHERE input_hash = ? AND model_hash = ?''',
+                                     (key, self.model_hash)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            probabilities = np.frombuffer(row[0], dtype=np.float32).reshape(1, -1)
+            self._remember(key, probabilities)
+            self.hits += 1
+            return probabilities
+
+    def put(self, key, probabilities):
+        probabilities = np.asarray(probabilities, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self._remember(key, probabilities)
+            self._conn.execute('''INSERT OR REPLACE INTO prediction_cache
+                                  (input_hash, model_hash, probabilities) VALUES (?, ?, ?)''',
+                               (key, self.model_hash, probabilities.tobytes()))
+            self._conn.commit()
+
+    def _remember(self, key, probabilities):
+        # An own copy: a row view would keep the caller's whole batch output
+        # alive while only the row is counted against max_bytes
+        probabilities = probabilities.copy()
+        if key in self._entries:
+            self._bytes -= self._entry_size(key, self._entries.pop(key))
+        self._entries[key] = probabilities
+        self._bytes += self._entry_size(key, probabilities)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, old_value = self._entries.popitem(last=False)
+            self._bytes -= self._entry_size(old_key, old_value)
+
+    @staticmethod
+    def _entry_size(key, probabilities):
+        return len(key) + probabilities.nbytes + _ENTRY_OVERHEAD
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+def open_prediction_cache(db_path, model_paths, max_bytes, settings=''):
+    return PredictionCache(db_path, model_fingerprint(*model_paths, settings=settings), max_bytes)
@@ -0,0 +1,67 @@
+import threading
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Single home for the model's input convention, shared by main.py, app.py
+# and the offline tools: 128x128 RGB with raw 0-255 float32 pixel values,
+# no scaling and no channel swap, matching how the model was trained
+IMAGE_SIZE = (128, 128)
+INPUT_SHAPE = (IMAGE_SIZE[1], IMAGE_SIZE[0], 3)
+
+# JPEGs are decoded in the DCT domain at the smallest 1/2, 1/4 or 1/8 scale
+# that is still at least this large. Keeping twice the model size means the
+# 256x256 photos the model was trained on decode at full size, exactly as
+# before, while a 48 MP phone photo decodes at about 1000x750
+DRAFT_SIZE = (2 * IMAGE_SIZE[0], 2 * IMAGE_SIZE[1])
+
+_local = threading.local()
+
+def load_image(source, draft=True):
+    """Opens an upload, path or file object as an RGB PIL image.
+
+    File objects (including Streamlit uploads) are read in place rather than
+    copied. With draft, JPEGs are decoded at reduced resolution; other
+    formats are unaffected.
+    """
+    image = Image.open(source)
+    if draft:
+        image.draft('RGB', DRAFT_SIZE)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
+
+def input_buffer(batch_size=1):
+    """This thread's preallocated (batch_size,128,128,3) float32 buffer.
+
+    Each thread keeps one buffer, grown to the largest batch it has asked
+    for. Its contents are overwritten by the next call on the same thread,
+    so callers must be done with the previous input first.
+    """
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < batch_size:
+        buffer = _local.buffer = np.empty((batch_size,) + INPUT_SHAPE, dtype=np.float32)
+    return buffer[:batch_size]
+
+def write_model_input(image, out):
+    """Resizes an RGB image into out, a (128,128,3) float32 array"""
+    resized = getattr(_local, 'resized', None)
+    if resized is None:
+        resized = _local.resized = np.empty(INPUT_SHAPE, dtype=np.uint8)
+    cv2.resize(np.asarray(image), IMAGE_SIZE, dst=resized)
+    np.copyto(out, resized)
+    return out
+
+def model_input(*images):
+    """Preprocesses images into this thread's reusable buffer, see input_buffer"""
+    batch = input_buffer(len(images))
+    for row, image in zip(batch, images):
+        write_model_input(image, row)
+    return batch
+
+def to_model_input(image):
+    """Returns a newly allocated (1,128,128,3) batch the caller may keep"""
+    input_arr = np.empty((1,) + INPUT_SHAPE, dtype=np.float32)
+    write_model_input(image, input_arr[0])
+    return input_arr
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+import config
+from backends import KerasBackend
+from compact_models import accuracy, count_flops, labelled_dataset
+from quantize import single_image_latency
+
+# Structured pruning for the Sequential CNN from TrainModel.ipynb. Whole
+# conv filters and Dense units are removed, ranked by weight magnitude or
+# by mean activation on calibration images, and the surviving weights are
+# copied into a new, physically smaller model that is briefly fine-tuned.
+# The input channels and the 38-way output layer are never pruned.
+
+PASSTHROUGH = (layers.MaxPooling2D, layers.Dropout)
+
+def _prunable(model):
+    """Conv2D and hidden Dense layers, everything but the output layer"""
+    return [layer for layer in model.layers[:-1] if isinstance(layer, (layers.Conv2D, layers.Dense))]
+
+def magnitude_scores(model):
+    """L1 norm of each output unit's incoming weights"""
+    scores = {}
+    for layer in _prunable(model):
+        kernel = layer.get_weights()[0]
+        scores[layer.name] = np.abs(kernel).reshape(-1, kernel.shape[-1]).sum(axis=0)
+    return scores
+
+def activation_scores(model, calibration_set, batches):
+    """Mean post-ReLU activation of each output unit over the calibration images"""
+    prunable = _prunable(model)
+    probe = tf.keras.Model(model.inputs, [layer.output for layer in prunable])
+    totals = [np.zeros(layer.get_weights()[0].shape[-1]) for layer in prunable]
+    count = 0
+    for images, _ in calibration_set.take(batches):
+        for i, output in enumerate(probe(images, training=False)):
+            totals[i] += output.numpy().reshape(-1, output.shape[-1]).sum(axis=0)
+        count += len(images)
+    return {layer.name: total / count for layer, total in zip(prunable, totals)}
+
+def _keep(scores, fraction, units=None):
+    """Indices of the highest-scoring units, in their original order"""
+    n = units or max(1, int(round(len(scores) * (1 - fraction))))
+    return np.sort(np.argsort(scores)[::-1][:n])
+
+def prune_model(model, scores, fraction, head_units=None):
+    """Returns a new Sequential model with the lowest-scoring filters and units removed"""
+    if not isinstance(model, tf.keras.Sequential):
+        raise ValueError("Only Sequential models like the one in TrainModel.ipynb are supported")
+    output_layer = model.layers[-1]
+    new_layers, weights = [], []
+    input_shape = tuple(model.inputs[0].shape[1:])
+    keep = np.arange(input_shape[-1])  # Kept channels of the previous layer's output
+    flatten_shape = None
+    for layer in model.layers:
+        layer_config = layer.get_config()
+        layer_config.pop('batch_input_shape', None)
+        kernel_bias = layer.get_weights()
+        if isinstance(layer, layers.Conv2D):
+            out_keep = _keep(scores[layer.name], fraction)
+            layer_config['filters'] = len(out_keep)
+            kernel, bias = kernel_bias
+            weights.append([kernel[:, :, keep][:, :, :, out_keep], bias[out_keep]])
+            keep = out_keep
+        elif isinstance(layer, layers.Dense):
+            kernel, bias = kernel_bias
+            if flatten_shape is not None:
+                # Flatten lays out (h, w, c) row-major, so a kept channel c
+                # maps to rows p*C + c for every spatial position p
+                positions, channels = flatten_shape
+                rows = (np.arange(positions)[:, None] * channels + keep[None, :]).ravel()
+                flatten_shape = None
+            else:
+                rows = keep
+            if layer is output_layer:
+                out_keep = np.arange(kernel.shape[1])
+            else:
+                out_keep = _keep(scores[layer.name], fraction, head_units)
+                layer_config['units'] = len(out_keep)
+            weights.append([kernel[rows][:, out_keep], bias[out_keep]])
+            keep = out_keep
+        elif isinstance(layer, layers.Flatten):
+            height, width, channels = layer.input.shape[1:]
+            flatten_shape = (height * width, channels)
+            weights.append([])
+        elif isinstance(layer, PASSTHROUGH):
+            weights.append([])
+        else:
+            raise ValueError(f"Don't know how to prune {layer.__class__.__name__} layer {layer.name}")
+        new_layers.append(layer.__class__.from_config(layer_config))
+
+    pruned = tf.keras.Sequential([tf.keras.Input(input_shape)] + new_layers,
+                                 name=f"{model.name}_pruned")
+    for layer, layer_weights in zip(pruned.layers, weights):
+        if layer_weights:
+            layer.set_weights(layer_weights)
+    return pruned
+
+def measure(model, path, validation_set, runs):
+    backend = KerasBackend(path, compiled=True, warmup=True)
+    return {
+        'model': path,
+        'params': int(model.count_params()),
+        'flops': int(count_flops(model)),
+        'p50_latency_ms': single_image_latency(backend, runs)['p50_ms'],
+        'validation_accuracy': accuracy(backend.predict, validation_set),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Structured pruning and head slimming of Trained_Model.h5")
+    parser.add_argument('--model', default=config.MODEL_PATH)
+    parser.add_argument('--train-dir', default='train')
+    parser.add_argument('--valid-dir', default='valid')
+    parser.add_argument('--output-dir', default='pruned')
+    parser.add_argument('--levels', type=float, nargs='+', default=[0.25, 0.5, 0.625],
+                        help="Fraction of filters and units removed from every prunable layer")
+    parser.add_argument('--head-units', type=int,
+                        help="Width of the slimmed Dense head, overriding the level for that layer")
+    parser.add_argument('--criterion', choices=['magnitude', 'activation'], default='magnitude')
+    parser.add_argument('--calibration-batches', type=int, default=20,
+                        help="Training batches used for activation statistics")
+    parser.add_argument('--epochs', type=int, default=2, help="Fine-tuning epochs per level")
+    parser.add_argument('--learning-rate', type=float, default=1e-4)
+    parser.add_argument('--runs', type=int, default=200, help="Timed single-image predictions per model")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    training_set = labelled_dataset(args.train_dir)
+    validation_set = labelled_dataset(args.valid_dir, shuffle=False)
+    model = tf.keras.models.load_model(args.model)
+    if args.criterion == 'activation':
+        scores = activation_scores(model, training_set, args.calibration_batches)
+    else:
+        scores = magnitude_scores(model)
+
+    report = {'original': measure(model, args.model, validation_set, args.runs)}
+    base = report['original']
+    for level in args.levels:
+        name = f"{os.path.splitext(os.path.basename(args.model))[0]}.pruned-{level:g}"
+        print(f"Pruning {level:.0%} of filters and units")
+        pruned = prune_model(model, scores, level, args.head_units)
+        pruned.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+                       loss='categorical_crossentropy', metrics=['accuracy'])
+        if args.epochs:
+            pruned.fit(training_set, validation_data=validation_set, epochs=args.epochs)
+        path = os.path.join(args.output_dir, f"{name}.h5")
+        pruned.save(path)
+        row = measure(pruned, path, validation_set, args.runs)
+        row['speedup'] = base['p50_latency_ms'] / row['p50_latency_ms']
+        row['accuracy_delta'] = row['validation_accuracy'] - base['validation_accuracy']
+        report[f"{level:g}"] = row
+
+    with open(os.path.join(args.output_dir, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n{'level':<9} {'params':>12} {'MFLOPs':>9} {'p50 ms':>8} {'speedup':>8} {'val acc':>8} {'delta':>8}")
+    for level, row in report.items():
+        print(f"{level:<9} {row['params']:>12,} {row['flops'] / 1e6:>9.1f} {row['p50_latency_ms']:>8.2f} "
+              f"{row.get('speedup', 1.0):>7.2f}x {row['validation_accuracy']:>8.2%} "
+              f"{row.get('accuracy_delta', 0.0):>+8.2%}")
+
+if __name__ == '__main__':
+    main()
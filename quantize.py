@@ -0,0 +1,93 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+import config
+from backends import KerasBackend, TFLiteBackend
+from perf import summarize, time_calls
+
+def image_dataset(directory, batch_size, shuffle):
+    # Same loader and resize settings as TrainModel.ipynb
+    return tf.keras.utils.image_dataset_from_directory(
+        directory,
+        labels=None,
+        color_mode="rgb",
+        batch_size=batch_size,
+        image_size=(128, 128),
+        shuffle=shuffle,
+        seed=42,
+        interpolation="bilinear",
+    )
+
+def quantize_int8(model, calibration_dir, num_samples):
+    """Full-integer post-training quantization with uint8 input and output"""
+    calibration_set = image_dataset(calibration_dir, batch_size=1, shuffle=True)
+
+    def representative_dataset():
+        for images in calibration_set.take(num_samples):
+            yield [tf.cast(images, tf.float32)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+def top1_agreement(reference, candidate, heldout_dir, batch_size=32):
+    matches = total = 0
+    for images in image_dataset(heldout_dir, batch_size=batch_size, shuffle=False):
+        images = images.numpy()
+        ref = np.argmax(reference.predict(images), axis=1)
+        cand = np.argmax(candidate.predict(images), axis=1)
+        matches += int(np.sum(ref == cand))
+        total += len(images)
+    return matches / total if total else 0.0
+
+def single_image_latency(backend, runs):
+    sample = np.random.default_rng(0).uniform(0, 255, (1, 128, 128, 3)).astype(np.float32)
+    return summarize(time_calls(lambda: backend.predict(sample), runs=runs))
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-training int8 quantization with an accuracy guard")
+    parser.add_argument('--model', default=config.MODEL_PATH, help="Float Keras H5 model")
+    parser.add_argument('--calibration-dir', required=True,
+                        help="Representative images, one sub-folder per class like 'train'")
+    parser.add_argument('--heldout-dir', required=True,
+                        help="Held-out images used for the agreement check, e.g. 'valid'")
+    parser.add_argument('--output', default=config.TFLITE_INT8_MODEL_PATH, help="Where to publish the int8 model")
+    parser.add_argument('--num-calibration', type=int, default=500, help="Calibration images to use")
+    parser.add_argument('--min-agreement', type=float, default=0.98,
+                        help="Lowest top-1 agreement with the float model that may be published")
+    parser.add_argument('--runs', type=int, default=200, help="Timed single-image predictions per model")
+    args = parser.parse_args()
+
+    float_backend = KerasBackend(args.model, compiled=True, warmup=True)
+    candidate_path = args.output + '.candidate'
+    with open(candidate_path, 'wb') as f:
+        f.write(quantize_int8(float_backend.model, args.calibration_dir, args.num_calibration))
+    int8_backend = TFLiteBackend(candidate_path, num_threads=config.TFLITE_THREADS)
+
+    agreement = top1_agreement(float_backend, int8_backend, args.heldout_dir)
+    float_latency = single_image_latency(float_backend, args.runs)
+    int8_latency = single_image_latency(int8_backend, args.runs)
+
+    print(f"{'':<18} {'float32':>12} {'int8':>12}")
+    print(f"{'size (MB)':<18} {os.path.getsize(args.model) / 1e6:>12.2f} "
+          f"{os.path.getsize(candidate_path) / 1e6:>12.2f}")
+    print(f"{'p50 latency (ms)':<18} {float_latency['p50_ms']:>12.2f} {int8_latency['p50_ms']:>12.2f}")
+    print(f"{'p99 latency (ms)':<18} {float_latency['p99_ms']:>12.2f} {int8_latency['p99_ms']:>12.2f}")
+    print(f"{'top-1 agreement':<18} {1.0:>12.2%} {agreement:>12.2%}")
+
+    if agreement < args.min_agreement:
+        os.remove(candidate_path)
+        sys.exit(f"Refusing to publish: agreement {agreement:.2%} is below {args.min_agreement:.2%}")
+    os.replace(candidate_path, args.output)
+    print(f"Published {args.output}")
+
+if __name__ == '__main__':
+    main()
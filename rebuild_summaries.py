@@ -0,0 +1,92 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+from database import DB_PATH, init_db, rebuild_summaries
+
+# Recomputes the per-user prediction totals and daily per-class counts from
+# the predictions table. The migration that creates them backfills them once;
+# run this after restoring a backup, bulk-editing rows with triggers
+# disabled, or to check the incremental counts against a full recount.
+
+# (table, key columns, recount from predictions)
+SUMMARIES = [
+    ('user_prediction_totals', ('user_id',),
+     '''SELECT user_id, COUNT(*), SUM(confidence) FROM predictions WHERE user_id IS NOT NULL
+        GROUP BY user_id ORDER BY user_id'''),
+    ('user_daily_predictions', ('user_id', 'day', 'prediction'),
+     '''SELECT user_id, substr(timestamp, 1, 10) AS day, prediction, COUNT(*), SUM(confidence)
+        FROM predictions WHERE user_id IS NOT NULL
+        GROUP BY user_id, day, prediction ORDER BY user_id, day, prediction'''),
+]
+
+def _sort_key(row, width):
+    # SQLite orders NULL before any value; Python can't compare None
+    return tuple((value is not None, value) for value in row[:width])
+
+def _stale_users(stored, recounted, width, tolerance):
+    """Merges two key-ordered row streams, yielding the user_id of every
+    row that is missing on either side or whose count or sum differs"""
+    stored_row, recounted_row = next(stored, None), next(recounted, None)
+    while stored_row is not None or recounted_row is not None:
+        if recounted_row is None or (stored_row is not None and
+                                     _sort_key(stored_row, width) < _sort_key(recounted_row, width)):
+            yield stored_row[0]
+            stored_row = next(stored, None)
+        elif stored_row is None or _sort_key(recounted_row, width) < _sort_key(stored_row, width):
+            yield recounted_row[0]
+            recounted_row = next(recounted, None)
+        else:
+            (count, total), (recount, retotal) = stored_row[width:], recounted_row[width:]
+            if count != recount or abs(total - retotal) > tolerance * max(1.0, abs(retotal)):
+                yield stored_row[0]
+            stored_row, recounted_row = next(stored, None), next(recounted, None)
+
+def check(conn, tolerance=1e-6):
+    """{table: (stale rows, users affected)} against a recount of predictions.
+
+    Every row of both tables is compared on its key, its count and its
+    confidence sum. Sums are added up in a different order than a recount
+    adds them, so they only need to agree to a relative tolerance.
+    """
+    report = {}
+    for table, keys, recount in SUMMARIES:
+        # Both sides come back in key order (the stored side from its
+        # primary key), so one merge pass compares them
+        columns = ', '.join(keys)
+        stored = conn.execute(f'SELECT {columns}, predictions, confidence_sum FROM {table} ORDER BY {columns}')
+        stale = list(_stale_users(stored, conn.execute(recount), len(keys), tolerance))
+        report[table] = (len(stale), len(set(stale)))
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the prediction summary tables")
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--check', action='store_true',
+                        help="Report summary rows that differ from a recount, without rebuilding; "
+                             "exits 1 if any do")
+    parser.add_argument('--tolerance', type=float, default=1e-6,
+                        help="Relative difference allowed between confidence sums")
+    args = parser.parse_args()
+
+    init_db(args.db)
+    conn = sqlite3.connect(args.db)
+    if args.check:
+        report = check(conn, args.tolerance)
+        conn.close()
+        for table, (rows, users) in report.items():
+            print(f"{table}: {rows} stale rows across {users} users")
+        sys.exit(1 if any(rows for rows, _ in report.values()) else 0)
+
+    start = time.perf_counter()
+    with conn:
+        rebuild_summaries(conn)
+    users = conn.execute('SELECT COUNT(*) FROM user_prediction_totals').fetchone()[0]
+    days = conn.execute('SELECT COUNT(*) FROM user_daily_predictions').fetchone()[0]
+    conn.close()
+    print(f"Rebuilt totals for {users} users and {days} user/day/class rows "
+          f"in {time.perf_counter() - start:.1f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+from backends import load_backend
+from class_names import CLASS_NAMES
+from preprocessing import IMAGE_SIZE, load_image, to_model_input
+
+# Bulk scorer for image folders. Paths are enumerated lazily in a stable
+# order, decoded on a thread pool with bounded prefetch and scored in
+# fixed-size batches. Results are streamed to CSV/JSONL and a checkpoint
+# written after every batch lets an interrupted run resume where it stopped.
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def walk_images(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+def read_paths(stream):
+    for line in stream:
+        path = line.strip()
+        if path:
+            yield path
+
+def decode(path):
+    start = time.perf_counter()
+    try:
+        input_arr, error = to_model_input(load_image(path)), None
+    except Exception as e:
+        input_arr, error = None, str(e)
+    return path, input_arr, error, time.perf_counter() - start
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class ResultWriter:
+    """Appends rows to CSV or JSONL and records how far the output is durable"""
+
+    def __init__(self, path, fmt, offset):
+        exists = os.path.exists(path)
+        self.file = open(path, 'a+', newline='')
+        # Drop anything written after the last checkpoint (all of it when
+        # starting over)
+        self.file.truncate(offset if exists else 0)
+        self.file.seek(0, os.SEEK_END)
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.csv = csv.writer(self.file)
+            if self.file.tell() == 0:
+                self.csv.writerow(['path', 'prediction', 'confidence', 'error'])
+
+    def write(self, path, prediction, confidence, error):
+        if self.fmt == 'csv':
+            self.csv.writerow([path, prediction or '', '' if confidence is None else f"{confidence:.6f}", error or ''])
+        else:
+            self.file.write(json.dumps({'path': path, 'prediction': prediction,
+                                        'confidence': confidence, 'error': error}) + '\n')
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+def load_checkpoint(path, batch_size):
+    if not os.path.exists(path):
+        return {'batches_done': 0, 'output_offset': 0}
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['batch_size'] != batch_size:
+        sys.exit(f"{path} was written with --batch-size {checkpoint['batch_size']}")
+    return checkpoint
+
+def save_checkpoint(path, batches_done, batch_size, output_offset):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'batches_done': batches_done, 'batch_size': batch_size,
+                   'output_offset': output_offset}, f)
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Score every image under a directory tree")
+    parser.add_argument('source', help="Directory to walk, or '-' to read image paths from stdin")
+    parser.add_argument('--output', required=True, help="Results file (.csv or .jsonl)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the output extension")
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 4, help="Decode threads")
+    parser.add_argument('--prefetch', type=int, default=2, help="Batches decoded ahead of the model")
+    parser.add_argument('--backend', default=config.BACKEND)
+    parser.add_argument('--force', action='store_true',
+                        help="Overwrite an existing output file and ignore any checkpoint")
+    args = parser.parse_args()
+
+    fmt = args.format or ('jsonl' if args.output.endswith('.jsonl') else 'csv')
+    checkpoint_path = args.output + '.progress'
+    if args.force:
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    elif os.path.exists(args.output) and not os.path.exists(checkpoint_path):
+        # A finished run, or a file this tool did not write
+        sys.exit(f"{args.output} exists and has no checkpoint to resume from; "
+                 "pass --force to overwrite it")
+    checkpoint = load_checkpoint(checkpoint_path, args.batch_size)
+    batches_done = checkpoint['batches_done']
+
+    paths = read_paths(sys.stdin) if args.source == '-' else walk_images(args.source)
+    batches = batched(itertools.islice(paths, batches_done * args.batch_size, None), args.batch_size)
+
+    backend = load_backend(args.backend)
+    writer = ResultWriter(args.output, fmt, checkpoint['output_offset'])
+    padded = np.zeros((args.batch_size, IMAGE_SIZE[1], IMAGE_SIZE[0], 3), dtype=np.float32)
+    decode_seconds = infer_seconds = write_seconds = 0.0
+    scored = 0
+    if batches_done:
+        print(f"Resuming after {batches_done} completed batches", file=sys.stderr)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        pending = deque()
+
+        def fill():
+            while len(pending) < args.prefetch:
+                batch = next(batches, None)
+                if batch is None:
+                    return
+                pending.append([pool.submit(decode, path) for path in batch])
+
+        fill()
+        while pending:
+            results = [future.result() for future in pending.popleft()]
+            fill()
+
+            ok = [(path, arr) for path, arr, error, _ in results if error is None]
+            decode_seconds += sum(seconds for *_, seconds in results)
+
+            t0 = time.perf_counter()
+            rows = {}
+            if ok:
+                # Always feed the same batch shape so the model never
+                # re-plans; rows past len(ok) are leftovers and ignored
+                for i, (_, arr) in enumerate(ok):
+                    padded[i] = arr[0]
+                probabilities = backend.predict(padded)[:len(ok)]
+                for (path, _), row in zip(ok, probabilities):
+                    index = int(np.argmax(row))
+                    rows[path] = (CLASS_NAMES[index], float(row[index]))
+            t1 = time.perf_counter()
+            infer_seconds += t1 - t0
+
+            for path, _, error, _ in results:
+                prediction, confidence = rows.get(path, (None, None))
+                writer.write(path, prediction, confidence, error)
+            batches_done += 1
+            save_checkpoint(checkpoint_path, batches_done, args.batch_size, writer.sync())
+            write_seconds += time.perf_counter() - t1
+            scored += len(results)
+
+    writer.close()
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scored} images in {elapsed:.2f}s ({scored / elapsed if elapsed else 0:.1f} images/sec)",
+          file=sys.stderr)
+    print(f"decode {decode_seconds:.2f}s (thread time across {args.threads} threads), "
+          f"inference {infer_seconds:.2f}s, write {write_seconds:.2f}s", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+import contextlib
+import io
+import zipfile
+
+import pytest
+
+from batch_api import _multipart_parts, extract_images
+
+BOUNDARY = 'formBoundary42'
+
+def multipart(files):
+    body = b'preamble\r\n'
+    for name, data in files:
+        body += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                 'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+    return body + f'--{BOUNDARY}--\r\n'.encode()
+
+def zipped(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in files:
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+def test_parts_are_found_across_any_chunk_boundary():
+    # Content that starts like a delimiter must not end the part
+    files = [('a.jpg', b'\r\n--formBound' + bytes(range(256)) * 40), ('b.png', b''), ('c.jpg', b'x')]
+    body = multipart(files)
+
+    for chunk_size in (1, 5, 17, 1 << 20):
+        parts = _multipart_parts(io.BytesIO(body), BOUNDARY.encode(), chunk_size=chunk_size)
+        assert [(headers.get_filename(), body[start:end]) for headers, start, end in parts] == files
+
+def test_multipart_images_and_zip_parts_are_read_lazily():
+    archive = zipped([('leaf/1.jpg', b'one'), ('notes.txt', b'skip')])
+    body = multipart([('a.jpg', b'image a'), ('more.zip', archive)])
+
+    with contextlib.ExitStack() as stack:
+        items = extract_images(f'multipart/form-data; boundary={BOUNDARY}', io.BytesIO(body), stack, 1 << 20)
+        assert [(name, read()) for name, read in items] == [('a.jpg', b'image a'), ('leaf/1.jpg', b'one')]
+
+def test_truncated_multipart_body_is_rejected():
+    body = multipart([('a.jpg', b'image a')])[:-10]
+
+    with contextlib.ExitStack() as stack, pytest.raises(ValueError):
+        extract_images(f'multipart/form-data; boundary={BOUNDARY}', io.BytesIO(body), stack, 1 << 20)
@@ -0,0 +1,61 @@
+import pytest
+
+from database import ConnectionPool, init_db
+from history import history_page
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'history.db')
+    init_db(path)
+    pool = ConnectionPool(path)
+    yield pool
+    pool.close()
+
+def store(db, user_id, timestamp, prediction):
+    with db.transaction() as conn:
+        conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence, timestamp) '
+                     'VALUES (?, ?, ?, ?, ?)', (user_id, 'uploads/a.jpg', prediction, 0.5, timestamp))
+
+def all_pages(db, user_id, limit, pending_for_page):
+    """Follows next_cursor to the end; pending_for_page(n) gives the queued rows on page n"""
+    rows, cursor, page = [], None, 0
+    while True:
+        page_rows, cursor = history_page(db, user_id, limit, cursor, pending=pending_for_page(page))
+        rows += [row[1] for row in page_rows]
+        page += 1
+        if cursor is None:
+            return rows
+
+def test_keyset_pages_cover_every_row_once(db):
+    for i in range(7):
+        store(db, 1, f"2025-01-01 10:00:0{i // 2}", f"stored{i}")
+    store(db, 2, '2025-01-01 10:00:09', 'other user')
+
+    rows = all_pages(db, 1, 3, lambda page: ())
+    assert sorted(rows) == [f"stored{i}" for i in range(7)]
+    assert len(rows) == 7
+
+def test_queued_rows_beyond_the_first_page_are_shown(db):
+    for i in range(3):
+        store(db, 1, f"2025-01-01 10:00:0{i}", f"stored{i}")
+    pending = [(f"2025-01-02 10:00:0{i}", f"queued{i}", 0.5) for i in reversed(range(5))]
+
+    rows = all_pages(db, 1, 2, lambda page: pending)
+    assert rows == ['queued4', 'queued3', 'queued2', 'queued1', 'queued0',
+                    'stored2', 'stored1', 'stored0']
+
+def test_rows_committed_between_pages_are_not_skipped(db):
+    store(db, 1, '2025-01-01 10:00:00', 'stored0')
+    pending = [(f"2025-01-02 10:00:0{i}", f"queued{i}", 0.5) for i in reversed(range(4))]
+
+    def pending_for_page(page):
+        # The writer commits the two oldest queued rows after page 0
+        if page == 0:
+            return pending
+        for timestamp, prediction, _ in pending[2:]:
+            store(db, 1, timestamp, prediction)
+        del pending[2:]
+        return pending
+
+    rows = all_pages(db, 1, 2, pending_for_page)
+    assert set(rows) == {'queued0', 'queued1', 'queued2', 'queued3', 'stored0'}
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from inference import BackgroundLoader
+
+def test_failed_load_is_retried_after_the_backoff():
+    attempts = []
+
+    def factory():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise OSError("model file busy")
+        return 'model'
+
+    loader = BackgroundLoader(factory, retry_after=0.2)
+    with pytest.raises(OSError):
+        loader.get()
+    assert loader.failed()
+    # Within the backoff the stored error is raised again without a new load
+    with pytest.raises(OSError):
+        loader.get()
+    assert len(attempts) == 1
+
+    time.sleep(0.25)
+    assert loader.get() == 'model'
+    assert loader.ready()
+    assert len(attempts) == 2
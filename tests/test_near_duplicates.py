@@ -0,0 +1,78 @@
+import sqlite3
+import time
+
+import pytest
+
+from database import ConnectionPool, PredictionWriter, init_db
+from near_duplicates import DuplicateIndex
+
+HASH = 0x0123456789ABCDEF
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'hashes.db')
+    init_db(path)
+    return path
+
+def add(index, db_path, user_id, phash, disease='Tomato___healthy', confidence=0.9):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.execute('INSERT INTO predictions (user_id, image_path, prediction, confidence) VALUES (?, ?, ?, ?)',
+                          (user_id, 'uploads/a.jpg', disease, confidence))
+    remember = index.add(conn, user_id, phash, cursor.lastrowid, disease, confidence)
+    conn.commit()
+    conn.close()
+    remember()
+
+def test_find_returns_closest_match_for_the_same_user(db_path):
+    index = DuplicateIndex(db_path, max_distance=6)
+    add(index, db_path, 1, HASH, 'Tomato___healthy')
+    add(index, db_path, 1, HASH ^ 0b1111, 'Potato___Late_blight')
+
+    assert index.find(1, HASH ^ 0b1) == ('Tomato___healthy', 0.9)
+    assert index.find(1, HASH ^ 0xFFFF) is None
+    assert index.find(2, HASH) is None
+
+def test_reload_sees_hashes_saved_earlier(db_path):
+    add(DuplicateIndex(db_path), db_path, 1, HASH)
+
+    assert DuplicateIndex(db_path).find(1, HASH) == ('Tomato___healthy', 0.9)
+
+def test_expired_hashes_are_dropped(db_path):
+    index = DuplicateIndex(db_path, window_hours=1 / 3600)
+    for i in range(4):
+        add(index, db_path, 1, HASH ^ (1 << i))
+    add(index, db_path, 2, HASH)
+    assert index.size == 5
+
+    time.sleep(2.1)
+    add(index, db_path, 1, ~HASH & (2 ** 64 - 1))
+
+    # User 1's tables were rebuilt around the one live hash, user 2 swept away
+    assert index.size == 1
+    assert index._users[1].index.size == 1
+    assert 2 not in index._users
+    assert index.find(1, HASH) is None
+
+def test_index_only_learns_committed_rows(db_path):
+    index = DuplicateIndex(db_path)
+    pool = ConnectionPool(db_path)
+    writer = PredictionWriter(pool, max_wait_ms=60_000, max_attempts=2)
+
+    def on_insert(phash, fail=False):
+        def insert(conn, prediction_id):
+            remember = index.add(conn, 1, phash, prediction_id, 'Tomato___healthy', 0.9)
+            if fail:
+                raise ValueError("bad row")
+            return remember
+        return insert
+
+    # The poison row fails the group, so the good row is rolled back once
+    # and retried on its own
+    writer.add(1, 'uploads/good.jpg', 'Tomato___healthy', 0.9, on_insert(HASH))
+    writer.add(1, 'uploads/poison.jpg', 'Tomato___healthy', 0.9, on_insert(~HASH & (2 ** 64 - 1), fail=True))
+    assert writer.close(timeout=10)
+    pool.close()
+
+    assert index.size == 1
+    assert index.find(1, HASH) == ('Tomato___healthy', 0.9)
+    assert index.find(1, ~HASH & (2 ** 64 - 1)) is None
@@ -0,0 +1,25 @@
+import numpy as np
+
+from prediction_cache import PredictionCache
+
+def test_cached_rows_do_not_keep_the_batch_alive(tmp_path):
+    cache = PredictionCache(str(tmp_path / 'cache.db'), 'model')
+    batch = np.random.default_rng(0).random((64, 38), dtype=np.float32)
+
+    cache.put('key', batch[3])
+    batch[3] = 0
+
+    cached = cache.get('key')
+    assert cached.base is None
+    assert cached.shape == (1, 38)
+    assert cached.any()
+    assert cache.stats()['bytes'] < batch.nbytes
+
+def test_entries_come_back_from_sqlite_after_restart(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    row = np.arange(38, dtype=np.float32).reshape(1, -1)
+    PredictionCache(path, 'model').put('key', row)
+
+    assert np.array_equal(PredictionCache(path, 'model').get('key'), row)
+    # Entries from another model file are dropped on open
+    assert PredictionCache(path, 'other').get('key') is None
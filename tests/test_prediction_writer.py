@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from database import ConnectionPool, PredictionWriter, init_db
+
+@pytest.fixture
+def pool(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    init_db(path)
+    pool = ConnectionPool(path)
+    yield pool
+    pool.close()
+
+@pytest.fixture
+def make_writer(pool):
+    writers = []
+
+    def make(**settings):
+        # A long window, so nothing commits until the test flushes
+        settings.setdefault('max_wait_ms', 60_000)
+        writer = PredictionWriter(pool, **settings)
+        writers.append(writer)
+        return writer
+
+    yield make
+    for writer in writers:
+        writer.close(timeout=5)
+
+def stored(pool):
+    return [row[0] for row in pool.fetchall('SELECT image_path FROM predictions ORDER BY id')]
+
+def test_flush_commits_queued_rows(pool, make_writer):
+    writer = make_writer()
+    for i in range(3):
+        writer.add(1, f"uploads/{i}.jpg", 'Tomato___healthy', 0.9)
+    assert stored(pool) == []
+
+    assert writer.flush(timeout=5)
+    assert stored(pool) == ['uploads/0.jpg', 'uploads/1.jpg', 'uploads/2.jpg']
+    assert writer.stats()['queue_depth'] == 0
+
+def test_visible_lists_queued_rows_and_holds_commits(pool, make_writer):
+    writer = make_writer()
+    writer.add(1, 'uploads/a.jpg', 'Tomato___healthy', 0.9)
+    writer.add(2, 'uploads/b.jpg', 'Potato___Early_blight', 0.8)
+    writer.add(1, 'uploads/c.jpg', 'Potato___Late_blight', 0.7)
+
+    with writer.visible(1) as rows:
+        assert [row[1:] for row in rows] == [('Potato___Late_blight', 0.7), ('Tomato___healthy', 0.9)]
+        # Nothing commits while a reader holds the queue
+        assert not writer.flush(timeout=0.2)
+        assert stored(pool) == []
+
+    assert writer.flush(timeout=5)
+    with writer.visible(1) as rows:
+        assert rows == []
+    assert len(stored(pool)) == 3
+
+def test_close_flushes_and_rejects_new_rows(pool, make_writer):
+    writer = make_writer()
+    writer.add(1, 'uploads/a.jpg', 'Tomato___healthy', 0.9)
+
+    assert writer.close(timeout=5)
+    assert stored(pool) == ['uploads/a.jpg']
+    with pytest.raises(RuntimeError):
+        writer.add(1, 'uploads/b.jpg', 'Tomato___healthy', 0.9)
+
+def test_poison_row_is_dropped_without_blocking_the_rest(pool, make_writer):
+    writer = make_writer(max_attempts=3)
+
+    def fail(conn, prediction_id):
+        raise ValueError("bad row")
+
+    writer.add(1, 'uploads/before.jpg', 'Tomato___healthy', 0.9)
+    writer.add(1, 'uploads/poison.jpg', 'Tomato___healthy', 0.9, on_insert=fail)
+    writer.add(1, 'uploads/after.jpg', 'Tomato___healthy', 0.9)
+
+    assert writer.flush(timeout=10)
+    assert stored(pool) == ['uploads/before.jpg', 'uploads/after.jpg']
+    stats = writer.stats()
+    assert stats['errors'] == 1
+    assert stats['queue_depth'] == 0
+    assert writer.close(timeout=5)
+
+def test_on_insert_runs_in_the_row_transaction(pool, make_writer):
+    writer = make_writer()
+    ids = []
+    writer.add(1, 'uploads/a.jpg', 'Tomato___healthy', 0.9, on_insert=lambda conn, prediction_id: ids.append(prediction_id))
+
+    assert writer.flush(timeout=5)
+    assert ids == [pool.fetchone('SELECT id FROM predictions')[0]]
+
+def test_full_queue_inserts_synchronously(pool, make_writer):
+    writer = make_writer(max_queue=1)
+    writer.add(1, 'uploads/queued.jpg', 'Tomato___healthy', 0.9)
+    writer.add(1, 'uploads/direct.jpg', 'Tomato___healthy', 0.9)
+
+    assert stored(pool) == ['uploads/direct.jpg']
+    assert writer.stats()['sync_inserts'] == 1
+    assert writer.flush(timeout=5)
+    assert sorted(stored(pool)) == ['uploads/direct.jpg', 'uploads/queued.jpg']
+
+def test_concurrent_adds_are_all_written(pool, make_writer):
+    writer = make_writer(max_rows=16, max_wait_ms=5)
+
+    def session(user_id):
+        for i in range(50):
+            writer.add(user_id, f"uploads/{user_id}_{i}.jpg", 'Tomato___healthy', 0.5)
+
+    threads = [threading.Thread(target=session, args=(user_id,)) for user_id in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert writer.flush(timeout=10)
+    assert len(stored(pool)) == 200
@@ -0,0 +1,68 @@
+import sqlite3
+
+import pytest
+
+import database
+from database import init_db
+from rebuild_summaries import check
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'summaries.db')
+    init_db(path)
+    conn = sqlite3.connect(path)
+    rows = [(user_id, f"uploads/{i}.jpg", prediction, 0.1 * (i % 7), f"2025-01-0{1 + i % 3} 10:00:00")
+            for i, (user_id, prediction) in enumerate([(1, 'a'), (1, 'b'), (2, 'a')] * 20)]
+    conn.executemany('INSERT INTO predictions (user_id, image_path, prediction, confidence, timestamp) '
+                     'VALUES (?, ?, ?, ?, ?)', rows)
+    conn.execute('DELETE FROM predictions WHERE id % 5 = 0')
+    conn.execute("UPDATE predictions SET prediction = 'c' WHERE id % 7 = 0")
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_trigger_maintained_summaries_pass(conn):
+    assert check(conn) == {'user_prediction_totals': (0, 0), 'user_daily_predictions': (0, 0)}
+
+def test_drift_in_any_column_is_reported(conn):
+    conn.execute('UPDATE user_daily_predictions SET confidence_sum = confidence_sum + 0.5 '
+                 "WHERE user_id = 1 AND prediction = 'a' AND day = '2025-01-01'")
+    conn.execute('UPDATE user_prediction_totals SET confidence_sum = confidence_sum - 0.5 WHERE user_id = 2')
+    conn.execute("INSERT INTO user_daily_predictions VALUES (3, '2025-01-01', 'a', 1, 0.5)")
+    conn.execute("DELETE FROM user_daily_predictions WHERE user_id = 2 AND prediction = 'c'")
+
+    report = check(conn)
+    assert report['user_prediction_totals'] == (1, 1)
+    assert report['user_daily_predictions'][0] >= 3
+    assert report['user_daily_predictions'][1] == 3
+
+def test_rows_without_a_user_are_left_out(conn):
+    users = conn.execute('SELECT COUNT(*) FROM user_prediction_totals').fetchone()[0]
+    conn.execute("INSERT INTO predictions (user_id, image_path, prediction, confidence) VALUES (NULL, 'x.jpg', 'a', 0.5)")
+    conn.execute("UPDATE predictions SET user_id = NULL WHERE id = 1")
+
+    assert conn.execute('SELECT COUNT(*) FROM user_prediction_totals').fetchone()[0] == users
+    assert conn.execute('SELECT COUNT(*) FROM user_daily_predictions WHERE user_id IS NULL').fetchone()[0] == 0
+    assert check(conn) == {'user_prediction_totals': (0, 0), 'user_daily_predictions': (0, 0)}
+
+def test_migration_replaces_triggers_that_counted_null_users(tmp_path):
+    path = str(tmp_path / 'old.db')
+    init_db(path)
+    conn = sqlite3.connect(path)
+    # The version 6 insert trigger, before rows without a user were skipped
+    conn.execute('DROP TRIGGER predictions_summary_insert')
+    conn.execute('''CREATE TRIGGER predictions_summary_insert AFTER INSERT ON predictions
+                    BEGIN
+                        INSERT INTO user_prediction_totals (user_id, predictions, confidence_sum)
+                        VALUES (NEW.user_id, 1, NEW.confidence)
+                        ON CONFLICT (user_id) DO UPDATE SET predictions = predictions + 1;
+                    END''')
+    conn.execute("INSERT INTO predictions (user_id, image_path, prediction, confidence) VALUES (NULL, 'x.jpg', 'a', 0.5)")
+    conn.execute('DELETE FROM schema_version WHERE version = 7')
+    conn.commit()
+    assert check(conn)['user_prediction_totals'] == (1, 1)
+
+    database._migrated.clear()
+    init_db(path)
+    assert check(conn) == {'user_prediction_totals': (0, 0), 'user_daily_predictions': (0, 0)}
+    conn.close()
@@ -0,0 +1,40 @@
+import argparse
+
+import tensorflow as tf
+
+import config
+from compact_models import build_compact_cnn, labelled_dataset
+
+# Trains the small first-stage model for cascade mode (AGRODOC_CASCADE) on
+# the same train/valid folders as TrainModel.ipynb. Only uploads it is
+# confident about are answered by it; the rest go to Trained_Model.h5.
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the cascade first-stage model")
+    parser.add_argument('--train-dir', default='train')
+    parser.add_argument('--valid-dir', default='valid')
+    parser.add_argument('--output', default=config.CASCADE_MODEL_PATH)
+    parser.add_argument('--base-filters', type=int, default=16)
+    parser.add_argument('--blocks', type=int, default=4)
+    parser.add_argument('--separable', action='store_true')
+    parser.add_argument('--epochs', type=int, default=15)
+    parser.add_argument('--learning-rate', type=float, default=1e-3)
+    args = parser.parse_args()
+
+    training_set = labelled_dataset(args.train_dir)
+    validation_set = labelled_dataset(args.valid_dir, shuffle=False)
+
+    model = build_compact_cnn(args.base_filters, args.blocks, args.separable, name='first_stage')
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+                  loss='categorical_crossentropy', metrics=['accuracy'])
+    model.fit(training_set, validation_data=validation_set, epochs=args.epochs,
+              callbacks=[tf.keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=3,
+                                                          restore_best_weights=True)])
+    _, validation_accuracy = model.evaluate(validation_set, verbose=0)
+    model.save(args.output)
+    print(f"Saved {args.output}: {model.count_params():,} parameters, "
+          f"validation accuracy {validation_accuracy:.2%}")
+    print("Pick a confidence threshold with: python -m benchmarks.cascade --eval-dir", args.valid_dir)
+
+if __name__ == '__main__':
+    main()
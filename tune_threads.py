@@ -0,0 +1,140 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import time
+
+import config
+
+# Picks TensorFlow's intra-op/inter-op pool sizes and the micro-batch size
+# for this host. Every setting runs in freshly spawned worker processes, as
+# many at once as will share the host in production, because thread pools
+# can only be sized before TensorFlow starts and oversubscription only shows
+# when the workers compete. The winner is written to
+# AGRODOC_THREAD_SETTINGS_PATH, which config.py and load_model() pick up.
+
+def _powers_of_two(limit):
+    values, n = [], 1
+    while n < limit:
+        values.append(n)
+        n *= 2
+    return values + [limit]
+
+def sample_batch(pattern, batch_size):
+    import numpy as np
+
+    from preprocessing import load_image, to_model_input
+    paths = sorted(glob.glob(pattern))
+    if paths:
+        images = np.concatenate([to_model_input(load_image(path)) for path in paths])
+    else:
+        images = np.random.default_rng(0).uniform(0, 255, (8, 128, 128, 3)).astype(np.float32)
+    return np.resize(images, (batch_size, *images.shape[1:]))
+
+def _worker(barrier, results, backend_name, intra, inter, batch_sizes, images_pattern, seconds):
+    # The child imported config while unpickling this function, so the
+    # trial's settings go straight onto the module instead of the environment
+    config.INTRA_OP_THREADS = intra
+    config.INTER_OP_THREADS = inter
+    config.TFLITE_THREADS = intra
+    from backends import load_model_file, model_file
+
+    backend = load_model_file(model_file(backend_name))
+    batch = sample_batch(images_pattern, max(batch_sizes))
+    rows = {}
+    for batch_size in batch_sizes:
+        inputs = batch[:batch_size]
+        backend.predict(inputs)
+        barrier.wait()
+        samples = []
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline or len(samples) < 3:
+            start = time.perf_counter()
+            backend.predict(inputs)
+            samples.append((time.perf_counter() - start) * 1000.0)
+        rows[batch_size] = samples
+    results.put(rows)
+
+def run_trial(backend_name, intra, inter, batch_sizes, workers, images_pattern, seconds):
+    """Host throughput and per-call latency percentiles of one thread setting, per batch size"""
+    import numpy as np
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_worker, args=(barrier, results, backend_name, intra, inter,
+                                                   batch_sizes, images_pattern, seconds))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    per_worker = [results.get() for _ in range(workers)]
+    for process in processes:
+        process.join()
+
+    trial = {}
+    for batch_size in batch_sizes:
+        samples = np.concatenate([rows[batch_size] for rows in per_worker])
+        throughput = sum(batch_size * len(rows[batch_size]) / (sum(rows[batch_size]) / 1000.0)
+                         for rows in per_worker)
+        trial[batch_size] = {
+            'images_per_s': float(throughput),
+            'p50_ms': float(np.percentile(samples, 50)),
+            'p99_ms': float(np.percentile(samples, 99)),
+        }
+    return trial
+
+def best_setting(rows, max_p99_ms=None):
+    """Highest throughput within the tail latency budget, else the lowest p99"""
+    within = [row for row in rows if max_p99_ms is None or row['p99_ms'] <= max_p99_ms]
+    if within:
+        return max(within, key=lambda row: (row['images_per_s'], -row['p99_ms']))
+    return min(rows, key=lambda row: row['p99_ms'])
+
+def main():
+    from backends import available_cores
+
+    cores = available_cores()
+    parser = argparse.ArgumentParser(description="Tune TensorFlow thread pools and batch size for this host")
+    parser.add_argument('--backend', default=config.BACKEND)
+    parser.add_argument('--workers', type=int, default=config.WORKERS_PER_HOST,
+                        help="Model-loading processes that will share this host")
+    parser.add_argument('--intra', type=int, nargs='+',
+                        help="Intra-op thread counts to try (default: powers of two up to the per-worker core share)")
+    parser.add_argument('--inter', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--images', default='test/test/*.JPG', help="Sample images, random pixels if none match")
+    parser.add_argument('--seconds', type=float, default=3.0, help="Measuring time per setting and batch size")
+    parser.add_argument('--max-p99-ms', type=float, help="Tail latency budget for one batch")
+    parser.add_argument('--output', default=config.THREAD_SETTINGS_PATH)
+    args = parser.parse_args()
+
+    intra_values = args.intra or _powers_of_two(max(1, cores // args.workers))
+    inter_values = [1] if args.backend.startswith('tflite') else args.inter
+    print(f"{cores} cores, {args.workers} worker(s), backend {args.backend}")
+    print(f"{'intra':>5} {'inter':>5} {'batch':>5} {'img/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    rows = []
+    for intra in intra_values:
+        for inter in inter_values:
+            trial = run_trial(args.backend, intra, inter, args.batch_sizes, args.workers,
+                              args.images, args.seconds)
+            for batch_size, result in trial.items():
+                rows.append(dict(result, intra_op_threads=intra, inter_op_threads=inter, batch_size=batch_size))
+                print(f"{intra:>5} {inter:>5} {batch_size:>5} {result['images_per_s']:>9.1f} "
+                      f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+    best = best_setting(rows, args.max_p99_ms)
+    settings = dict(best, backend=args.backend, workers=args.workers, cores=cores,
+                    tuned_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+    tmp_path = f"{args.output}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp_path, args.output)
+    print(f"\nBest: intra {best['intra_op_threads']}, inter {best['inter_op_threads']}, "
+          f"batch {best['batch_size']} -> {best['images_per_s']:.1f} img/s, p99 {best['p99_ms']:.1f} ms")
+    print(f"Wrote {args.output}")
+    if args.workers * best['intra_op_threads'] > cores:
+        print(f"Warning: {args.workers} workers x {best['intra_op_threads']} threads exceeds {cores} cores")
+
+if __name__ == '__main__':
+    main()
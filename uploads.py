@@ -0,0 +1,16 @@
+import datetime
+import os
+
+# Uploaded photos are kept as the bytes the user sent, not a re-encode of
+# the decoded (possibly reduced) image
+
+UPLOAD_DIR = 'uploads'
+
+def save_upload(data, name, upload_dir=UPLOAD_DIR):
+    """Writes an upload to <upload_dir>/<timestamp>_<name> and returns the path"""
+    os.makedirs(upload_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    file_path = os.path.join(upload_dir, f"{timestamp}_{name}")
+    with open(file_path, 'wb') as f:
+        f.write(data)
+    return file_path